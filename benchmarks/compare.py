@@ -0,0 +1,63 @@
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+# the value compared for every kind of result, and whether higher is better
+METRICS: List[Tuple[str, bool]] = [("best_ms", False), ("p50_ms", False), ("trades_per_s", True)]
+
+
+def pick(res: Dict) -> Tuple[str, float, bool] | None:
+    for key, higher_is_better in METRICS:
+        if key in res:
+            return key, res[key], higher_is_better
+    return None
+
+
+def compare(base: Dict, head: Dict, tolerance: float) -> int:
+    """
+    Prints every benchmark of both runs side by side
+    Returns:
+        number of benchmarks that got slower by more than the tolerance
+    """
+    print(f"base {base['meta']['commit']}  head {head['meta']['commit']}")
+    print(f"{'benchmark':34} {'metric':>13} {'base':>12} {'head':>12} {'change':>8}")
+
+    regressions = 0
+    for name in sorted(set(base["results"]) | set(head["results"])):
+        old, new = base["results"].get(name), head["results"].get(name)
+        if old is None or new is None:
+            print(f"{name:34} {'only in ' + ('head' if old is None else 'base'):>13}")
+            continue
+
+        picked = pick(new)
+        if picked is None or picked[0] not in old:
+            continue
+        key, value, higher_is_better = picked
+        change = value / old[key] - 1 if old[key] else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  slower"
+            regressions += 1
+        elif worse < -tolerance:
+            flag = "  faster"
+        print(f"{name:34} {key:>13} {old[key]:>12.3f} {value:>12.3f} {change:>+8.1%}{flag}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares two result files of benchmarks.suite")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    # a non zero exit code lets a ci job fail on regressions
+    sys.exit(1 if compare(base, head, args.tolerance) else 0)
@@ -0,0 +1,60 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Tuple
+
+import finance
+from benchmarks.synthetic import random_walks
+
+ALGORITHMS = {
+    "A": lambda stocks, threshold, volatility: finance.Algorithms.A(cash=100_000, stocks=stocks),
+    "Threshold": lambda stocks, threshold, volatility: finance.Algorithms.Threshold(
+        cash=100_000, stocks=stocks, threshold=threshold, volatility=volatility),
+    "Engine": lambda stocks, threshold, volatility: finance.Engine.Threshold(
+        cash=100_000, stocks=stocks, threshold=threshold, volatility=volatility),
+}
+
+
+def backtest(job: Tuple[str, int, int, float, float]):
+    """
+    Runs a single backtest and returns everything that has to match between a serial and a parallel run
+    """
+    algo, symbols, length, threshold, volatility = job
+    stocks = random_walks(symbols, length)
+    p = ALGORITHMS[algo](stocks, threshold, volatility)
+
+    return p.get_all_transactions(), p.Cash, [(h.name, h.quantity, h.valuation) for h in p.holdings]
+
+
+def run(runs: int, workers: int, symbols: int, length: int):
+    grid = itertools.cycle(itertools.product(ALGORITHMS, [0.002, 0.005, 0.01], [0.2, 0.8]))
+    jobs: List[Tuple[str, int, int, float, float]] = [
+        (algo, symbols, length, threshold, volatility) for algo, threshold, volatility in itertools.islice(grid, runs)
+    ]
+
+    start = time.perf_counter()
+    expected = [backtest(job) for job in jobs]
+    print(f"serial    {runs} backtests {time.perf_counter() - start:8.2f} s")
+
+    pools = (("threads", ThreadPoolExecutor(max_workers=workers)),
+             ("processes", ProcessPoolExecutor(max_workers=workers)))
+    for name, executor in pools:
+        start = time.perf_counter()
+        with executor as pool:
+            actual = list(pool.map(backtest, jobs))
+        print(f"{name:9} {runs} backtests {time.perf_counter() - start:8.2f} s")
+
+        for job, a, e in zip(jobs, actual, expected):
+            assert a == e, f"{name} result differs from the serial one for {job}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs backtests in parallel and checks them against serial runs")
+    parser.add_argument("--runs", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--symbols", type=int, default=3)
+    parser.add_argument("--length", type=int, default=2000)
+    args = parser.parse_args()
+
+    run(args.runs, args.workers, args.symbols, args.length)
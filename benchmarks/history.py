@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+
+import controller
+import database
+from benchmarks.synthetic import random_walk
+
+QUERIES = {
+    "json": "/msft/history",
+    "ndjson": "/msft/history?format=ndjson",
+    "ndjson close": "/msft/history?format=ndjson&fields=Close",
+    "binary": "/msft/history?format=binary",
+    "binary close": "/msft/history?format=binary&fields=Close",
+}
+
+
+async def measure(client: httpx.AsyncClient, url: str, repeat: int):
+    """
+    Returns the best latency in milliseconds, the peak traced memory in KiB and the size of the response
+    """
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        r = await client.get(url)
+        best = min(best, time.perf_counter() - start)
+        size = len(r.content)
+
+    tracemalloc.start()
+    await client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best * 1000, peak / 1024, size
+
+
+async def run(length: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        data = database.StockData(f"{tmp}/symbols.db")
+        data.insert(random_walk("msft", length))
+        controller.app.dependency_overrides[database.get_singleton] = lambda: data
+
+        transport = httpx.ASGITransport(app=controller.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # warms the stock cache so only the response is measured
+            await client.get(QUERIES["json"])
+
+            print(f"bars={length}")
+            print(f"{'format':>14} {'latency ms':>11} {'peak KiB':>10} {'size KiB':>10}")
+            for name, url in QUERIES.items():
+                latency, peak, size = await measure(client, url, repeat)
+                print(f"{name:>14} {latency:>11.2f} {peak:>10.1f} {size / 1024:>10.1f}")
+
+        controller.app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the latency and memory of the history formats")
+    parser.add_argument("--length", type=int, default=7 * 375)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.length, args.repeat))
@@ -0,0 +1,101 @@
+import argparse
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy
+
+import finance
+from benchmarks.synthetic import random_walks
+
+
+def objects(trades: int, symbols: int) -> Callable[[], object]:
+    """
+    Records trades the way the portfolio used to, one transaction object per trade
+    """
+    names = [f"sym{i}" for i in range(symbols)]
+
+    def record():
+        transactions = []
+        for i in range(trades):
+            side = finance.TransactionType.BUY if i % 2 == 0 else finance.TransactionType.SELL
+            transactions.append(finance.Transaction(Tick=i, Type=side, StockName=names[i % symbols], Quantity=10,
+                                                    Price=100.0 + i % 7, Amount=10 * (100.0 + i % 7)))
+        return transactions
+
+    return record
+
+
+def ledger(trades: int, symbols: int) -> Callable[[], object]:
+    """
+    Records the same trades in a ledger
+    """
+    def record():
+        ld = finance.Ledger()
+        ids = [ld.register(f"sym{i}") for i in range(symbols)]
+        for i in range(trades):
+            side = finance.ledger.BUY if i % 2 == 0 else finance.ledger.SELL
+            ld.record(ids[i % symbols], i, side, 10, 100.0 + i % 7, 10 * (100.0 + i % 7))
+        return ld
+
+    return record
+
+
+def measure(record: Callable[[], object]):
+    """
+    Returns the seconds taken, the bytes still held by the result, the peak bytes and the number of live blocks
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = record()
+    elapsed = time.perf_counter() - start
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    del res
+    return elapsed, current, peak, blocks
+
+
+def queries(symbols: int, length: int):
+    """
+    Times per symbol queries on a portfolio filled by a backtest
+    """
+    stocks = random_walks(symbols, length)
+    p = finance.Engine.Threshold(cash=100_000, stocks=stocks, threshold=0.002, volatility=0.5)
+
+    start = time.perf_counter()
+    for stk in stocks:
+        p.get_stock_transactions(stk)
+    per_symbol = (time.perf_counter() - start) / symbols
+
+    last = {stk.name: stk.array()[-1] for stk in stocks}
+    prices = numpy.array([last[name] for name in p.Ledger.names])
+    start = time.perf_counter()
+    p.Ledger.pnl(prices)
+    pnl = time.perf_counter() - start
+
+    print(f"{len(p.Ledger)} trades over {symbols} symbols: get_stock_transactions {per_symbol * 1000:.3f} ms/symbol, "
+          f"pnl {pnl * 1000:.3f} ms")
+
+
+def run(trades: int, symbols: int, length: int):
+    scale = 1_000_000 / trades
+    print(f"{'':8} {'s/M trades':>11} {'held MiB/M':>11} {'peak MiB/M':>11} {'blocks/M':>10}")
+    for name, record in (("objects", objects(trades, symbols)), ("ledger", ledger(trades, symbols))):
+        elapsed, current, peak, blocks = measure(record)
+        print(f"{name:8} {elapsed * scale:>11.2f} {current * scale / 2 ** 20:>11.1f} {peak * scale / 2 ** 20:>11.1f} "
+              f"{blocks * scale:>10.0f}")
+
+    queries(symbols, length)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the memory taken by transaction objects and the ledger")
+    parser.add_argument("--trades", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--length", type=int, default=7 * 375)
+    args = parser.parse_args()
+
+    run(args.trades, args.symbols, args.length)
@@ -0,0 +1,45 @@
+import argparse
+import time
+
+import pandas
+
+import finance
+from benchmarks.synthetic import random_walk
+
+
+def timed(f, repeat: int) -> float:
+    """
+    Returns the best time of a few runs of f in milliseconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
+
+
+def run(lengths, repeat: int):
+    print(f"{'bars':>8} {'json KiB':>10} {'binary KiB':>11} {'json decode ms':>15} {'binary decode ms':>17}")
+    for length in lengths:
+        stk = random_walk("bench", length)
+        as_json = stk.toJSON()
+        as_bytes = stk.toBytes()
+
+        # the binary encoding has to give back exactly the frame that went in
+        pandas.testing.assert_frame_equal(finance.Stock.fromBytes(as_bytes).df, stk.df, check_freq=False)
+
+        json_ms = timed(lambda: finance.Stock.fromJSON(as_json), repeat)
+        bytes_ms = timed(lambda: finance.Stock.fromBytes(as_bytes), repeat)
+        print(f"{length:>8} {len(as_json.encode()) / 1024:>10.1f} {len(as_bytes) / 1024:>11.1f} "
+              f"{json_ms:>15.2f} {bytes_ms:>17.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the json and the binary encoding of stocks")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[375, 7 * 375, 30 * 375])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    run(args.lengths, args.repeat)
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+import controller
+import database
+import finance
+import plotting
+from benchmarks.synthetic import random_walk, random_walks
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def timed(f: Callable[[], object], repeat: int, setup: Callable[[], object] | None = None) -> Dict:
+    """
+    Runs f a few times, setup runs before every run and is not timed
+    Returns:
+        best and median time in milliseconds and the number of runs
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+
+    return {"best_ms": min(times) * 1000, "median_ms": statistics.median(times) * 1000, "runs": repeat}
+
+
+def bench_stock(args) -> Dict[str, Dict]:
+    stk = random_walk("msft", args.length)
+    as_json = stk.toJSON()
+    as_bytes = stk.toBytes()
+    return {
+        "stock.toJSON": timed(stk.toJSON, args.repeat),
+        "stock.fromJSON": timed(lambda: finance.Stock.fromJSON(as_json), args.repeat),
+        "stock.toBytes": timed(stk.toBytes, args.repeat),
+        "stock.fromBytes": timed(lambda: finance.Stock.fromBytes(as_bytes), args.repeat),
+        "render svg": timed(lambda: plotting.render(stk), args.repeat),
+        "render png": timed(lambda: plotting.render(stk, fmt=finance.ChartFormat.png), args.repeat),
+    }
+
+
+def bench_database(args) -> Dict[str, Dict]:
+    stocks = random_walks(args.symbols, args.length)
+    with tempfile.TemporaryDirectory() as tmp:
+        data = database.StockData(os.path.join(tmp, "symbols.db"))
+        res = {
+            "database.insert": timed(lambda: data.insert(stocks[0]), args.repeat),
+            "database.insert_many": timed(lambda: data.insert_many(stocks), args.repeat),
+            "database.get_by_name cold": timed(lambda: data.get_by_name(stocks[0].name), args.repeat,
+                                               setup=data.Cache.clear),
+            "database.get_by_name cached": timed(lambda: data.get_by_name(stocks[0].name), args.repeat),
+            # stocks are decoded lazily, these read the bars too
+            "database.get_by_name cold df": timed(lambda: data.get_by_name(stocks[0].name).df, args.repeat,
+                                                  setup=data.Cache.clear),
+            "database.get_by_name cold close": timed(
+                lambda: data.get_by_name(stocks[0].name, [finance.ValueKind.Close]).array(), args.repeat,
+                setup=data.Cache.clear),
+            "database.get_by_name cold close day": timed(
+                lambda: data.get_by_name(stocks[0].name, [finance.ValueKind.Close], stocks[0].index[-10]).array(),
+                args.repeat, setup=data.Cache.clear),
+            "database.get_all cold": timed(data.get_all, args.repeat, setup=data.Cache.clear),
+        }
+
+        bars = database.BarStore(os.path.join(tmp, "bars"))
+        index = stocks[0].df.index
+        res["bars.write"] = timed(lambda: bars.write(stocks[0]), args.repeat)
+        res["bars.read all"] = timed(lambda: bars.read(stocks[0].name).array(), args.repeat)
+        res["bars.read day"] = timed(lambda: bars.read(stocks[0].name, index[-10], index[-1]).array(), args.repeat)
+    return res
+
+
+def bench_algorithms(args) -> Dict[str, Dict]:
+    stocks = random_walks(args.symbols, args.length)
+    params = {"cash": 100_000, "stocks": stocks, "threshold": 0.002, "volatility": 0.5}
+    return {
+        "algorithms.A": timed(lambda: finance.Algorithms.A(cash=100_000, stocks=stocks), args.repeat),
+        "algorithms.A per symbol": timed(
+            lambda: [finance.Algorithms.A(cash=100_000, stocks=[stk]) for stk in stocks], args.repeat),
+        "schedule.batch": timed(lambda: finance.schedule_batch(100_000, stocks), args.repeat),
+        "algorithms.Threshold": timed(lambda: finance.Algorithms.Threshold(**params), args.repeat),
+        "engine.Threshold": timed(lambda: finance.Engine.Threshold(**params), args.repeat),
+        "engine.Threshold event": timed(
+            lambda: finance.Engine.Threshold(**params, mode=finance.Simulation.event), args.repeat),
+        "engine.Threshold with costs": timed(
+            lambda: finance.Engine.Threshold(**params, ctx=finance.Context(
+                stocks, cash=100_000, allow_short=True,
+                execution=finance.ExecutionModel(Fee=1.0, Spread=0.001, Impact=0.1, Participation=0.01))),
+            args.repeat),
+        "engine.Threshold rare": timed(lambda: finance.Engine.Threshold(**dict(params, threshold=0.05)), args.repeat),
+        "engine.Threshold rare event": timed(
+            lambda: finance.Engine.Threshold(**dict(params, threshold=0.05), mode=finance.Simulation.event),
+            args.repeat),
+        "walk_forward": timed(
+            lambda: finance.walk_forward(stocks, [0.001, 0.002, 0.005], [0.2, 0.5, 0.8], 100_000,
+                                         args.length // 4, args.length // 8), args.repeat),
+        "engine.Threshold with metrics": timed(
+            lambda: finance.evaluate_portfolio(finance.Engine.Threshold(**params)), args.repeat),
+    }
+
+
+def bench_portfolio(args) -> Dict[str, Dict]:
+    stocks = random_walks(args.symbols, 2)
+
+    def trade():
+        p = finance.Portfolio(initial_cash=float(args.trades) * 1000, allow_short=True)
+        for i in range(args.trades):
+            stk = stocks[i % len(stocks)]
+            if i % 2 == 0:
+                p.buy_at(stk, 10, 100.0, i)
+            else:
+                p.sell_at(stk, 10, 101.0, i)
+        p.get_all_transactions()
+
+    res = timed(trade, args.repeat)
+    res["trades_per_s"] = args.trades / (res["best_ms"] / 1000)
+    return {"portfolio.trades": res}
+
+
+async def load(client: httpx.AsyncClient, method: str, url: str, body, requests: int, concurrency: int) -> Dict:
+    """
+    Sends requests with at most concurrency of them in flight
+    Returns:
+        throughput and latency percentiles in milliseconds
+    """
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            r = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code >= 400:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests_per_s": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "failures": failures,
+        "requests": requests,
+        "concurrency": concurrency,
+    }
+
+
+async def bench_api_async(args) -> Dict[str, Dict]:
+    stocks = random_walks(args.symbols, args.length)
+    names = [stk.name for stk in stocks]
+    # the symbol routes only take known symbols
+    stocks[0].name = finance.Symbols.MICROSOFT.value
+    names[0] = stocks[0].name
+
+    endpoints = {
+        "api.history": ("GET", f"/{names[0]}/history", None),
+        "api.history ndjson": ("GET", f"/{names[0]}/history?format=ndjson", None),
+        "api.algorithm percent": ("POST", "/algorithm/percent?cash=100000&threshold=0.002", names),
+        "api.algorithm percent metrics": ("POST", "/algorithm/percent?cash=100000&threshold=0.002&metrics=true",
+                                          names),
+    }
+
+    res = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data = database.StockData(os.path.join(tmp, "symbols.db"))
+        data.insert_many(stocks)
+        # identical requests are answered from the job store after the first one
+        runner = controller.jobs.JobRunner(database.JobStore(os.path.join(tmp, "jobs.db")))
+        controller.app.dependency_overrides[database.get_singleton] = lambda: data
+        controller.app.dependency_overrides[controller.jobs.get_job_runner] = lambda: runner
+        try:
+            transport = httpx.ASGITransport(app=controller.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for name, (method, url, body) in endpoints.items():
+                    # warms the stock cache
+                    await client.request(method, url, json=body)
+                    res[name] = await load(client, method, url, body, args.requests, args.concurrency)
+        finally:
+            controller.app.dependency_overrides.clear()
+            runner.shutdown()
+
+    return res
+
+
+def bench_api(args) -> Dict[str, Dict]:
+    return asyncio.run(bench_api_async(args))
+
+
+GROUPS = {
+    "stock": bench_stock,
+    "database": bench_database,
+    "algorithms": bench_algorithms,
+    "portfolio": bench_portfolio,
+    "api": bench_api,
+}
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> Dict:
+    results = {}
+    for group in args.groups:
+        print(f"running {group}")
+        for name, res in GROUPS[group](args).items():
+            results[name] = res
+            summary = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in res.items())
+            print(f"  {name:32} {summary}")
+
+    return {
+        "meta": {
+            "commit": commit(),
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k != "out"},
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite on synthetic data and stores the results "
+                                                 "as json, see benchmarks.compare")
+    parser.add_argument("--groups", nargs="+", choices=list(GROUPS), default=list(GROUPS))
+    parser.add_argument("--length", type=int, default=7 * 375, help="bars per symbol")
+    parser.add_argument("--symbols", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--trades", type=int, default=100_000, help="trades of the portfolio benchmark")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint of the api benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--out", help="file the results are written to, results/<commit>.json by default")
+    args = parser.parse_args()
+
+    report = run(args)
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {out}")
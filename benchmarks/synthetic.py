@@ -0,0 +1,36 @@
+from typing import List
+
+import finance
+
+
+def random_walk(name: str, length: int, seed: int = 0, start_price: float = 100.0,
+                sigma: float = 0.002) -> finance.Stock:
+    """
+    Generates a stock with a random walk of minute bars shaped like the yfinance history
+    Args:
+        name: name of the stock
+        length: number of bars
+        seed: seed of the random generator
+        start_price: price of the first bar
+        sigma: standard deviation of the per bar log return
+
+    Returns:
+        stock with Open, High, Low, Close, Volume, Dividends and Stock Splits columns
+    """
+    s = finance.Stock(name, skip_loading=True)
+    s.df = finance.random_walk(length, seed=seed, start_price=start_price, sigma=sigma)
+    return s
+
+
+def random_walks(symbols: int, length: int, seed: int = 0) -> List[finance.Stock]:
+    """
+    Generates several independent random walk stocks
+    Args:
+        symbols: number of stocks
+        length: number of bars per stock
+        seed: seed of the first stock, the others use the following seeds
+
+    Returns:
+        list of stocks
+    """
+    return [random_walk(f"sym{i}", length, seed=seed + i, start_price=50.0 + 10 * i) for i in range(symbols)]
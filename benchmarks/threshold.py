@@ -0,0 +1,41 @@
+import argparse
+import time
+
+import finance
+from benchmarks.synthetic import random_walks
+
+
+def run(symbols: int, length: int, threshold: float, volatility: float, cash: float):
+    stocks = random_walks(symbols, length)
+
+    start = time.perf_counter()
+    expected = finance.Algorithms.Threshold(cash=cash, stocks=stocks, threshold=threshold, volatility=volatility)
+    reference = time.perf_counter() - start
+
+    for stk in stocks:
+        # drop the cached arrays so the engine pays for building them
+        stk.df = stk.df
+    start = time.perf_counter()
+    actual = finance.Engine.Threshold(cash=cash, stocks=stocks, threshold=threshold, volatility=volatility)
+    engine = time.perf_counter() - start
+
+    assert actual.get_all_transactions() == expected.get_all_transactions(), "transactions differ"
+    assert actual.Cash == expected.Cash, "cash differs"
+    assert [(h.name, h.quantity) for h in actual.holdings] == [(h.name, h.quantity) for h in expected.holdings], \
+        "holdings differ"
+
+    print(f"symbols={symbols} ticks={length} transactions={len(expected.get_all_transactions())}")
+    print(f"Algorithms.Threshold {reference * 1000:10.2f} ms")
+    print(f"Engine.Threshold     {engine * 1000:10.2f} ms  ({reference / engine:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares Algorithms.Threshold with Engine.Threshold")
+    parser.add_argument("--symbols", type=int, default=12)
+    parser.add_argument("--length", type=int, default=7 * 375)
+    parser.add_argument("--threshold", type=float, default=0.01)
+    parser.add_argument("--volatility", type=float, default=0.5)
+    parser.add_argument("--cash", type=float, default=100_000)
+    args = parser.parse_args()
+
+    run(args.symbols, args.length, args.threshold, args.volatility, args.cash)
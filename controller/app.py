@@ -1,14 +1,66 @@
+import asyncio
+import datetime
 import logging
+import time
 from http import HTTPStatus
-from typing import List, Annotated
+from typing import List, Annotated, Tuple
 
-from fastapi import FastAPI, HTTPException, Depends, Query, Body
+import numpy
+import pandas
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 
 import database
 import finance
-from .stock_info import StockInfo, conv_stock, AlgorithmResult
+import plotting
+from utils import instrumentation, to_timedelta, period_duration
+from . import history, profiling, jobs
+from .stock_info import StockInfo, conv_stock, AlgorithmResult, SweepRequest, SweepSummary, BulkResult, SymbolStatus, \
+    IndicatorValues, BacktestRequest, JobInfo, ScheduleRequest, ScheduledResult, ScheduleSummary, WalkForwardRequest, \
+    WalkForwardSummary, ExecutionRequest
 
 app = FastAPI()
+# seconds a chart may take to render before the request gives up
+CHART_BUDGET = 2.0
+# indicators computed by one request are kept next to the bars for the others
+finance.get_indicator_cache().Store = database.get_singleton()
+
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    """
+    Adds the time spent per stage to the response as a Server-Timing header, and a cProfile summary of the work the
+    request hands to the thread pool when it carries the profile header. One request is profiled at a time, the
+    others say so in a header. Only the header saying so is added while instrumentation is disabled.
+    """
+    registry = instrumentation.get_instrumentation()
+    profile = request.headers.get(profiling.PROFILE_HEADER)
+    if not registry.Enabled:
+        response = await call_next(request)
+        if profile is not None:
+            response.headers[profiling.PROFILE_SKIPPED_HEADER] = "instrumentation disabled"
+        return response
+
+    profiler = profiling.start() if profile is not None else None
+    with registry.collect() as timings, profiling.attach(profiler):
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            if profiler is not None:
+                profiling.stop()
+        total = time.perf_counter() - start
+
+    registry.count("requests")
+    response.headers["Server-Timing"] = profiling.server_timing(timings, total)
+    stats = profiling.summary(profiler, profiling.limit(profile)) if profiler is not None else ""
+    if stats:
+        response.headers[profiling.PROFILE_STATS_HEADER] = stats
+    elif profiler is not None:
+        response.headers[profiling.PROFILE_SKIPPED_HEADER] = "nothing ran off the event loop"
+    elif profile is not None:
+        response.headers[profiling.PROFILE_SKIPPED_HEADER] = "another request is being profiled"
+    return response
 
 
 @app.get("/")
@@ -16,25 +68,213 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics")
+async def get_metrics(data: database.StockData = Depends(database.get_singleton)) -> PlainTextResponse:
+    """
+
+    Args:
+        data: database singleton object
+
+    Returns:
+        stage timers, counters and stock cache statistics in the prometheus text format
+    """
+    stats = data.Cache.stats()
+    lines = [instrumentation.get_instrumentation().prometheus()]
+    for name, value in (("hits", stats.Hits), ("misses", stats.Misses), ("evictions", stats.Evictions)):
+        lines.append(f"# TYPE trading_stock_cache_{name}_total counter\ntrading_stock_cache_{name}_total {value}\n")
+    for name, value in (("entries", stats.Entries), ("bytes", stats.Bytes)):
+        lines.append(f"# TYPE trading_stock_cache_{name} gauge\ntrading_stock_cache_{name} {value}\n")
+
+    return PlainTextResponse("".join(lines), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def get_cache_stats(data: database.StockData = Depends(database.get_singleton)) -> database.CacheStats:
+    """
+
+    Args:
+        data: database singleton object
+
+    Returns:
+        hit, miss and eviction counters of the in memory stock cache
+    """
+    return data.Cache.stats()
+
+
+@app.post("/symbols/bulk")
+async def post_symbols(symbols: Annotated[
+                           List[finance.Symbols], Body(description="the symbols you want to add", examples=[["msft"]])],
+                       period: Annotated[str, Query(title="period", description="time period of data")] = "7d",
+                       interval: Annotated[str, Query(title="interval", description="interval between ticks")] = "1m",
+                       no_cache: Annotated[
+                           bool, Query(title="no_cache", description="Whether we want to skip cached data")] = False,
+                       data: database.StockData = Depends(database.get_singleton),
+                       fetcher: database.Fetcher = Depends(database.get_fetcher)) -> BulkResult:
+    """
+
+    Args:
+        symbols: the symbols you want to add in the trading computation
+        period: time period for what you want the stock data
+        interval: interval between ticks
+        no_cache: skip cache data
+        data: database singleton object
+        fetcher: downloads and stores the stocks off the event loop
+
+    Returns:
+        the status of every symbol
+    """
+    check_period(period)
+    names = [s.value for s in dict.fromkeys(symbols)]
+    status = {}
+    if not no_cache:
+        for name, stk in zip(names, data.get_many(names)):
+            if stk is not None:
+                status[name] = SymbolStatus(Symbol=name, Status="cached", Bars=len(stk.index))
+
+    missing = [name for name in names if name not in status]
+    for name, res in zip(missing, await fetcher.fetch_many(missing, period, interval)):
+        if isinstance(res, BaseException):
+            status[name] = SymbolStatus(Symbol=name, Status="failed", Error=str(res))
+        else:
+            status[name] = SymbolStatus(Symbol=name, Status="fetched", Bars=len(res.index))
+
+    return BulkResult(Results=[status[name] for name in names])
+
+
+def check_period(period: str):
+    try:
+        period_duration(period)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+
+
+def resampled(data: database.StockData, names: List[str], interval: str | None,
+              columns: List[finance.ValueKind] | None = None, start: datetime.datetime | None = None,
+              end: datetime.datetime | None = None) -> List[finance.Stock | None]:
+    try:
+        return data.get_many_resampled(names, interval, columns, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+
+
+def simulated_columns(execution: ExecutionRequest | None) -> List[finance.ValueKind]:
+    """
+    Returns the columns a simulation reads: the closes, and the volumes when the costs depend on them
+    """
+    if execution is not None and execution.model().uses_volume:
+        return [finance.ValueKind.Close, finance.ValueKind.Volume]
+    return [finance.ValueKind.Close]
+
+
+def job_info(job: database.JobRecord, cached: bool = False) -> JobInfo:
+    return JobInfo(ID=job.ID, Status=job.Status, Cached=cached, Created=job.Created, Finished=job.Finished,
+                   Error=job.Error)
+
+
+@app.post("/jobs")
+async def post_job(req: BacktestRequest, data: database.StockData = Depends(database.get_singleton),
+                   runner: jobs.JobRunner = Depends(jobs.get_job_runner)) -> JobInfo:
+    """
+
+    Args:
+        req: the algorithm, its parameters and the stocks
+        data: database singleton object
+        runner: runs the backtests in the background
+
+    Returns:
+        the queued job, or the job of an identical request on the same bars if there is one
+    """
+    stock = resampled(data, req.Stocks, req.Interval, simulated_columns(req.Execution))
+    for s, val in zip(req.Stocks, stock):
+        if val is None:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"stock {s} not found")
+
+    job, cached = runner.submit(req, stock)
+    return job_info(job, cached)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, runner: jobs.JobRunner = Depends(jobs.get_job_runner)) -> JobInfo:
+    """
+
+    Args:
+        job_id: id of the job
+        runner: runs the backtests in the background
+
+    Returns:
+        status of the job
+    """
+    job = runner.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Job not found")
+    return job_info(job)
+
+
+@app.get("/jobs/{job_id}/result", response_model=AlgorithmResult)
+async def get_job_result(job_id: str, runner: jobs.JobRunner = Depends(jobs.get_job_runner)) -> Response:
+    """
+
+    Args:
+        job_id: id of the job
+        runner: runs the backtests in the background
+
+    Returns:
+        the result of a finished job
+    """
+    job = runner.status(job_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Job not found")
+    if job.Status != finance.JobStatus.done:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=f"Job is {job.Status.value}")
+    return Response(content=job.Result, media_type="application/json")
+
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str, runner: jobs.JobRunner = Depends(jobs.get_job_runner)) -> JobInfo:
+    """
+
+    Args:
+        job_id: id of the job
+        runner: runs the backtests in the background
+
+    Returns:
+        the job, cancelled unless it had already ended
+    """
+    job = runner.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Job not found")
+    return job_info(job)
+
+
 @app.post("/{symbol}")
 async def post_symbol(symbol: finance.Symbols,
                       period: Annotated[str, Query(title="period", description="time period of data")] = "7d",
                       interval: Annotated[str, Query(title="interval", description="interval between ticks")] = "1m",
                       no_cache: Annotated[
                           bool, Query(title="no_cache", description="Whether we want to skip cached data")] = False,
-                      data: database.StockData = Depends(database.get_singleton)) -> StockInfo:
+                      incremental: Annotated[
+                          bool, Query(title="incremental",
+                                      description="fetch only bars newer than the cached ones, period becomes the "
+                                                  "retention window")] = False,
+                      data: database.StockData = Depends(database.get_singleton),
+                      fetcher: database.Fetcher = Depends(database.get_fetcher)) -> StockInfo:
     """
 
     Args:
         no_cache: skip cache data
+        incremental: append the bars newer than the cached ones instead of downloading the whole period
         interval: interval between ticks
         period: time period for what you want the stock data
         symbol: the symbol you want to add in the trading computation
         data: database singleton object
+        fetcher: downloads and stores the stock off the event loop
 
     Returns:
 
     """
+    check_period(period)
+    if incremental:
+        return conv_stock(await fetcher.refresh(symbol, period, interval))
 
     if not no_cache:
         # if already in database skip adding
@@ -43,8 +283,7 @@ async def post_symbol(symbol: finance.Symbols,
         if stk is not None:
             return conv_stock(stk)
 
-    stk = finance.Stock(symbol, period=period, interval=interval)
-    data.insert(stk)
+    stk = await fetcher.fetch(symbol, period, interval)
     return conv_stock(stk)
 
 
@@ -67,22 +306,209 @@ async def delete_symbol(symbol: finance.Symbols, data: database.StockData = Depe
 
 
 @app.get("/{symbol}/history")
-async def get_history(symbol: finance.Symbols, data: database.StockData = Depends(database.get_singleton)) -> StockInfo:
+async def get_history(symbol: finance.Symbols,
+                      start: Annotated[
+                          datetime.datetime | None, Query(description="first time included")] = None,
+                      end: Annotated[
+                          datetime.datetime | None, Query(description="last time included")] = None,
+                      fields: Annotated[
+                          List[finance.ValueKind] | None,
+                          Query(description="columns to return, ndjson and binary only")] = None,
+                      every: Annotated[int, Query(description="return every nth bar", ge=1)] = 1,
+                      interval: Annotated[
+                          str | None, Query(description="interval of the bars, built from the stored ones")] = None,
+                      fmt: Annotated[
+                          finance.HistoryFormat, Query(alias="format", description="format of the response")
+                      ] = finance.HistoryFormat.json,
+                      data: database.StockData = Depends(database.get_singleton)):
     """
 
     Args:
         data: database singleton object
         symbol: Symbol is the symbol you are looking for
+        start: first time included
+        end: last time included
+        fields: columns to return when streaming, all of open, high, low, close and volume by default
+        every: downsampling step
+        interval: coarser interval the stored bars are aggregated to, e.g. 5m, 1h or 1d
+        fmt: json returns the openings and closings, ndjson streams one bar per line and binary streams the columns
+            in the binary encoding of the database
 
     Returns:
         the symbol's history
 
     """
+    if fmt == finance.HistoryFormat.json:
+        fields = [finance.ValueKind.Open, finance.ValueKind.Close]
+    stk = resampled(data, [symbol], interval, fields, start, end)[0]
+    if stk is None:
+        raise HTTPException(status_code=404, detail="Symbol not found, kindly register it first using /add_symbol")
+
+    # the stock only holds the bars between start and end
+    rows = slice(None)
+    if fmt == finance.HistoryFormat.json:
+        rows = slice(rows.start, rows.stop, every)
+        return StockInfo(Openings=stk.array(finance.ValueKind.Open)[rows].tolist(),
+                         Closings=stk.array(finance.ValueKind.Close)[rows].tolist())
+
+    df = history.select(stk, fields or list(finance.ValueKind), rows, every)
+    if fmt == finance.HistoryFormat.ndjson:
+        return StreamingResponse(history.ndjson(df), media_type="application/x-ndjson")
+    return StreamingResponse(history.binary(df, stk.name), media_type="application/octet-stream")
+
+
+@app.get("/{symbol}/indicators/{indicator}")
+async def get_indicator(symbol: finance.Symbols, indicator: finance.Indicator,
+                        kind: Annotated[
+                            finance.ValueKind | None, Query(description="column the indicator is computed on")] = None,
+                        window: Annotated[int | None, Query(description="bars in the rolling window", ge=1)] = None,
+                        span: Annotated[int | None, Query(description="span of the exponential average", ge=1)] = None,
+                        periods: Annotated[int | None, Query(description="bars between returns", ge=1)] = None,
+                        log: Annotated[bool | None, Query(description="logarithmic returns")] = None,
+                        data: database.StockData = Depends(database.get_singleton)) -> IndicatorValues:
+    """
+
+    Args:
+        symbol: the symbol you want the indicator of
+        indicator: the indicator
+        kind: column the indicator is computed on, close by default
+        window: bars in the rolling window of sma, std and vwap
+        span: span of ema
+        periods: bars between returns
+        log: whether returns are logarithmic
+        data: database singleton object
+
+    Returns:
+        the indicator, computed once per version of the bars and shared with every other request
+    """
     stk = data.get_by_name(symbol)
     if stk is None:
         raise HTTPException(status_code=404, detail="Symbol not found, kindly register it first using /add_symbol")
 
-    return conv_stock(stk)
+    given = {"kind": kind, "window": window, "span": span, "periods": periods, "log": log}
+    params = {k: v for k, v in given.items() if v is not None}
+    _, defaults = finance.indicators.KERNELS[indicator]
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
+                            detail=f"{indicator.value} doesn't take {', '.join(sorted(unknown))}")
+
+    values = await profiling.run(finance.indicator, stk, indicator, **params)
+    return IndicatorValues(Indicator=finance.indicators.key(indicator, {**defaults, **params}),
+                           Values=[None if v != v else v for v in values.tolist()])
+
+
+def chart_trades(data: database.StockData, job: database.JobRecord, symbol: str, index: pandas.Index,
+                 interval: str | None = None,
+                 end: datetime.datetime | None = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Finds the bar of the chart every transaction of a backtest on the symbol happened at
+    Args:
+        data: database singleton object
+        job: the finished backtest
+        symbol: the charted symbol
+        index: timestamps of the charted bars
+        interval: interval of the charted bars, a transaction later than the last bar plus this is past the chart
+        end: last time charted
+
+    Returns:
+        the bar of every transaction, -1 outside the charted bars, and whether it is a buy
+    """
+    req = BacktestRequest.model_validate_json(job.Request)
+    res = AlgorithmResult.model_validate_json(job.Result)
+    ticks = numpy.array([t.Tick for t in res.Transactions if t.StockName == symbol], dtype=numpy.int64)
+    buys = numpy.array([t.Type == finance.TransactionType.BUY for t in res.Transactions if t.StockName == symbol],
+                       dtype=bool)
+    if not len(ticks):
+        return ticks, buys
+
+    stocks = resampled(data, req.Stocks, req.Interval, [finance.ValueKind.Close])
+    if any(stk is None for stk in stocks):
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Stocks of the job are gone")
+    if req.Algo == finance.Algos.percent and req.Align != finance.Alignment.tick:
+        timeline = finance.PriceMatrix(stocks, req.Align).Index
+    else:
+        # a stock shorter than the timeline repeats its last bar
+        timeline = stocks[req.Stocks.index(symbol)].index
+    if not len(timeline) or not len(index):
+        return ticks[:0], buys[:0]
+
+    # the square off tick is one past the end of the timeline
+    times = timeline[numpy.minimum(ticks, len(timeline) - 1)]
+    bars = index.searchsorted(times, side="right") - 1
+    stop = index[-1] + (to_timedelta(interval) if interval is not None else datetime.timedelta())
+    past = times >= stop if interval is not None else times > stop
+    if end is not None and isinstance(index, pandas.DatetimeIndex):
+        past |= times > finance.index_time(end, index)
+    return numpy.where(past, -1, bars), buys
+
+
+@app.get("/{symbol}/chart")
+async def get_chart(symbol: finance.Symbols,
+                    start: Annotated[datetime.datetime | None, Query(description="first time included")] = None,
+                    end: Annotated[datetime.datetime | None, Query(description="last time included")] = None,
+                    interval: Annotated[
+                        str | None, Query(description="interval of the bars, the one of the job by default")] = None,
+                    width: Annotated[
+                        int, Query(description="width in pixels", ge=100, le=plotting.MAX_WIDTH)
+                    ] = plotting.DEFAULT_WIDTH,
+                    height: Annotated[
+                        int, Query(description="height in pixels", ge=100, le=plotting.MAX_HEIGHT)
+                    ] = plotting.DEFAULT_HEIGHT,
+                    fmt: Annotated[
+                        finance.ChartFormat, Query(alias="format", description="format of the chart")
+                    ] = finance.ChartFormat.svg,
+                    job: Annotated[str | None, Query(description="backtest whose transactions are marked")] = None,
+                    data: database.StockData = Depends(database.get_singleton),
+                    runner: jobs.JobRunner = Depends(jobs.get_job_runner)) -> Response:
+    """
+
+    Args:
+        symbol: the symbol to chart
+        start: first time included
+        end: last time included
+        interval: coarser interval the stored bars are aggregated to, the interval of the job by default
+        width: width in pixels, the bars are downsampled to it keeping the high and low of every pixel column
+        height: height in pixels
+        fmt: svg, html or png
+        job: id of a finished backtest, see /jobs, its buys and sells on the symbol are marked on the chart
+        data: database singleton object
+        runner: runs the backtests in the background
+
+    Returns:
+        the chart, or 503 when it takes longer than the render budget
+    """
+    record = None
+    if job is not None:
+        record = runner.status(job, with_result=True)
+        if record is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Job not found")
+        if record.Status != finance.JobStatus.done:
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=f"Job is {record.Status.value}")
+        if interval is None:
+            interval = BacktestRequest.model_validate_json(record.Request).Interval
+
+    stk = resampled(data, [symbol], interval, [finance.ValueKind.Open, finance.ValueKind.High,
+                                               finance.ValueKind.Low, finance.ValueKind.Close], start, end)[0]
+    if stk is None:
+        raise HTTPException(status_code=404, detail="Symbol not found, kindly register it first using /add_symbol")
+
+    def draw() -> bytes:
+        trades = None
+        if record is not None:
+            with instrumentation.timer("markers"):
+                trades = chart_trades(data, record, symbol.value, stk.index, stk.interval, end)
+        with instrumentation.timer("render"):
+            return plotting.render(stk, trades=trades, width=width, height=height, fmt=fmt)
+
+    try:
+        content = await asyncio.wait_for(profiling.run(draw), CHART_BUDGET)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail="Chart took too long to render")
+
+    media = {finance.ChartFormat.svg: "image/svg+xml", finance.ChartFormat.html: "text/html",
+             finance.ChartFormat.png: "image/png"}
+    return Response(content=content, media_type=media[fmt])
 
 
 @app.post("/algorithm/{algo}")
@@ -95,30 +521,202 @@ async def post_algorithm(algo: finance.Algos,
                              float, Query(description="accepted percentage change before buying")] = 0.5,
                          volatility: Annotated[
                              float, Query(description="accepted volatility when buying")] = 0.5,
-                         data: database.StockData = Depends(database.get_singleton)) -> AlgorithmResult:
+                         metrics: Annotated[
+                             bool, Query(description="add the equity curve and performance metrics")] = False,
+                         align: Annotated[
+                             finance.Alignment,
+                             Query(description="how the bars of the stocks are matched, percent only")
+                         ] = finance.Alignment.union,
+                         interval: Annotated[
+                             str | None, Query(description="interval of the bars, built from the stored ones")] = None,
+                         mode: Annotated[
+                             finance.Simulation, Query(description="how percent is simulated, same result either way")
+                         ] = finance.Simulation.tick,
+                         data: database.StockData = Depends(database.get_singleton),
+                         runner: jobs.JobRunner = Depends(jobs.get_job_runner)) -> AlgorithmResult:
+    """
+
+    Args:
+        algo: the algorithm to run
+        cash: cash the portfolio starts with
+        stocks: stocks to run it on
+        threshold: accepted percentage change before buying, percent only
+        volatility: accepted volatility when buying, percent only
+        metrics: whether to add the equity curve and performance metrics
+        align: how the bars of the stocks are matched, percent only
+        interval: coarser interval the stored bars are aggregated to before running
+        mode: tick evaluates every stock on every tick, event jumps between the ticks where a trade can happen
+        data: database singleton object
+        runner: stores the result under the portfolio id, see /jobs
+
+    Returns:
+        the portfolio, a stored result when the same request ran before on the same bars
+    """
     if volatility < 0 or volatility > 1:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Volatility should be between 0 and 1")
 
     if threshold < 0 or threshold > 1:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Threshold should be between 0 and 1")
-    # portfolio is the which will be produced by the algorithm
-    p: finance.Portfolio
+    if not stocks:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="No stocks given")
 
-    stock = []
-    for s in stocks:
-        val = data.get_by_name(s)
+    stock = resampled(data, stocks, interval, [finance.ValueKind.Close])
+    for s, val in zip(stocks, stock):
         if val is None:
             raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"stock {s} not found")
-        else:
-            stock.append(val)
-
-    match algo:
-        case finance.Algos.A:
-            p = finance.Algorithms.A(cash=cash, stocks=stock)
-        case finance.Algos.percent:
-            p = finance.Algorithms.Threshold(cash=cash, stocks=stock, threshold=threshold, volatility=volatility)
-        case _:
-            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Algorithm not found")
-
-    return AlgorithmResult(Transactions=p.get_all_transactions(), Value=p.Cash,
-                           Holdings=p.holdings)
+
+    req = BacktestRequest(Algo=algo, Stocks=stocks, Cash=cash, Threshold=threshold, Volatility=volatility,
+                          Align=align, Metrics=metrics, Interval=interval, Mode=mode)
+    res, _ = await profiling.run(runner.run, req, stock)
+    if isinstance(res, str):
+        # an identical request was computed before, its stored result is returned as is
+        return Response(content=res, media_type="application/json")
+    return res
+
+
+@app.post("/algorithm/{algo}/batch")
+async def post_batch(algo: finance.Algos, req: ScheduleRequest,
+                     data: database.StockData = Depends(database.get_singleton)) -> ScheduleSummary:
+    """
+
+    Args:
+        algo: the algorithm, only A follows a schedule
+        req: the stocks and the schedule
+        data: database singleton object
+
+    Returns:
+        the portfolio of every stock, each starting with the whole cash
+    """
+    if algo != finance.Algos.A:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Algorithm {algo.value} has no schedule")
+
+    stock = resampled(data, req.Stocks, req.Interval, simulated_columns(req.Execution))
+    for s, val in zip(req.Stocks, stock):
+        if val is None:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"stock {s} not found")
+
+    schedule = finance.Schedule(Buys=req.Buys, Sells=req.Sells, Splits=req.Splits)
+    with instrumentation.timer("simulate"):
+        results = await profiling.run(finance.schedule_batch, req.Cash, stock, schedule,
+                                          req.Execution.model() if req.Execution is not None else None)
+
+    summary = ScheduleSummary(Results=[])
+    for name, r in zip(req.Stocks, results):
+        p = r.Portfolio
+        with instrumentation.timer("serialize"):
+            res = AlgorithmResult(ID=str(p.ID), Transactions=p.get_all_transactions(), Value=p.Cash,
+                                  Holdings=p.holdings)
+        if req.Metrics:
+            with instrumentation.timer("metrics"):
+                equity, res.Metrics = finance.evaluate_portfolio(p)
+                res.Equity = equity.tolist()
+        summary.Results.append(ScheduledResult(Symbol=name, Result=res, Error=r.Error))
+
+    return summary
+
+
+@app.post("/algorithm/{algo}/sweep")
+async def post_sweep(algo: finance.Algos, req: SweepRequest,
+                     stream: Annotated[
+                         bool, Query(description="stream every result as a json line while the sweep runs")] = False,
+                     metrics: Annotated[
+                         bool, Query(description="add performance metrics to every result")] = False,
+                     align: Annotated[
+                         finance.Alignment, Query(description="how the bars of the stocks are matched")
+                     ] = finance.Alignment.union,
+                     mode: Annotated[
+                         finance.Simulation, Query(description="how every grid point is simulated")
+                     ] = finance.Simulation.tick,
+                     data: database.StockData = Depends(database.get_singleton)) -> SweepSummary:
+    """
+
+    Args:
+        algo: the algorithm to sweep, only percent has parameters to sweep
+        req: the stocks and the grid of parameters
+        stream: whether to stream partial results as newline delimited json, the last line holds the ranking
+        metrics: whether to evaluate drawdown, sharpe, turnover and win rate of every result
+        align: how the bars of the stocks are matched, union by default
+        mode: tick or event, event is faster for grid points that trade rarely and gives the same results
+        data: database singleton object
+
+    Returns:
+        the results of every parameter set ranked by final value
+    """
+    if algo != finance.Algos.percent:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Algorithm {algo.value} has no parameters")
+
+    thresholds = req.Thresholds.expand()
+    volatilities = req.Volatilities.expand()
+    cashes = req.Cash.expand()
+    if any(v < 0 or v > 1 for v in volatilities):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Volatility should be between 0 and 1")
+    if any(t < 0 or t > 1 for t in thresholds):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Threshold should be between 0 and 1")
+
+    stock = data.get_many(req.Stocks, [finance.ValueKind.Close])
+    for s, val in zip(req.Stocks, stock):
+        if val is None:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"stock {s} not found")
+
+    results = finance.sweep(stock, thresholds, volatilities, cashes, metrics=metrics, align=align, mode=mode)
+    if not stream:
+        return SweepSummary(Results=finance.rank(await profiling.run(list, results)))
+
+    def lines():
+        done = []
+        for r in results:
+            done.append(r)
+            yield SweepSummary(Results=[r]).model_dump_json() + "\n"
+        yield SweepSummary(Results=finance.rank(done)).model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/algorithm/{algo}/walkforward")
+async def post_walk_forward(algo: finance.Algos, req: WalkForwardRequest,
+                            align: Annotated[
+                                finance.Alignment, Query(description="how the bars of the stocks are matched")
+                            ] = finance.Alignment.union,
+                            mode: Annotated[
+                                finance.Simulation, Query(description="how every run is simulated")
+                            ] = finance.Simulation.tick,
+                            interval: Annotated[
+                                str | None, Query(description="interval of the bars, built from the stored ones")
+                            ] = None,
+                            data: database.StockData = Depends(database.get_singleton)) -> WalkForwardSummary:
+    """
+
+    Args:
+        algo: the algorithm to validate, only percent has parameters to fit
+        req: the stocks, the grid of parameters and the windows
+        align: how the bars of the stocks are matched, union by default
+        mode: tick or event, both give the same results
+        interval: coarser interval the stored bars are aggregated to before running
+        data: database singleton object
+
+    Returns:
+        the parameters picked on every train window, their result on the following test window and the test
+        windows chained into one out of sample run
+    """
+    if algo != finance.Algos.percent:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Algorithm {algo.value} has no parameters")
+
+    thresholds = req.Thresholds.expand()
+    volatilities = req.Volatilities.expand()
+    if not thresholds or not volatilities:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="The grid of parameters is empty")
+    if any(v < 0 or v > 1 for v in volatilities):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Volatility should be between 0 and 1")
+    if any(t < 0 or t > 1 for t in thresholds):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Threshold should be between 0 and 1")
+
+    stock = resampled(data, req.Stocks, interval, [finance.ValueKind.Close])
+    for s, val in zip(req.Stocks, stock):
+        if val is None:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"stock {s} not found")
+
+    res = await profiling.run(finance.walk_forward, stock, thresholds, volatilities, req.Cash, req.Train,
+                                  req.Test, step=req.Step, anchored=req.Anchored, align=align, mode=mode)
+    if not res.Windows:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="The timeline is shorter than a train window")
+    return WalkForwardSummary(Result=res)
@@ -0,0 +1,51 @@
+from typing import List, Iterator
+
+import numpy
+import pandas
+
+import finance
+from finance import codec
+
+# rows serialized at once, large enough to amortize the per chunk overhead and small enough to bound the memory
+CHUNK_ROWS = 8192
+CHUNK_BYTES = 64 * 1024
+
+TIME_COLNAME = "Time"
+
+
+def select(s: finance.Stock, fields: List[finance.ValueKind], rows: slice, every: int) -> pandas.DataFrame:
+    """
+    Builds a frame of the selected columns straight from the cached arrays of the stock, without copying them
+    Args:
+        s: the stock
+        fields: columns to keep
+        rows: rows to keep
+        every: keep every nth row of those
+
+    Returns:
+        dataframe of the selection
+    """
+    rows = slice(rows.start, rows.stop, every)
+    return pandas.DataFrame({kind.value: s.array(kind)[rows] for kind in fields}, index=s.index[rows], copy=False)
+
+
+def ndjson(df: pandas.DataFrame) -> Iterator[bytes]:
+    """
+    Serializes a frame as one json object per line, in chunks, with the time as epoch milliseconds
+    """
+    times = df.index.asi8 // 1_000_000 if isinstance(df.index, pandas.DatetimeIndex) else numpy.asarray(df.index)
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        chunk = pandas.DataFrame({TIME_COLNAME: times[start:start + CHUNK_ROWS], **chunk}, copy=False)
+        text = chunk.to_json(orient="records", lines=True)
+        # older pandas versions don't end the last line
+        yield (text if text.endswith("\n") else text + "\n").encode()
+
+
+def binary(df: pandas.DataFrame, name: str) -> Iterator[bytes]:
+    """
+    Serializes a frame in the binary encoding of the database, in chunks
+    """
+    buf = memoryview(codec.encode(df, {finance.NAME_KEY: name}))
+    for start in range(0, len(buf), CHUNK_BYTES):
+        yield bytes(buf[start:start + CHUNK_BYTES])
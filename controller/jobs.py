@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Tuple
+
+import database
+import finance
+from utils import instrumentation
+from .stock_info import AlgorithmResult, BacktestRequest
+
+DEFAULT_WORKERS = 2
+
+
+def request_key(req: BacktestRequest, stocks: List[finance.Stock]) -> str:
+    """
+    Returns a key that is equal for requests that must produce the same result: same algorithm, parameters, stocks
+    and bars of those stocks
+    """
+    # both simulation modes give the same result, requests without costs keep the keys they had before costs existed
+    payload = req.model_dump(mode="json", exclude={"Mode"} if req.Execution is not None else {"Mode", "Execution"})
+    payload["Versions"] = [stk.version for stk in stocks]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def backtest(req: BacktestRequest, stocks: List[finance.Stock],
+             portfolio_id: uuid.UUID | None = None) -> AlgorithmResult:
+    """
+    Runs a backtest
+    Args:
+        req: the algorithm and its parameters
+        stocks: the stocks named in the request, in the same order
+        portfolio_id: id given to the portfolio, a new one by default
+
+    Returns:
+        the result, with the equity curve and metrics if the request asks for them
+    """
+    p: finance.Portfolio
+    execution = req.Execution.model() if req.Execution is not None else None
+    match req.Algo:
+        case finance.Algos.A:
+            ctx = finance.Context(stocks, cash=req.Cash, execution=execution)
+            if portfolio_id is not None:
+                ctx.Portfolio.ID = portfolio_id
+            with instrumentation.timer("simulate"):
+                p = finance.Algorithms.A(cash=req.Cash, stocks=stocks, ctx=ctx)
+        case finance.Algos.percent:
+            ctx = finance.Context(stocks, cash=req.Cash, allow_short=True, execution=execution)
+            if portfolio_id is not None:
+                ctx.Portfolio.ID = portfolio_id
+            p = finance.Engine.Threshold(cash=req.Cash, stocks=stocks, threshold=req.Threshold,
+                                         volatility=req.Volatility, ctx=ctx, align=req.Align,
+                                         mode=req.Mode)
+        case _:
+            raise ValueError(f"algorithm {req.Algo} not found")
+
+    with instrumentation.timer("serialize"):
+        res = AlgorithmResult(ID=str(p.ID), Transactions=p.get_all_transactions(), Value=p.Cash,
+                              Holdings=p.holdings)
+    if req.Metrics:
+        matrix = None
+        if req.Algo == finance.Algos.percent and req.Align != finance.Alignment.tick:
+            with instrumentation.timer("align"):
+                matrix = finance.PriceMatrix(stocks, req.Align)
+        with instrumentation.timer("metrics"):
+            equity, res.Metrics = finance.evaluate_portfolio(p, matrix=matrix)
+            res.Equity = equity.tolist()
+
+    return res
+
+
+class JobRunner:
+    """
+    JobRunner runs backtests on a pool of threads and keeps their status and results in the job store. A request
+    identical to one that is queued, running or done gets that job instead of a new one.
+
+    The queue lives in this process: jobs the store shows as queued or running that this runner doesn't know about
+    were cut short by a restart, they are reported as failed and computed again when asked for.
+    """
+
+    def __init__(self, store: database.JobStore, workers: int = DEFAULT_WORKERS):
+        self.Store: database.JobStore = store
+        self.__pool__ = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backtest")
+        self.__lock__ = threading.Lock()
+        self.__futures__: Dict[str, Future] = {}
+        self.__cancelled__: set = set()
+
+    def submit(self, req: BacktestRequest, stocks: List[finance.Stock]) -> Tuple[database.JobRecord, bool]:
+        """
+        Queues a backtest
+        Args:
+            req: the algorithm and its parameters
+            stocks: the stocks named in the request, in the same order
+
+        Returns:
+            the job and whether it was already there for an identical request
+        """
+        key = request_key(req, stocks)
+        job_id = str(uuid.uuid4())
+        with self.__lock__:
+            owner = self.Store.claim(job_id, key, req.model_dump_json())
+            if owner != job_id:
+                existing = self.__check__(self.Store.get(owner))
+                if existing is not None and existing.Status not in (finance.JobStatus.failed,
+                                                                    finance.JobStatus.cancelled):
+                    return existing, True
+                # the job owning the key is gone, claim it again
+                owner = self.Store.claim(job_id, key, req.model_dump_json())
+                if owner != job_id:
+                    return self.Store.get(owner), True
+
+            self.__futures__[job_id] = self.__pool__.submit(self.__run__, job_id, req, stocks)
+
+        return self.Store.get(job_id), False
+
+    def run(self, req: BacktestRequest, stocks: List[finance.Stock]) -> Tuple[AlgorithmResult | str, bool]:
+        """
+        Runs a backtest in the calling thread, unless an identical request already has a result. Nothing is written to
+        the store before the result exists, so queued and running jobs of the same request are left alone
+        Returns:
+            the result, as stored json when it was already there, and whether it was already there
+        """
+        key = request_key(req, stocks)
+        owner = self.Store.owner(key)
+        existing = self.Store.get(owner, with_result=True) if owner is not None else None
+        if existing is not None and existing.Status == finance.JobStatus.done and existing.Result is not None:
+            return existing.Result, True
+
+        job_id = str(uuid.uuid4())
+        res = backtest(req, stocks, uuid.UUID(job_id))
+        self.Store.save(job_id, key, req.model_dump_json(), res.model_dump_json())
+        return res, False
+
+    def status(self, job_id: str, with_result: bool = False) -> database.JobRecord | None:
+        """
+        Returns a job, None if it doesn't exist
+        """
+        return self.__check__(self.Store.get(job_id, with_result=with_result))
+
+    def cancel(self, job_id: str) -> database.JobRecord | None:
+        """
+        Cancels a job, a job that is already running finishes but its result is thrown away
+        Returns:
+            the job, None if it doesn't exist
+        """
+        with self.__lock__:
+            job = self.__check__(self.Store.get(job_id))
+            if job is None or job.Status not in (finance.JobStatus.queued, finance.JobStatus.running):
+                return job
+
+            self.__cancelled__.add(job_id)
+            future = self.__futures__.get(job_id)
+            if future is not None:
+                future.cancel()
+            self.Store.set_status(job_id, finance.JobStatus.cancelled)
+
+        return self.Store.get(job_id)
+
+    def shutdown(self):
+        self.__pool__.shutdown(wait=False, cancel_futures=True)
+
+    def __check__(self, job: database.JobRecord | None) -> database.JobRecord | None:
+        if job is None or job.Status not in (finance.JobStatus.queued, finance.JobStatus.running):
+            return job
+        if job.ID in self.__futures__:
+            return job
+
+        self.Store.set_status(job.ID, finance.JobStatus.failed, error="interrupted by a restart")
+        return self.Store.get(job.ID)
+
+    def __run__(self, job_id: str, req: BacktestRequest, stocks: List[finance.Stock]):
+        try:
+            with self.__lock__:
+                if job_id in self.__cancelled__:
+                    return
+                self.Store.set_status(job_id, finance.JobStatus.running)
+
+            try:
+                res = backtest(req, stocks, uuid.UUID(job_id))
+            except Exception as e:
+                logging.warning("Backtest %s failed: %s", job_id, e)
+                with self.__lock__:
+                    if job_id not in self.__cancelled__:
+                        self.Store.set_status(job_id, finance.JobStatus.failed, error=str(e))
+                return
+
+            with self.__lock__:
+                if job_id not in self.__cancelled__:
+                    self.Store.set_result(job_id, res.model_dump_json())
+        finally:
+            with self.__lock__:
+                self.__futures__.pop(job_id, None)
+                self.__cancelled__.discard(job_id)
+
+
+JobRunnerSingleton: JobRunner = JobRunner(database.get_job_store())
+
+
+def get_job_runner() -> JobRunner:
+    return JobRunnerSingleton
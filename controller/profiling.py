@@ -0,0 +1,111 @@
+import contextlib
+import contextvars
+import cProfile
+import pstats
+import threading
+from typing import List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+# request header asking for a profile of the request, its value is the number of functions to report
+PROFILE_HEADER = "X-Profile"
+# response header holding the profile
+PROFILE_STATS_HEADER = "X-Profile-Stats"
+# response header telling why a request asking for a profile got none
+PROFILE_SKIPPED_HEADER = "X-Profile-Skipped"
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# profilers can't be trusted to run side by side, so one request at a time is profiled
+_active = threading.Lock()
+# profiler of the request being handled, see run
+_profiler: contextvars.ContextVar[cProfile.Profile | None] = contextvars.ContextVar("profiler", default=None)
+
+
+def start() -> cProfile.Profile | None:
+    """
+    Returns a profiler for a request, None while another request is being profiled. Call stop when done
+    """
+    if not _active.acquire(blocking=False):
+        return None
+    return cProfile.Profile()
+
+
+def stop():
+    """
+    Lets the next request be profiled, once the request of the profiler returned by start is done
+    """
+    _active.release()
+
+
+@contextlib.contextmanager
+def attach(profiler: cProfile.Profile | None):
+    """
+    Makes a profiler the one of the code in it, the work it hands to run is profiled with it
+    """
+    token = _profiler.set(profiler)
+    try:
+        yield
+    finally:
+        _profiler.reset(token)
+
+
+async def run(fn, *args, **kwargs):
+    """
+    Runs a function in the thread pool like run_in_threadpool, profiled when the request asked for it. Only the
+    worker thread is profiled, so requests handled on the event loop in the meantime don't end up in the profile
+    """
+    return await run_in_threadpool(_profiled, fn, *args, **kwargs)
+
+
+def _profiled(fn, *args, **kwargs):
+    # run_in_threadpool copies the context, so this is the profiler of the request
+    profiler = _profiler.get()
+    if profiler is None:
+        return fn(*args, **kwargs)
+
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+
+
+def limit(value: str) -> int:
+    """
+    Reads the number of functions asked for in the profile header, anything that isn't a number gives the default
+    """
+    try:
+        return max(1, min(MAX_LIMIT, int(value)))
+    except ValueError:
+        return DEFAULT_LIMIT
+
+
+def summary(profiler: cProfile.Profile, n: int) -> str:
+    """
+    Lists the functions that spent the most time in their own code as
+    file:line(function)=calls/own ms/cumulative ms, separated by semicolons so it fits in a header. Empty when nothing
+    was profiled
+    """
+    profiler.create_stats()
+    if not profiler.stats:
+        return ""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (file, line, func), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append((own, f"{file.rsplit('/', 1)[-1]}:{line}({func})={calls}/{own * 1000:.3f}/{cumulative * 1000:.3f}"))
+    rows.sort(key=lambda r: r[0], reverse=True)
+    return ";".join(r[1] for r in rows[:n])
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """
+    Renders the stage timings of a request as a Server-Timing header, stages that ran several times are summed
+    """
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+
+    parts = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in durations.items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
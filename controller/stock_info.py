@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field
+import numpy
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Annotated
 
 import finance
-from finance import Stock, Transaction, Holdings
+from finance import Stock, Transaction, Holdings, SweepResult, WalkForwardResult
 
 
 class AlgorithmResult(BaseModel):
@@ -10,6 +11,68 @@ class AlgorithmResult(BaseModel):
     Transactions: Annotated[List[Transaction], Field(description="The transactions corresponding to the algorithm")]
     Value: Annotated[float, Field(description="Final Value after the algorithm has been run")]
     Holdings: Annotated[List[Holdings], Field(description="Current Holdings")]
+    Metrics: Annotated[finance.Metrics | None, Field(description="performance of the run, when asked for")] = None
+    Equity: Annotated[List[float] | None, Field(description="value of cash and positions on every tick")] = None
+
+
+class IndicatorValues(BaseModel):
+    Indicator: Annotated[str, Field(description="the indicator and its parameters")]
+    Values: Annotated[List[float | None], Field(description="one value per bar, null where it is not defined")]
+
+
+class ExecutionRequest(BaseModel):
+    """
+    Costs and volume limits the orders are filled with, see finance.ExecutionModel
+    """
+    Fee: Annotated[float, Field(description="fixed fee per trade", ge=0)] = 0.0
+    FeeRate: Annotated[float, Field(description="fee as a share of the traded amount", ge=0, le=1)] = 0.0
+    Spread: Annotated[float, Field(description="bid ask spread as a share of the price", ge=0, le=1)] = 0.0
+    Impact: Annotated[float, Field(description="slippage as a share of the price per share of the bar volume taken",
+                                   ge=0)] = 0.0
+    Participation: Annotated[float | None, Field(description="largest share of the bar volume a trade fills",
+                                                 gt=0, le=1)] = None
+
+    def model(self) -> finance.ExecutionModel:
+        return finance.ExecutionModel(Fee=self.Fee, FeeRate=self.FeeRate, Spread=self.Spread, Impact=self.Impact,
+                                      Participation=self.Participation)
+
+
+class BacktestRequest(BaseModel):
+    Algo: Annotated[finance.Algos, Field(description="the algorithm to run")]
+    Stocks: Annotated[List[str], Field(description="stocks to be taken under consideration for computation",
+                                       min_length=1, examples=[["rvnl.ns"]])]
+    Cash: Annotated[float, Field(description="Amount of cash for the transaction")]
+    Threshold: Annotated[float, Field(description="accepted percentage change before buying", ge=0, le=1)] = 0.5
+    Volatility: Annotated[float, Field(description="accepted volatility when buying", ge=0, le=1)] = 0.5
+    Align: Annotated[finance.Alignment, Field(description="how the bars of the stocks are matched, percent only")] = \
+        finance.Alignment.union
+    Metrics: Annotated[bool, Field(description="add the equity curve and performance metrics")] = False
+    Interval: Annotated[str | None, Field(description="interval of the bars, built from the stored ones",
+                                          examples=["5m"])] = None
+    Mode: Annotated[finance.Simulation, Field(description="how percent is simulated, both give the same result")] = \
+        finance.Simulation.tick
+    Execution: Annotated[ExecutionRequest | None, Field(description="fees, spread, slippage and fill limits, "
+                                                                    "none by default")] = None
+
+
+class JobInfo(BaseModel):
+    ID: Annotated[str, Field(description="id of the job, the id of the portfolio of its result")]
+    Status: Annotated[finance.JobStatus, Field(description="where the job is")]
+    Cached: Annotated[bool, Field(description="whether an identical request already had a job")] = False
+    Created: Annotated[float, Field(description="unix time the job was created at")]
+    Finished: Annotated[float | None, Field(description="unix time the job ended at")] = None
+    Error: Annotated[str | None, Field(description="why the job failed")] = None
+
+
+class SymbolStatus(BaseModel):
+    Symbol: Annotated[str, Field(description="the symbol")]
+    Status: Annotated[str, Field(description="cached, fetched or failed")]
+    Bars: Annotated[int, Field(description="number of bars stored for the symbol")] = 0
+    Error: Annotated[str | None, Field(description="why the symbol failed")] = None
+
+
+class BulkResult(BaseModel):
+    Results: Annotated[List[SymbolStatus], Field(description="status of every requested symbol")]
 
 
 class StockInfo(BaseModel):
@@ -19,3 +82,83 @@ class StockInfo(BaseModel):
 
 def conv_stock(s: Stock) -> StockInfo:
     return StockInfo(Openings=s.values(finance.ValueKind.Open), Closings=s.values())
+
+
+class ParameterGrid(BaseModel):
+    """
+    Values of a parameter to sweep over, either listed explicitly or as an inclusive range
+    """
+    Values: Annotated[List[float] | None, Field(description="explicit values")] = None
+    Start: Annotated[float | None, Field(description="first value of the range")] = None
+    Stop: Annotated[float | None, Field(description="last value of the range, inclusive")] = None
+    Step: Annotated[float | None, Field(description="step between values of the range", gt=0)] = None
+
+    @model_validator(mode="after")
+    def check(self):
+        if self.Values is None and (self.Start is None or self.Stop is None or self.Step is None):
+            raise ValueError("either Values or Start, Stop and Step are needed")
+        return self
+
+    def expand(self) -> List[float]:
+        if self.Values is not None:
+            return list(self.Values)
+
+        # rounding drops the floating point noise arange accumulates
+        return numpy.round(numpy.arange(self.Start, self.Stop + self.Step / 2, self.Step), 10).tolist()
+
+
+class SweepRequest(BaseModel):
+    Stocks: Annotated[List[str], Field(description="stocks to be taken under consideration for computation",
+                                       min_length=1, examples=[["rvnl.ns"]])]
+    Thresholds: Annotated[ParameterGrid, Field(description="accepted percentage changes before buying")]
+    Volatilities: Annotated[ParameterGrid, Field(description="accepted volatilities when buying")]
+    Cash: Annotated[ParameterGrid, Field(description="amounts of cash for the transactions")]
+
+
+class SweepSummary(BaseModel):
+    Results: Annotated[List[SweepResult], Field(description="results ranked by final value")]
+
+
+class WalkForwardRequest(BaseModel):
+    Stocks: Annotated[List[str], Field(description="stocks to be taken under consideration for computation",
+                                       min_length=1, examples=[["rvnl.ns"]])]
+    Thresholds: Annotated[ParameterGrid, Field(description="accepted percentage changes tried on every train window")]
+    Volatilities: Annotated[ParameterGrid, Field(description="accepted volatilities tried on every train window")]
+    Cash: Annotated[float, Field(description="Amount of cash of every run")]
+    Train: Annotated[int, Field(description="ticks of every train window", ge=2)]
+    Test: Annotated[int, Field(description="ticks of every test window", ge=1)]
+    Step: Annotated[int | None, Field(description="ticks between two windows, Test by default", ge=1)] = None
+    Anchored: Annotated[bool, Field(description="whether every train window starts at the first tick")] = False
+
+
+class WalkForwardSummary(BaseModel):
+    Result: Annotated[WalkForwardResult, Field(description="every window and the test windows chained together")]
+
+
+class ScheduleRequest(BaseModel):
+    Stocks: Annotated[List[str], Field(description="stocks the schedule runs on, each with its own portfolio",
+                                       min_length=1, examples=[["rvnl.ns", "msft"]])]
+    Cash: Annotated[float, Field(description="Amount of cash of every portfolio")]
+    Buys: Annotated[List[Annotated[float, Field(ge=0, lt=1)]],
+                    Field(description="fractions of the timeline to buy at", min_length=1)] = \
+        [0.05, 0.35, 0.65, 0.75, 0.95]
+    Sells: Annotated[List[Annotated[float, Field(ge=0, lt=1)]],
+                     Field(description="fractions of the timeline to sell the last bought quantity at")] = \
+        [0.25, 0.41, 0.70, 0.90, 0.99]
+    Splits: Annotated[int | None, Field(description="equal parts the cash is split in, one per buy by default",
+                                        ge=1)] = None
+    Metrics: Annotated[bool, Field(description="add the equity curve and performance metrics")] = False
+    Interval: Annotated[str | None, Field(description="interval of the bars, built from the stored ones",
+                                          examples=["5m"])] = None
+    Execution: Annotated[ExecutionRequest | None, Field(description="fees, spread, slippage and fill limits, "
+                                                                    "none by default")] = None
+
+
+class ScheduledResult(BaseModel):
+    Symbol: Annotated[str, Field(description="the stock")]
+    Result: Annotated[AlgorithmResult, Field(description="portfolio of the stock")]
+    Error: Annotated[str | None, Field(description="why the schedule stopped early on this stock")] = None
+
+
+class ScheduleSummary(BaseModel):
+    Results: Annotated[List[ScheduledResult], Field(description="one result per stock, in the order asked for")]
@@ -1 +1,5 @@
+from .cache import *
 from .stock_data import *
+from .fetcher import *
+from .jobs import *
+from .bars import *
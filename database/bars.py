@@ -0,0 +1,308 @@
+import datetime
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy
+import pandas
+
+import finance
+from finance import codec
+from utils import instrumentation
+
+DEFAULT_BARS_PATH = './data/bars'
+MANIFEST = "manifest.json"
+INDEX_FILE = "index.npy"
+
+
+def _to_ns(t: datetime.datetime, tz: str | None) -> int:
+    """
+    Returns a time as nanoseconds since the epoch in UTC, naive times are taken in the given timezone
+    """
+    t = pandas.Timestamp(t)
+    if t.tz is None:
+        t = t.tz_localize(tz if tz is not None else "UTC")
+    return int(t.tz_convert("UTC").as_unit("ns").value)
+
+
+def _index_ns(index: pandas.DatetimeIndex) -> numpy.ndarray:
+    """
+    Returns a datetime index as little endian nanoseconds since the epoch in UTC
+    """
+    index = index.tz_convert("UTC").tz_localize(None) if index.tz is not None else index
+    return index.as_unit("ns").asi8.astype("<i8", copy=False)
+
+
+def _valid(name: str) -> bool:
+    # every stock is a directory right under the root
+    separators = [os.sep] + ([os.altsep] if os.altsep else [])
+    return bool(name) and name not in (".", "..") and not any(sep in name for sep in separators)
+
+
+class BarStore:
+    """
+    BarStore keeps long histories on disk as one directory per symbol, holding one directory per day with a .npy
+    file per column and one for the index (nanoseconds since the epoch in UTC). The files are memory mapped read
+    only, so a read over a date range only touches the pages of the days in the range.
+
+    manifest.json of a symbol lists its days with their first and last time, and is the only thing readers trust:
+    writers put new day files in fresh directories and replace the manifest atomically, readers never see half an
+    append. A single process is expected to write a symbol at a time.
+    """
+
+    def __init__(self, root: str = DEFAULT_BARS_PATH):
+        self.Root: str = root
+        self.__locks__: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+    def write(self, stk: finance.Stock):
+        """
+        Stores all the bars of a stock, replacing the ones stored before
+        Args:
+            stk: stock indexed by time
+        """
+        if not _valid(stk.name):
+            raise ValueError(f"{stk.name} can't be stored as a directory")
+        with self.__locks__[stk.name]:
+            old = self.manifest(stk.name)
+            generation = 0 if old is None else old["Generation"] + 1
+            manifest = self.__new_manifest__(stk.name, stk.df, stk.interval, generation)
+            manifest["Days"] = self.__write_days__(stk.name, stk.df, manifest["Generation"])
+            self.__commit__(stk.name, manifest, old)
+
+    def append(self, name: str, df: pandas.DataFrame, interval: str | None = None) -> int:
+        """
+        Appends the bars newer than the last stored one, only the files of the last stored day are rewritten
+        Args:
+            name: name of the stock, it is created if it isn't stored
+            df: new bars indexed by time, bars that are already stored are skipped
+            interval: interval between the bars, used when the stock is created
+
+        Returns:
+            number of bars appended
+        """
+        if not _valid(name):
+            raise ValueError(f"{name} can't be stored as a directory")
+        with self.__locks__[name]:
+            old = self.manifest(name)
+            if old is None:
+                manifest = self.__new_manifest__(name, df, interval, 0)
+                manifest["Days"] = self.__write_days__(name, df, 0)
+                self.__commit__(name, manifest, None)
+                return len(df)
+
+            new = finance.localize(df[[col["name"] for col in old["Columns"]]], old["Tz"])
+            days = old["Days"]
+            if days:
+                new = new[_index_ns(new.index) > days[-1]["Last"]]
+            if new.empty:
+                return 0
+            appended = len(new)
+
+            if days and next(iter(codec.split_days(new))) == days[-1]["Day"]:
+                # the last stored day grows, it is rewritten as a whole in the new generation
+                last = self.read(name, start=pandas.Timestamp(days[-1]["First"], tz="UTC"))
+                new = pandas.concat([last.df, new])
+                days = days[:-1]
+
+            manifest = dict(old, Generation=old["Generation"] + 1)
+            manifest["Days"] = days + self.__write_days__(name, new, manifest["Generation"])
+            self.__commit__(name, manifest, old)
+            return appended
+
+    def manifest(self, name: str) -> Dict | None:
+        """
+        Reads the manifest of a stock
+        Returns:
+            the manifest, None if the stock is not stored
+        """
+        if not _valid(name):
+            return None
+        try:
+            with open(os.path.join(self.Root, name, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of the stored stocks
+        """
+        if not os.path.isdir(self.Root):
+            return []
+        return sorted(n for n in os.listdir(self.Root) if os.path.isfile(os.path.join(self.Root, n, MANIFEST)))
+
+    def read(self, name: str, start: datetime.datetime | None = None, end: datetime.datetime | None = None,
+             columns: List[str] | None = None) -> finance.Stock | None:
+        """
+        Reads the bars of a stock between two times, found by binary search on the days and then on the index of
+        the days at the ends of the range
+        Args:
+            name: name of the stock
+            start: first time included, naive times are taken in the timezone of the stock
+            end: last time included
+            columns: columns to read, all by default
+
+        Returns:
+            a stock over the mapped files, None if the stock is not stored. The files of the range are mapped right
+            away, so the stock outlives later appends, and are joined one column at a time when a column is first
+            used. A column of a single day is the mapped file itself
+        """
+        for _ in range(2):
+            manifest = self.manifest(name)
+            if manifest is None:
+                return None
+            try:
+                with instrumentation.timer("read"):
+                    return self.__read__(manifest, start, end, columns)
+            except FileNotFoundError:
+                # an append replaced the files of the manifest meanwhile, the new manifest lists the new ones
+                continue
+
+        raise RuntimeError(f"{name} changed while it was read")
+
+    def delete(self, name: str):
+        """
+        Deletes a stock, readers holding its mapped files can keep using them
+        """
+        if not _valid(name):
+            return
+        with self.__locks__[name]:
+            shutil.rmtree(os.path.join(self.Root, name), ignore_errors=True)
+
+    def __read__(self, manifest: Dict, start: datetime.datetime | None, end: datetime.datetime | None,
+                 columns: List[str] | None) -> finance.Stock:
+        tz = manifest["Tz"]
+        names = columns if columns is not None else [col["name"] for col in manifest["Columns"]]
+        days = manifest["Days"]
+        lo = _to_ns(start, tz) if start is not None else None
+        hi = _to_ns(end, tz) if end is not None else None
+
+        first = 0 if lo is None else int(numpy.searchsorted([d["Last"] for d in days], lo, side="left"))
+        last = len(days) if hi is None else int(numpy.searchsorted([d["First"] for d in days], hi, side="right"))
+
+        index_parts: List[numpy.ndarray] = []
+        column_parts: Dict[str, List[numpy.ndarray]] = {n: [] for n in names}
+        for day in days[first:last]:
+            path = os.path.join(self.Root, manifest["Name"], day["Path"])
+            index = numpy.load(os.path.join(path, INDEX_FILE), mmap_mode="r")
+            rows = slice(0 if lo is None or lo <= day["First"] else int(index.searchsorted(lo, side="left")),
+                         len(index) if hi is None or hi >= day["Last"] else int(index.searchsorted(hi, side="right")))
+            index_parts.append(index[rows])
+            for n in names:
+                column_parts[n].append(numpy.load(os.path.join(path, n + ".npy"), mmap_mode="r")[rows])
+
+        dtypes = {col["name"]: col["dtype"] for col in manifest["Columns"]}
+        days = Days(index_parts, column_parts, {n: dtypes[n] for n in names}, tz, manifest["Index"])
+        return finance.Stock.fromSource(manifest["Name"], days, interval=manifest["Interval"])
+
+    @staticmethod
+    def __new_manifest__(name: str, df: pandas.DataFrame, interval: str | None, generation: int) -> Dict:
+        if not isinstance(df.index, pandas.DatetimeIndex):
+            raise ValueError(f"{name} is not indexed by time")
+
+        columns = []
+        for col in df.columns:
+            dtype = df[col].to_numpy().dtype
+            if dtype.kind not in "fiub":
+                raise ValueError(f"column {col} of type {dtype} can't be stored")
+            columns.append({"name": col, "dtype": dtype.newbyteorder("<").str})
+
+        return {
+            "Name": name,
+            "Interval": interval,
+            "Tz": None if df.index.tz is None else str(df.index.tz),
+            "Index": df.index.name,
+            "Columns": columns,
+            "Generation": generation,
+            "Days": [],
+        }
+
+    def __write_days__(self, name: str, df: pandas.DataFrame, generation: int) -> List[Dict]:
+        days = []
+        for day, part in codec.split_days(df).items():
+            if part.empty:
+                continue
+            directory = f"{day}.{generation}"
+            path = os.path.join(self.Root, name, directory)
+            os.makedirs(path, exist_ok=True)
+
+            index = _index_ns(part.index)
+            numpy.save(os.path.join(path, INDEX_FILE), index)
+            for col in part.columns:
+                arr = part[col].to_numpy()
+                numpy.save(os.path.join(path, col + ".npy"), arr.astype(arr.dtype.newbyteorder("<"), copy=False))
+
+            days.append({"Day": day, "Path": directory, "Rows": len(part), "First": int(index[0]),
+                         "Last": int(index[-1])})
+        return days
+
+    def __commit__(self, name: str, manifest: Dict, old: Dict | None):
+        path = os.path.join(self.Root, name, MANIFEST)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        # directories the new manifest doesn't list anymore, readers that mapped them keep their mappings
+        if old is not None:
+            kept = {d["Path"] for d in manifest["Days"]}
+            for d in old["Days"]:
+                if d["Path"] not in kept:
+                    shutil.rmtree(os.path.join(self.Root, name, d["Path"]), ignore_errors=True)
+
+
+def _join(parts: List[numpy.ndarray], dtype: str) -> numpy.ndarray:
+    if len(parts) == 1:
+        # a view of the mapped file, nothing is read until it is used
+        return parts[0].view(numpy.ndarray)
+    if not parts:
+        return numpy.empty(0, dtype=dtype)
+    return numpy.concatenate(parts)
+
+
+class Days:
+    """
+    Days is the source of a stock read from a BarStore, see Stock.fromSource: the mapped files of some days, joined
+    one column at a time and only for the days holding the rows asked for
+    """
+
+    def __init__(self, index: List[numpy.ndarray], columns: Dict[str, List[numpy.ndarray]], dtypes: Dict[str, str],
+                 tz: str | None, name: str | None):
+        self.Names: List[str] = list(columns)
+        self.__index__ = index
+        self.__columns__ = columns
+        self.__dtypes__ = dtypes
+        self.__tz__ = tz
+        self.__label__ = name
+        self.__starts__ = numpy.concatenate(([0], numpy.cumsum([len(part) for part in index], dtype=numpy.int64)))
+
+    @property
+    def nbytes(self) -> int:
+        # the files are mapped, their pages belong to the page cache
+        return 0
+
+    def index(self, rows: slice | None = None) -> pandas.DatetimeIndex:
+        days, keep = codec.span(self.__starts__, rows)
+        values = _join([self.__index__[i] for i in days], "<i8")[keep]
+        index = pandas.DatetimeIndex(values.view("datetime64[ns]"), name=self.__label__)
+        # naive bars are stored as they are, aware ones in utc
+        return index.tz_localize("UTC").tz_convert(self.__tz__) if self.__tz__ is not None else index
+
+    def column(self, name: str, rows: slice | None = None) -> numpy.ndarray:
+        parts = self.__columns__.get(name)
+        if parts is None:
+            raise KeyError(name)
+        days, keep = codec.span(self.__starts__, rows)
+        return _join([parts[i] for i in days], self.__dtypes__[name])[keep]
+
+
+BarSingleton: BarStore = BarStore()
+
+
+def get_bar_store() -> BarStore:
+    return BarSingleton
@@ -0,0 +1,153 @@
+import dataclasses
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Tuple, Dict
+
+import finance
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 5 * 60
+
+
+@dataclasses.dataclass
+class CacheStats:
+    Hits: int
+    Misses: int
+    Evictions: int
+    Entries: int
+    Bytes: int
+    MaxBytes: int
+
+
+class StockCache:
+    """
+    StockCache keeps decoded stocks in memory, least recently used first out once the byte budget is exceeded.
+    Cached stocks are shared between callers, so they must be treated as read only.
+
+    Stocks decode their columns lazily, so a cached stock grows after it is put. Sizes are measured again whenever a
+    stock is handed out, when another one is put and when stats are read.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        self.MaxBytes: int = max_bytes
+        self.TTL: float = ttl
+
+        # name -> (stock, size in bytes, expiry on the monotonic clock)
+        self.__entries__: OrderedDict[str, Tuple[finance.Stock, int, float]] = OrderedDict()
+        # bumped on every invalidation, so a stock loaded before an insert can't be cached after it
+        self.__generations__: Dict[str, int] = defaultdict(lambda: 0)
+        self.__lock__ = threading.Lock()
+        self.__bytes__ = 0
+        self.__hits__ = 0
+        self.__misses__ = 0
+        self.__evictions__ = 0
+
+    def get(self, name: str) -> finance.Stock | None:
+        """
+        Fetches a stock from the cache
+        Args:
+            name: name of the stock
+
+        Returns:
+            the cached stock, None if it is not cached or expired
+        """
+        with self.__lock__:
+            entry = self.__entries__.get(name)
+            if entry is not None and entry[2] < time.monotonic():
+                self.__remove__(name)
+                entry = None
+
+            if entry is None:
+                self.__misses__ += 1
+                return None
+
+            self.__entries__.move_to_end(name)
+            self.__hits__ += 1
+            self.__measure__(name)
+            self.__fit__(keep=name)
+            return entry[0]
+
+    def generation(self, name: str) -> int:
+        """
+        Returns the generation of a name, to be taken before loading the stock that is going to be put
+        """
+        with self.__lock__:
+            return self.__generations__[name]
+
+    def put(self, name: str, stk: finance.Stock, generation: int | None = None, ttl: float | None = None):
+        """
+        Caches a stock, evicting the least recently used ones until it fits
+        Args:
+            name: name the stock is stored under
+            stk: the stock
+            generation: generation of the name when the stock was loaded, stale stocks are not cached
+            ttl: seconds the stock stays valid for, capped at the ttl of the cache
+        """
+        size = stk.nbytes
+        ttl = self.TTL if ttl is None else min(ttl, self.TTL)
+        with self.__lock__:
+            if generation is not None and generation != self.__generations__[name]:
+                return
+
+            self.__remove__(name)
+            if size > self.MaxBytes:
+                return
+
+            for cached in list(self.__entries__):
+                self.__measure__(cached)
+            self.__entries__[name] = (stk, size, time.monotonic() + ttl)
+            self.__bytes__ += size
+            self.__fit__(keep=name)
+
+    def invalidate(self, name: str):
+        """
+        Drops a stock from the cache
+        Args:
+            name: name of the stock
+        """
+        with self.__lock__:
+            self.__generations__[name] += 1
+            self.__remove__(name)
+
+    def clear(self):
+        with self.__lock__:
+            for name in self.__entries__:
+                self.__generations__[name] += 1
+            self.__entries__.clear()
+            self.__bytes__ = 0
+
+    def stats(self) -> CacheStats:
+        with self.__lock__:
+            for name in list(self.__entries__):
+                self.__measure__(name)
+            self.__fit__()
+            return CacheStats(Hits=self.__hits__, Misses=self.__misses__, Evictions=self.__evictions__,
+                              Entries=len(self.__entries__), Bytes=self.__bytes__, MaxBytes=self.MaxBytes)
+
+    def __measure__(self, name: str):
+        """
+        Updates the size of an entry to what its stock holds now
+        """
+        stk, size, expiry = self.__entries__[name]
+        now = stk.nbytes
+        if now != size:
+            self.__entries__[name] = (stk, now, expiry)
+            self.__bytes__ += now - size
+
+    def __fit__(self, keep: str | None = None):
+        """
+        Evicts the least recently used entries until the cache fits its budget, keep goes last
+        """
+        while self.__bytes__ > self.MaxBytes and self.__entries__:
+            oldest = next(iter(self.__entries__))
+            if oldest == keep and len(self.__entries__) > 1:
+                self.__entries__.move_to_end(keep)
+                continue
+            self.__remove__(oldest)
+            self.__evictions__ += 1
+
+    def __remove__(self, name: str):
+        entry = self.__entries__.pop(name, None)
+        if entry is not None:
+            self.__bytes__ -= entry[1]
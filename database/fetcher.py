@@ -0,0 +1,189 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Tuple, List
+
+import finance
+from utils import period_duration, instrumentation
+from .stock_data import StockData, get_singleton
+
+DEFAULT_WORKERS = 4
+
+
+class Fetcher:
+    """
+    Fetcher downloads stocks on a bounded pool of threads so the event loop never waits on the network. Requests
+    for the same symbol, period and interval that arrive while a download is running share that download.
+    """
+
+    def __init__(self, data: StockData, provider: finance.DataProvider | None = None, workers: int = DEFAULT_WORKERS):
+        self.Data: StockData = data
+        self.Provider: finance.DataProvider = provider if provider is not None else finance.YahooProvider()
+
+        self.__pool__ = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetcher")
+        self.__lock__ = threading.Lock()
+        self.__in_flight__: Dict[Tuple, Future] = {}
+
+    def submit(self, symbol: str, period: str, interval: str) -> Future:
+        """
+        Starts downloading and storing a stock, unless the same download is already running
+        Args:
+            symbol: the symbol to download
+            period: time period of data
+            interval: interval between ticks
+
+        Returns:
+            future resolving to the stored stock
+        """
+        return self.__single_flight__((symbol, period, interval), self.__load__, symbol, period, interval)
+
+    def submit_refresh(self, symbol: str, period: str, interval: str) -> Future:
+        """
+        Starts fetching only the bars newer than the stored ones and appending them, unless the same refresh is already
+        running. Stocks that are not stored yet, or stored with another interval, are downloaded in full.
+        Args:
+            symbol: the symbol to refresh
+            period: retention window of the stored bars
+            interval: interval between ticks
+
+        Returns:
+            future resolving to the stored stock
+        """
+        return self.__single_flight__(("refresh", symbol, period, interval), self.__refresh__, symbol, period, interval)
+
+    def submit_many(self, symbols: List[str], period: str, interval: str) -> List[Future]:
+        """
+        Starts downloading and storing several stocks with a single batched provider call, symbols that are already
+        being downloaded share the running download
+        Args:
+            symbols: the symbols to download
+            period: time period of data
+            interval: interval between ticks
+
+        Returns:
+            one future per symbol resolving to the stored stock
+        """
+        futures: Dict[str, Future] = {}
+        batch: Dict[str, Future] = {}
+        with self.__lock__:
+            for symbol in dict.fromkeys(symbols):
+                key = (symbol, period, interval)
+                future = self.__in_flight__.get(key)
+                if future is None:
+                    future = Future()
+                    self.__in_flight__[key] = future
+                    batch[symbol] = future
+                futures[symbol] = future
+
+        for symbol, future in batch.items():
+            future.add_done_callback(lambda f, key=(symbol, period, interval): self.__forget__(key, f))
+        if batch:
+            self.__pool__.submit(self.__load_many__, batch, period, interval)
+
+        return [futures[symbol] for symbol in symbols]
+
+    async def fetch_many(self, symbols: List[str], period: str,
+                         interval: str) -> List[finance.Stock | BaseException]:
+        """
+        Downloads and stores several stocks without blocking the event loop
+        Args:
+            symbols: the symbols to download
+            period: time period of data
+            interval: interval between ticks
+
+        Returns:
+            the stored stock, or the error it failed with, per symbol
+        """
+        futures = [asyncio.shield(asyncio.wrap_future(f)) for f in self.submit_many(symbols, period, interval)]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def refresh(self, symbol: str, period: str, interval: str) -> finance.Stock:
+        """
+        Appends the bars newer than the stored ones without blocking the event loop
+        Args:
+            symbol: the symbol to refresh
+            period: retention window of the stored bars
+            interval: interval between ticks
+
+        Returns:
+            the stored stock
+        """
+        return await asyncio.shield(asyncio.wrap_future(self.submit_refresh(symbol, period, interval)))
+
+    async def fetch(self, symbol: str, period: str, interval: str) -> finance.Stock:
+        """
+        Downloads and stores a stock without blocking the event loop
+        Args:
+            symbol: the symbol to download
+            period: time period of data
+            interval: interval between ticks
+
+        Returns:
+            the stored stock
+        """
+        # shielded so a cancelled request doesn't cancel the download other requests are waiting on
+        return await asyncio.shield(asyncio.wrap_future(self.submit(symbol, period, interval)))
+
+    def shutdown(self):
+        self.__pool__.shutdown(wait=False, cancel_futures=True)
+
+    def __load__(self, symbol: str, period: str, interval: str) -> finance.Stock:
+        with instrumentation.timer("fetch"):
+            stk = finance.Stock(symbol, period=period, interval=interval, provider=self.Provider)
+        self.Data.insert(stk)
+        return stk
+
+    def __refresh__(self, symbol: str, period: str, interval: str) -> finance.Stock:
+        last = self.Data.last_bar(symbol)
+        if last is None or last[1] != interval:
+            return self.__load__(symbol, period, interval)
+
+        with instrumentation.timer("fetch"):
+            df = self.Provider.history(symbol, period=period, interval=interval, start=last[0])
+        self.Data.append(symbol, df, retention=period_duration(period))
+        return self.Data.get_by_name(symbol)
+
+    def __single_flight__(self, key: Tuple, fn, *args) -> Future:
+        with self.__lock__:
+            future = self.__in_flight__.get(key)
+            if future is not None:
+                return future
+
+            future = self.__pool__.submit(fn, *args)
+            self.__in_flight__[key] = future
+
+        future.add_done_callback(lambda f: self.__forget__(key, f))
+        return future
+
+    def __load_many__(self, batch: Dict[str, Future], period: str, interval: str):
+        try:
+            with instrumentation.timer("fetch"):
+                frames = self.Provider.history_many(list(batch), period, interval)
+            stocks = []
+            for symbol, df in frames.items():
+                stk = finance.Stock(symbol, skip_loading=True, period=period, interval=interval)
+                stk.df = df
+                stocks.append(stk)
+            self.Data.insert_many(stocks)
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+
+        for stk in stocks:
+            batch[stk.name].set_result(stk)
+        for symbol, future in batch.items():
+            if symbol not in frames:
+                future.set_exception(LookupError(f"no data for {symbol}"))
+
+    def __forget__(self, key: Tuple, future: Future):
+        with self.__lock__:
+            if self.__in_flight__.get(key) is future:
+                del self.__in_flight__[key]
+
+
+FetcherSingleton: Fetcher = Fetcher(get_singleton())
+
+
+def get_fetcher() -> Fetcher:
+    return FetcherSingleton
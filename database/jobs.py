@@ -0,0 +1,152 @@
+import dataclasses
+import datetime
+import os
+import time
+
+from redislite import Redis
+
+import finance
+
+DEFAULT_JOBS_PATH = './data/jobs.db'
+JOB_EXPIRY = datetime.timedelta(days=7)
+
+JOB_PREFIX = "job:"
+KEY_PREFIX = "key:"
+
+
+@dataclasses.dataclass
+class JobRecord:
+    ID: str
+    Status: finance.JobStatus
+    Key: str
+    Request: str
+    Created: float
+    Finished: float | None = None
+    Error: str | None = None
+    Result: str | None = None
+
+
+class JobStore:
+    """
+    JobStore keeps backtest jobs and their results in their own database, next to the stocks. A job is a hash under
+    job:<id>, and key:<key> points at the job computing the result for a request key so identical requests share it.
+    Jobs expire after 7 days.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOBS_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.__conn__ = Redis(path)
+
+    def claim(self, job_id: str, key: str, request: str) -> str:
+        """
+        Creates a queued job for a request key, unless a job for the same key exists already
+        Args:
+            job_id: id of the new job
+            key: key of the request, see controller.jobs.request_key
+            request: the request as json
+
+        Returns:
+            id of the job computing the result, job_id if the job was created
+        """
+        owner = job_id
+
+        def update(pipe):
+            nonlocal owner
+            existing = pipe.get(KEY_PREFIX + key)
+            if existing is not None:
+                owner = existing.decode()
+                return
+
+            pipe.multi()
+            pipe.set(KEY_PREFIX + key, job_id, ex=JOB_EXPIRY)
+            pipe.hset(JOB_PREFIX + job_id, mapping={
+                "Status": finance.JobStatus.queued.value, "Key": key, "Request": request, "Created": time.time()})
+            pipe.expire(JOB_PREFIX + job_id, JOB_EXPIRY)
+
+        self.__conn__.transaction(update, KEY_PREFIX + key)
+        return owner
+
+    def owner(self, key: str) -> str | None:
+        """
+        Returns the id of the job computing the result for a request key, without claiming it
+        """
+        owner = self.__conn__.get(KEY_PREFIX + key)
+        return owner.decode() if owner is not None else None
+
+    def set_status(self, job_id: str, status: finance.JobStatus, error: str | None = None):
+        """
+        Moves a job to a new status, the request key of failed and cancelled jobs is released so the request can be
+        computed again
+        """
+        mapping = {"Status": status.value}
+        if error is not None:
+            mapping["Error"] = error
+        if status in (finance.JobStatus.failed, finance.JobStatus.cancelled):
+            mapping["Finished"] = time.time()
+
+        key = self.__conn__.hget(JOB_PREFIX + job_id, "Key")
+        pipe = self.__conn__.pipeline(transaction=True)
+        pipe.hset(JOB_PREFIX + job_id, mapping=mapping)
+        if key is not None and status in (finance.JobStatus.failed, finance.JobStatus.cancelled):
+            self.__release__(pipe, key.decode(), job_id)
+        pipe.execute()
+
+    def set_result(self, job_id: str, result: str):
+        """
+        Stores the result of a job and marks it done
+        Args:
+            job_id: id of the job
+            result: the result as json
+        """
+        pipe = self.__conn__.pipeline(transaction=True)
+        pipe.hset(JOB_PREFIX + job_id, mapping={
+            "Status": finance.JobStatus.done.value, "Result": result, "Finished": time.time()})
+        pipe.expire(JOB_PREFIX + job_id, JOB_EXPIRY)
+        pipe.execute()
+
+    def save(self, job_id: str, key: str, request: str, result: str):
+        """
+        Stores the result of a backtest that ran outside the queue as a new done job. It becomes the result of its
+        request key unless another job holds the key, that job computes the same result
+        """
+        now = time.time()
+        pipe = self.__conn__.pipeline(transaction=True)
+        pipe.hset(JOB_PREFIX + job_id, mapping={
+            "Status": finance.JobStatus.done.value, "Key": key, "Request": request, "Created": now, "Finished": now,
+            "Result": result})
+        pipe.expire(JOB_PREFIX + job_id, JOB_EXPIRY)
+        pipe.set(KEY_PREFIX + key, job_id, ex=JOB_EXPIRY, nx=True)
+        pipe.execute()
+
+    def get(self, job_id: str, with_result: bool = False) -> JobRecord | None:
+        """
+        Fetches a job
+        Args:
+            job_id: id of the job
+            with_result: whether to read the result too, it can be large
+
+        Returns:
+            the job, None if it doesn't exist
+        """
+        fields = ["Status", "Key", "Request", "Created", "Finished", "Error"] + (["Result"] if with_result else [])
+        values = self.__conn__.hmget(JOB_PREFIX + job_id, fields)
+        if values[0] is None:
+            return None
+
+        raw = {f: v.decode() if v is not None else None for f, v in zip(fields, values)}
+        return JobRecord(ID=job_id, Status=finance.JobStatus(raw["Status"]), Key=raw["Key"], Request=raw["Request"],
+                         Created=float(raw["Created"]),
+                         Finished=float(raw["Finished"]) if raw["Finished"] is not None else None,
+                         Error=raw["Error"], Result=raw.get("Result"))
+
+    def __release__(self, pipe, key: str, job_id: str):
+        # only the job owning the key may release it, a newer job could have claimed it meanwhile
+        if self.__conn__.get(KEY_PREFIX + key) == job_id.encode():
+            pipe.delete(KEY_PREFIX + key)
+
+
+JobSingleton: JobStore = JobStore()
+
+
+def get_job_store() -> JobStore:
+    return JobSingleton
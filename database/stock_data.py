@@ -1,13 +1,51 @@
 import datetime
-import json
+import os
+import re
+from typing import List, Dict, Tuple
 
-import finance
+import pandas
+from redis.exceptions import ResponseError
 from redislite import Redis
 
+import finance
+from finance import codec
+from utils import instrumentation
+from .bars import BarStore
+from .cache import StockCache
+
+DEFAULT_PATH = './data/symbols.db'
+# directory of a bar store keeping the whole history of every stock, see StockData
+ENV_BARS = "TRADING_BARS"
+EXPIRY = datetime.timedelta(days=7)
+# indicators of a stock live in a hash next to its bars, under the name of the stock with this suffix
+INDICATORS_SUFFIX = ":indicators"
+# bars resampled to a coarser interval are stored as a stock of their own, under the name of the stock, this separator
+# and the interval
+RESAMPLED_SEPARATOR = "@"
+
+
+def indicators_key(name: str) -> str:
+    return name + INDICATORS_SUFFIX
+
+
+def resampled_key(name: str, interval: str) -> str:
+    return name + RESAMPLED_SEPARATOR + interval
+
 
 class StockData:
-    def __init__(self):
-        self.__conn__ = Redis('./data/symbols.db')
+    """
+    StockData stores every stock as a hash of day -> encoded bars of that day, so new bars only ever rewrite the
+    chunk of the last day
+
+    With a bar store, stocks are written to it too and read from it while they are stored in the database: it keeps
+    the days dropped by the retention of the database, and a read only maps the files of the days it uses
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, cache: StockCache | None = None, bars: BarStore | None = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.__conn__ = Redis(path)
+        self.Cache: StockCache = cache if cache is not None else StockCache()
+        self.Bars: BarStore | None = bars
 
     def insert(self, s: finance.Stock):
         """
@@ -15,7 +53,134 @@ class StockData:
         Args:
             s: the stock that you want to insert
         """
-        self.__conn__.set(s.name, s.toJSON(), ex=datetime.timedelta(days=7))
+        self.insert_many([s])
+
+    def insert_many(self, stocks: List[finance.Stock]):
+        """
+        Inserts several stocks in a single transaction, each with an expiry of 7 days
+        Args:
+            stocks: the stocks that you want to insert
+        """
+        derived = {s.name: self.__resampled__(s.name) for s in stocks}
+        pipe = self.__conn__.pipeline(transaction=True)
+        for s in stocks:
+            pipe.delete(s.name, indicators_key(s.name), *derived[s.name])
+            pipe.hset(s.name, mapping=s.toChunks())
+            pipe.expire(s.name, EXPIRY)
+        pipe.execute()
+
+        if self.Bars is not None:
+            for s in stocks:
+                if isinstance(s.index, pandas.DatetimeIndex):
+                    self.Bars.write(s)
+
+        for s in stocks:
+            self.__invalidate__(s.name, derived[s.name])
+
+    def append(self, name: str, df: pandas.DataFrame, retention: datetime.timedelta | None = None) -> int:
+        """
+        Appends the bars newer than the last stored one, only the chunk of the last stored day is rewritten. The
+        expiry of the stock is renewed.
+        Args:
+            name: name of the stored stock
+            df: new bars, bars that are already stored are skipped
+            retention: days older than this, counted back from the newest bar, are dropped. The bar store keeps them
+
+        Returns:
+            number of bars appended
+        """
+        appended = 0
+        derived = self.__resampled__(name)
+
+        def update(pipe):
+            nonlocal appended
+            days = sorted(d.decode() for d in pipe.hkeys(name))
+            if not days:
+                raise KeyError(f"{name} is not stored")
+            if days[-1] == codec.ALL_DAYS:
+                raise ValueError(f"{name} is not indexed by time")
+
+            last_day = days[-1]
+            last, meta = codec.decode(pipe.hget(name, last_day))
+            new = finance.localize(df, last.index.tz)
+            new = new[new.index > last.index[-1]]
+
+            mapping: Dict[str, bytes] = {}
+            for day, part in codec.split_days(new).items():
+                if day == last_day:
+                    part = pandas.concat([last, part])
+                mapping[day] = codec.encode(part, meta)
+
+            expired = []
+            if retention is not None and not new.empty:
+                cutoff = (new.index[-1] - retention).strftime("%Y-%m-%d")
+                expired = [d for d in days if d < cutoff]
+
+            pipe.multi()
+            if mapping:
+                pipe.hset(name, mapping=mapping)
+            if expired:
+                pipe.hdel(name, *expired)
+            pipe.expire(name, EXPIRY)
+            if mapping or expired:
+                pipe.delete(indicators_key(name), *derived)
+            appended = len(new)
+
+        self.__conn__.transaction(update, name)
+        if self.Bars is not None and self.Bars.manifest(name) is not None:
+            self.Bars.append(name, df)
+        self.__invalidate__(name, derived)
+        return appended
+
+    def load_indicator(self, name: str, field: str) -> bytes | None:
+        """
+        Reads an indicator stored by save_indicator
+        Args:
+            name: name of the stock
+            field: the version of the bars, the indicator and its parameters
+
+        Returns:
+            the stored bytes, None if the indicator is not stored
+        """
+        return self.__conn__.hget(indicators_key(name), field)
+
+    def save_indicator(self, name: str, field: str, buf: bytes):
+        """
+        Stores an indicator next to the bars of a stock, it expires with them and is dropped when they change
+        Args:
+            name: name of the stock
+            field: the version of the bars, the indicator and its parameters
+            buf: the encoded indicator
+        """
+        def update(pipe):
+            ttl = pipe.pttl(name)
+            if ttl == -2:
+                # the stock is gone, the indicator would outlive it
+                return
+            pipe.multi()
+            pipe.hset(indicators_key(name), field, buf)
+            if ttl > 0:
+                pipe.pexpire(indicators_key(name), ttl)
+
+        self.__conn__.transaction(update, name)
+
+    def last_bar(self, name: str) -> Tuple[pandas.Timestamp, str | None] | None:
+        """
+        Returns the time of the newest stored bar of a stock and the interval it was stored with
+        Args:
+            name: name of the stock
+
+        Returns:
+            the time and the interval, None if the stock is not stored or not indexed by time
+        """
+        days = sorted(d.decode() for d in self.__conn__.hkeys(name))
+        if not days or days[-1] == codec.ALL_DAYS:
+            return None
+
+        last, meta = codec.decode(self.__conn__.hget(name, days[-1]))
+        if last.empty:
+            return None
+        return last.index[-1], meta.get(finance.INTERVAL_KEY)
 
     def get_all(self) -> [finance.Stock]:
         """
@@ -23,27 +188,201 @@ class StockData:
         Returns:
             List of stock objects
         """
-        keys = self.__conn__.keys()
-        res: [finance.Stock] = []
-        for key in keys:
-            res.append(self.get_by_name(key))
-
-        return res
+        keys = [k.decode() for k in self.__conn__.keys()]
+        keys = [k for k in keys if not k.endswith(INDICATORS_SUFFIX) and RESAMPLED_SEPARATOR not in k]
+        # keys can expire between KEYS and the reads
+        return [s for s in self.get_many(keys) if s is not None]
 
-    def get_by_name(self, name: str) -> finance.Stock | None:
+    def get_by_name(self, name: str, columns: List[finance.ValueKind] | None = None,
+                    start: datetime.datetime | None = None,
+                    end: datetime.datetime | None = None) -> finance.Stock | None:
         """
         Fetches the stock by its name
         Args:
             name: name of the stock you want to get
+            columns: the columns that are going to be read, see get_many
+            start: first time that is going to be read
+            end: last time that is going to be read
 
         Returns:
             Stock object if no stock with name exists else None
         """
-        val = self.__conn__.get(name)
+        return self.get_many([name], columns, start, end)[0]
+
+    def get_many(self, names: List[str], columns: List[finance.ValueKind] | None = None,
+                 start: datetime.datetime | None = None,
+                 end: datetime.datetime | None = None) -> List[finance.Stock | None]:
+        """
+        Fetches several stocks, the ones that are not cached are read in a single round trip. Stocks are decoded
+        lazily: only the columns and the bars that are read get decoded, and the cached stock keeps what was decoded
+        Args:
+            names: names of the stocks you want to get
+            columns: the columns that are going to be read, all of them by default
+            start: first time that is going to be read
+            end: last time that is going to be read
+
+        Returns:
+            Stock objects in the order of the names, None for the names that don't exist. With hints they are
+            projections of the cached stocks, see Stock.project, the same name gives the same object
+        """
+        return self.__project__(self.__get_many__(names), columns, start, end)
+
+    @staticmethod
+    def __project__(stocks: List[finance.Stock | None], columns: List[finance.ValueKind] | None,
+                    start: datetime.datetime | None, end: datetime.datetime | None) -> List[finance.Stock | None]:
+        if columns is None and start is None and end is None:
+            return stocks
+
+        # a stock asked for twice stays a single object, simulations share the state of a stock between its columns
+        projected = {id(s): s.project(columns, start, end) for s in stocks if s is not None}
+        return [projected[id(s)] if s is not None else None for s in stocks]
+
+    def __get_many__(self, names: List[str]) -> List[finance.Stock | None]:
+        names = [n.decode() if isinstance(n, bytes) else n for n in names]
+        res: List[finance.Stock | None] = [self.Cache.get(n) for n in names]
+
+        missing = list(dict.fromkeys(n for n, s in zip(names, res) if s is None))
+        if not missing:
+            return res
+
+        generations = [self.Cache.generation(n) for n in missing]
+        # the bar store outlives the database, its stocks are only served while the database still has them
+        stored: Dict[str, finance.Stock] = {}
+        if self.Bars is not None:
+            for name in missing:
+                stk = self.Bars.read(name)
+                if stk is not None:
+                    stored[name] = stk
+
+        pipe = self.__conn__.pipeline(transaction=False)
+        for n in missing:
+            if n not in stored:
+                pipe.hgetall(n)
+            pipe.pttl(n)
+        with instrumentation.timer("read"):
+            values = iter(pipe.execute(raise_on_error=False))
+        instrumentation.count("stocks_read", len(missing))
+
+        loaded = {}
+        for name, generation in zip(missing, generations):
+            chunks = next(values) if name not in stored else None
+            ttl = next(values)
+            with instrumentation.timer("decode"):
+                if name in stored:
+                    # -2 is a key that does not exist, it expired or was deleted
+                    stk = stored[name] if ttl != -2 else None
+                elif isinstance(chunks, ResponseError):
+                    # stored as a single string by an older version
+                    stk = self.__migrate__(name)
+                elif chunks:
+                    stk = finance.Stock.fromChunks(name, [chunks[day] for day in sorted(chunks)])
+                else:
+                    stk = None
+
+            if stk is None:
+                continue
+            loaded[name] = stk
+            # never keep a stock in memory longer than it lives in the database
+            self.Cache.put(name, stk, generation=generation, ttl=ttl / 1000 if ttl > 0 else None)
+
+        return [s if s is not None else loaded.get(n) for n, s in zip(names, res)]
+
+    def get_resampled(self, name: str, interval: str | None = None, columns: List[finance.ValueKind] | None = None,
+                      start: datetime.datetime | None = None,
+                      end: datetime.datetime | None = None) -> finance.Stock | None:
+        """
+        Fetches the stock by its name with bars of the given interval, built from the stored bars the first time and
+        stored next to them until they change or expire
+        Args:
+            name: name of the stock you want to get
+            interval: interval of the bars, the stored interval by default
+            columns: the columns that are going to be read, see get_many
+            start: first time that is going to be read
+            end: last time that is going to be read
+
+        Returns:
+            Stock object, None if no stock with name exists
+
+        Raises:
+            ValueError: if the interval can't be built from the stored one
+        """
+        return self.get_many_resampled([name], interval, columns, start, end)[0]
+
+    def get_many_resampled(self, names: List[str], interval: str | None = None,
+                           columns: List[finance.ValueKind] | None = None, start: datetime.datetime | None = None,
+                           end: datetime.datetime | None = None) -> List[finance.Stock | None]:
+        """
+        Fetches several stocks with bars of the given interval, see get_resampled. Bars are resampled in full, the
+        hints only apply to the resampled stocks
+        """
+        if interval is None:
+            return self.get_many(names, columns, start, end)
+
+        res = self.__get_many__([resampled_key(n, interval) for n in names])
+        missing = [n for n, stk in zip(names, res) if stk is None]
+        built = {}
+        for name, base in zip(missing, self.__get_many__(missing)):
+            if base is None:
+                continue
+            with instrumentation.timer("resample"):
+                stk = base.resample(interval)
+            if stk is not base:
+                self.__save_resampled__(name, interval, stk)
+            built[name] = stk
+
+        res = [stk if stk is not None else built.get(name) for name, stk in zip(names, res)]
+        # stocks read back are stored under the derived key, the bars still belong to the stock. Cached stocks are
+        # shared, so they are handed out as renamed projections, one per stock
+        projected = {id(stk): stk.project(columns, start, end, name=name)
+                     for name, stk in zip(names, res) if stk is not None}
+        return [projected[id(stk)] if stk is not None else None for stk in res]
+
+    def __save_resampled__(self, name: str, interval: str, stk: finance.Stock):
+        key = resampled_key(name, interval)
+
+        def update(pipe):
+            ttl = pipe.pttl(name)
+            if ttl == -2:
+                return
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=stk.toChunks())
+            if ttl > 0:
+                pipe.pexpire(key, ttl)
+
+        self.__conn__.transaction(update, name)
+
+    def __resampled__(self, name: str) -> List[str]:
+        """
+        Returns the keys of the stocks resampled from a stock
+        """
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", name) + RESAMPLED_SEPARATOR + "*"
+        return [k.decode() for k in self.__conn__.scan_iter(match=pattern)]
+
+    def __migrate__(self, name: str) -> finance.Stock | None:
+        """
+        Reads a stock stored as a json dump or as a single binary string and rewrites it as day chunks, keeping its
+        expiry
+        Args:
+            name: the key the value is stored at
+
+        Returns:
+            Stock object, None if the key vanished meanwhile
+        """
+        val, ttl = self.__conn__.pipeline(transaction=False).get(name).pttl(name).execute()
         if val is None:
             return None
 
-        return finance.Stock.fromJSON(self.__conn__.get(name))
+        stk = finance.Stock.fromBytes(val) if codec.is_binary(val) else finance.Stock.fromJSON(val)
+        stk.name = name
+
+        pipe = self.__conn__.pipeline(transaction=True)
+        pipe.delete(name)
+        pipe.hset(name, mapping=stk.toChunks())
+        if ttl > 0:
+            pipe.pexpire(name, ttl)
+        pipe.execute()
+        return stk
 
     def delete(self, key: str):
         """
@@ -55,10 +394,20 @@ class StockData:
         if key == "":
             raise Exception("key cannot be empty")
 
-        self.__conn__.delete(key)
+        derived = self.__resampled__(key)
+        self.__conn__.delete(key, indicators_key(key), *derived)
+        if self.Bars is not None:
+            self.Bars.delete(key)
+        self.__invalidate__(key, derived)
+
+    def __invalidate__(self, name: str, derived: List[str] = ()):
+        self.Cache.invalidate(name)
+        for key in derived:
+            self.Cache.invalidate(key)
+        finance.get_indicator_cache().invalidate(name)
 
 
-Singleton: StockData = StockData()
+Singleton: StockData = StockData(bars=BarStore(os.environ[ENV_BARS]) if os.environ.get(ENV_BARS) else None)
 
 
 def get_singleton() -> StockData:
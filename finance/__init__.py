@@ -1,5 +1,17 @@
+from .providers import *
 from .stock import *
 from .enums import *
+from .execution import *
 from .portfolio import *
 from .transaction import *
+from .ledger import *
+from .matrix import *
+from .context import *
+from .schedule import *
 from .algorithms import *
+from .engine import *
+from .streaming import *
+from .sweep import *
+from .walkforward import *
+from .metrics import *
+from .indicators import *
@@ -2,59 +2,67 @@ import logging
 from typing import List, Dict
 
 from finance import Portfolio, Stock, AmountIsZeroException, NotEnoughStocksToSellException
-from utils import get_ticker
+from .context import Context
+from .schedule import Schedule
 
 
 class Algorithms:
 
     @staticmethod
-    def A(cash: float, stocks: List[Stock]) -> Portfolio:
-        p = Portfolio(initial_cash=cash)
-        t = get_ticker()
+    def A(cash: float, stocks: List[Stock], ctx: Context | None = None,
+          schedule: Schedule | None = None) -> Portfolio:
+        if ctx is None:
+            ctx = Context(stocks, cash=cash)
+        if schedule is None:
+            schedule = Schedule()
+        p = ctx.Portfolio
+        t = ctx.Ticker
         t.reset()
 
-        total = len(stocks[0].values())
+        total = len(stocks[0].array())
+        # the ticks are computed once, see schedule_batch to run the schedule on several stocks at once
+        buys, sells = schedule.ticks(total)
+        amount = schedule.amount(cash)
         q = 0
         for i in range(total):
-            if t.value in [int(0.05 * total), int(0.35 * total), int(0.65 * total), int(0.75 * total),
-                           int(0.95 * total)]:
-                q = p.buy_amount(stocks[0], cash / 5)
+            if t.value in buys:
+                q = p.buy_amount(stocks[0], amount)
 
-            if t.value in [int(0.25 * total), int(0.41 * total), int(0.70 * total), int(0.90 * total),
-                           int(0.99 * total)]:
+            if t.value in sells:
                 p.sell(stocks[0], q)
 
             t.tick()
         return p
 
     @staticmethod
-    def Threshold(cash: float, stocks: List[Stock], threshold: float, volatility: float) -> Portfolio:
-        # Declare a new portfolio and reset the ticker
-        p = Portfolio(initial_cash=cash, allow_short=True)
-        t = get_ticker()
+    def Threshold(cash: float, stocks: List[Stock], threshold: float, volatility: float,
+                  ctx: Context | None = None) -> Portfolio:
+        # Declare a new context, which carries the portfolio and its own ticker, and reset the ticker
+        if ctx is None:
+            ctx = Context(stocks, cash=cash, allow_short=True)
+        p = ctx.Portfolio
+        t = ctx.Ticker
         t.reset()
 
         # Store the initial price as the locked price
         locked_price: Dict[Stock, float] = {}
         for stk in stocks:
-            locked_price[stk] = stk.close
+            locked_price[stk] = stk.value_at(t.value)
+            logging.debug("initial lp of %s = %s", stk.name, locked_price[stk])
 
-        total_timeline: int = len(stocks[0].values())
+        total_timeline: int = len(stocks[0].array())
 
         for i in range(total_timeline):
             for stk in stocks:
                 # cp is current price, lp is the locked price
-                cp = stk.close
+                cp = stk.value_at(t.value)
                 lp = locked_price[stk]
-                if i == 0:
-                    print(
-                        f"initial lp = {lp}")
                 diff = (lp - cp) / lp
                 # if the relative difference between lp and cp is greater than threshold, buy it
                 if diff > threshold:
                     try:
-                        print(
-                            f"trying to buy at {i} = {diff}>{threshold}, cp = {cp}, lp = {lp}, amt = {cash * threshold} ")
+                        logging.debug("trying to buy at %s = %s>%s, cp = %s, lp = %s, amt = %s", i, diff, threshold, cp,
+                                      lp, cash * threshold)
                         p.buy_amount(stk, cash * threshold)
                         # new lock price is the mixture of previous lock price and current price in terms of volatility
                         lp = (1 - volatility) * lp + volatility * cp
@@ -65,8 +73,8 @@ class Algorithms:
 
                 if (-diff) > threshold:
                     try:
-                        print(
-                            f"trying to sell at {i} = {-diff}>{threshold}, cp = {cp}, lp = {lp}, amt = {cash * threshold} ")
+                        logging.debug("trying to sell at %s = %s>%s, cp = %s, lp = %s, amt = %s", i, -diff, threshold,
+                                      cp, lp, cash * threshold)
                         p.sell_amount(stk, cash * threshold)
                         lp = (1 - volatility) * lp + volatility * cp
                         locked_price[stk] = lp
@@ -0,0 +1,279 @@
+import json
+import struct
+from typing import Dict, Tuple, List
+
+import numpy
+import pandas
+
+# layout of an encoded frame:
+#   MAGIC | u32 little endian header length | json header | zero padding to 8 bytes | index | columns
+# the header lists dtype and byte offset (from the end of the padding) of the index and of every column, so each
+# of them can be wrapped with numpy.frombuffer without parsing or copying anything else
+MAGIC = b"STKB\x01"
+ALIGNMENT = 8
+
+INDEX_DATETIME = "datetime"
+INDEX_INT = "int"
+
+# key of the single chunk of frames that are not indexed by time
+ALL_DAYS = "all"
+
+
+def is_binary(buf: bytes) -> bool:
+    """
+    Tells the binary encoding apart from the json dumps stored by older versions
+    Args:
+        buf: stored bytes
+
+    Returns:
+        true if the buffer was produced by encode
+    """
+    return buf[:len(MAGIC)] == MAGIC
+
+
+def _pad(n: int) -> int:
+    return (-n) % ALIGNMENT
+
+
+def encode(df: pandas.DataFrame, meta: Dict | None = None) -> bytes:
+    """
+    Encodes a dataframe of numeric columns as packed little endian arrays
+    Args:
+        df: dataframe with a datetime or an integer index
+        meta: extra json serializable values stored in the header
+
+    Returns:
+        the encoded bytes
+    """
+    if isinstance(df.index, pandas.DatetimeIndex):
+        index_kind = INDEX_DATETIME
+        tz = None if df.index.tz is None else str(df.index.tz)
+        index = df.index.tz_convert("UTC").tz_localize(None) if tz is not None else df.index
+        index = index.as_unit("ns").asi8
+    else:
+        index_kind = INDEX_INT
+        tz = None
+        index = numpy.asarray(df.index, dtype=numpy.int64)
+
+    arrays = [index.astype("<i8", copy=False)]
+    columns = []
+    for name in df.columns:
+        arr = df[name].to_numpy()
+        if arr.dtype.kind not in "fiub":
+            raise ValueError(f"column {name} of type {arr.dtype} can't be encoded")
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        arrays.append(arr)
+        columns.append({"name": name, "dtype": arr.dtype.str})
+
+    head = {
+        "meta": meta or {},
+        "rows": len(df),
+        "index": {"kind": index_kind, "name": df.index.name, "tz": tz, "dtype": "<i8"},
+        "columns": columns,
+    }
+
+    offset = 0
+    offsets = []
+    for arr in arrays:
+        offsets.append(offset)
+        offset += arr.nbytes + _pad(arr.nbytes)
+    head["index"]["offset"] = offsets[0]
+    for col, off in zip(columns, offsets[1:]):
+        col["offset"] = off
+    raw_header = json.dumps(head).encode()
+
+    out = bytearray(MAGIC)
+    out += struct.pack("<I", len(raw_header))
+    out += raw_header
+    out += b"\x00" * _pad(len(out))
+    start = len(out)
+    for arr, off in zip(arrays, offsets):
+        out += b"\x00" * (start + off - len(out))
+        out += arr.tobytes()
+
+    return bytes(out)
+
+
+def header(buf: bytes) -> Dict:
+    """
+    Reads only the header of an encoded frame
+    Args:
+        buf: bytes produced by encode
+
+    Returns:
+        the header as a dictionary
+    """
+    if not is_binary(buf):
+        raise ValueError("not an encoded frame")
+
+    (n,) = struct.unpack_from("<I", buf, len(MAGIC))
+    start = len(MAGIC) + 4
+    head = json.loads(buf[start:start + n])
+    # offsets in the header are relative to where the arrays start
+    head["start"] = start + n + _pad(start + n)
+    return head
+
+
+def decode_index(buf: bytes, head: Dict) -> pandas.Index:
+    """
+    Decodes the index of an encoded frame
+    Args:
+        buf: bytes produced by encode
+        head: the header of the buffer
+
+    Returns:
+        datetime index in its original timezone, or an integer index
+    """
+    spec = head["index"]
+    arr = numpy.frombuffer(buf, dtype=spec["dtype"], count=head["rows"], offset=head["start"] + spec["offset"])
+    if spec["kind"] != INDEX_DATETIME:
+        return pandas.Index(arr, name=spec["name"])
+
+    index = pandas.DatetimeIndex(arr.view("datetime64[ns]"), name=spec["name"])
+    if spec["tz"] is not None:
+        index = index.tz_localize("UTC").tz_convert(spec["tz"])
+    return index
+
+
+def decode_column(buf: bytes, head: Dict, name: str) -> numpy.ndarray:
+    """
+    Wraps a single column of an encoded frame without copying it
+    Args:
+        buf: bytes produced by encode
+        head: the header of the buffer
+        name: name of the column
+
+    Returns:
+        read only numpy array backed by the buffer
+    """
+    for col in head["columns"]:
+        if col["name"] == name:
+            return numpy.frombuffer(buf, dtype=col["dtype"], count=head["rows"], offset=head["start"] + col["offset"])
+
+    raise KeyError(name)
+
+
+def decode(buf: bytes) -> Tuple[pandas.DataFrame, Dict]:
+    """
+    Decodes a frame produced by encode
+    Args:
+        buf: bytes produced by encode
+
+    Returns:
+        the dataframe and the meta values stored with it
+    """
+    head = header(buf)
+    data = {col["name"]: decode_column(buf, head, col["name"]) for col in head["columns"]}
+    df = pandas.DataFrame(data, index=decode_index(buf, head), columns=[col["name"] for col in head["columns"]])
+    return df, head["meta"]
+
+
+def decode_many(bufs: List[bytes]) -> Tuple[pandas.DataFrame, Dict]:
+    """
+    Decodes consecutive chunks of the same frame and joins them, columns are concatenated as arrays
+    Args:
+        bufs: chunks produced by encode, in time order
+
+    Returns:
+        the joined dataframe and the meta values of the last chunk
+    """
+    heads = [header(buf) for buf in bufs]
+    names = [col["name"] for col in heads[-1]["columns"]]
+    if any([col["name"] for col in head["columns"]] != names for head in heads):
+        frames = [decode(buf)[0] for buf in bufs]
+        return pandas.concat(frames), heads[-1]["meta"]
+
+    index = decode_index(bufs[0], heads[0]).append([decode_index(buf, head) for buf, head in zip(bufs[1:], heads[1:])])
+    data = {name: numpy.concatenate([decode_column(buf, head, name) for buf, head in zip(bufs, heads)])
+            for name in names}
+    return pandas.DataFrame(data, index=index, columns=names), heads[-1]["meta"]
+
+
+def span(starts: numpy.ndarray, rows: slice | None) -> Tuple[range, slice]:
+    """
+    Finds the parts of a frame split in consecutive parts that hold a range of its rows
+    Args:
+        starts: first row of every part, followed by the number of rows
+        rows: rows of the whole frame, all of them when None
+
+    Returns:
+        the parts holding the rows, and the rows to keep of those parts joined
+    """
+    start, stop, step = (rows if rows is not None else slice(None)).indices(int(starts[-1]))
+    if step != 1 or stop <= start:
+        # strided and empty selections are cut from all the parts
+        return range(len(starts) - 1), slice(start, stop, step)
+
+    first = int(numpy.searchsorted(starts, start, side="right")) - 1
+    last = int(numpy.searchsorted(starts, stop, side="left"))
+    offset = int(starts[first])
+    return range(first, last), slice(start - offset, stop - offset)
+
+
+class Chunks:
+    """
+    Chunks holds the encoded chunks of a frame, as produced by encode and in time order, and decodes its index and
+    columns one at a time and only for the rows asked for. Columns a chunk doesn't have are nan in its rows, like
+    decode_many gives them.
+    """
+
+    def __init__(self, bufs: List[bytes]):
+        self.Buffers: List[bytes] = bufs
+        self.Headers: List[Dict] = [header(buf) for buf in bufs]
+        self.Names: List[str] = list(dict.fromkeys(col["name"] for head in self.Headers for col in head["columns"]))
+        self.Meta: Dict = self.Headers[-1]["meta"] if self.Headers else {}
+        # first row of every chunk, and the number of rows at the end
+        self.__starts__ = numpy.concatenate(([0], numpy.cumsum([head["rows"] for head in self.Headers],
+                                                                dtype=numpy.int64)))
+
+    @property
+    def rows(self) -> int:
+        return int(self.__starts__[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(buf) for buf in self.Buffers)
+
+    def index(self, rows: slice | None = None) -> pandas.Index:
+        """
+        Decodes the index, of the given rows only
+        """
+        chunks, keep = span(self.__starts__, rows)
+        parts = [decode_index(self.Buffers[i], self.Headers[i]) for i in chunks]
+        index = parts[0].append(parts[1:]) if len(parts) > 1 else parts[0]
+        return index[keep]
+
+    def column(self, name: str, rows: slice | None = None) -> numpy.ndarray:
+        """
+        Decodes a column, of the given rows only. A column held by a single chunk is wrapped without copying it
+        """
+        if name not in self.Names:
+            raise KeyError(name)
+        chunks, keep = span(self.__starts__, rows)
+        parts = []
+        for i in chunks:
+            buf, head = self.Buffers[i], self.Headers[i]
+            try:
+                parts.append(decode_column(buf, head, name))
+            except KeyError:
+                parts.append(numpy.full(head["rows"], numpy.nan))
+        column = numpy.concatenate(parts) if len(parts) > 1 else parts[0]
+        return column[keep]
+
+
+def split_days(df: pandas.DataFrame) -> Dict[str, pandas.DataFrame]:
+    """
+    Splits a time ordered frame into one frame per day of its own timezone
+    Args:
+        df: dataframe with a sorted datetime index
+
+    Returns:
+        frames keyed by their day as YYYY-MM-DD, frames without a datetime index end up in a single chunk
+    """
+    if not isinstance(df.index, pandas.DatetimeIndex) or df.empty:
+        return {ALL_DAYS: df}
+
+    days = df.index.normalize()
+    starts = numpy.concatenate(([0], numpy.flatnonzero(days[1:] != days[:-1]) + 1))
+    ends = numpy.concatenate((starts[1:], [len(df)]))
+    return {days[s].strftime("%Y-%m-%d"): df.iloc[s:e] for s, e in zip(starts, ends)}
@@ -0,0 +1,20 @@
+from typing import List
+
+from utils import Ticker
+from .execution import ExecutionModel
+from .portfolio import Portfolio
+from .stock import Stock
+
+
+class Context:
+    """
+    Context holds the state of a single simulation run: its own clock, the stocks it trades and the portfolio the
+    trades end up in. Runs with separate contexts share nothing and can execute concurrently.
+    """
+
+    def __init__(self, stocks: List[Stock], cash: float = 0.0, allow_short: bool = False,
+                 execution: ExecutionModel | None = None):
+        self.Ticker: Ticker = Ticker()
+        self.Stocks: List[Stock] = stocks
+        self.Portfolio: Portfolio = Portfolio(initial_cash=cash, allow_short=allow_short, ticker=self.Ticker,
+                                              execution=execution)
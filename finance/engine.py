@@ -0,0 +1,422 @@
+import heapq
+from typing import List, Dict, Tuple
+
+import numpy
+
+from .context import Context
+from .enums import TransactionType, Alignment, Simulation
+from .execution import ExecutionModel
+from .ledger import BUY, SELL
+from .matrix import PriceMatrix
+from .portfolio import Portfolio
+from .stock import Stock, ValueKind
+from utils import instrumentation
+
+# a trade produced by the engine: (tick, column, type, quantity, price, fee)
+Trade = Tuple[int, int, TransactionType, int, float, float]
+
+# ticks looked at one by one before searching the next trade of a column with numpy, trades close to each other are
+# found faster without the overhead of a vectorized search
+SCAN_SCALAR = 8
+# ticks searched at once after that, doubled until a trade is found
+SCAN_WINDOW = 64
+
+
+def threshold_prices(stocks: List[Stock],
+                     align: Alignment = Alignment.tick) -> Tuple[List[Stock], List[int], numpy.ndarray]:
+    """
+    Builds the price matrix the threshold algorithm runs on
+    Args:
+        stocks: the stocks in the order they are evaluated on every tick, the same stock can be passed twice, in
+            which case both entries share the locked price
+        align: how the bars of the stocks are matched. With Alignment.tick the timeline is as long as the first
+            stock, like in Algorithms.Threshold
+
+    Returns:
+        the distinct stocks making up the columns, the column of every entry of stocks and the (ticks + 1 x columns)
+        close prices, the last row holding the square off prices
+    """
+    if align == Alignment.tick:
+        # the square off happens one tick after the timeline ends
+        matrix = PriceMatrix(stocks, align, length=len(stocks[0].array()) + 1)
+        prices = matrix.values()
+    else:
+        matrix = PriceMatrix(stocks, align)
+        prices = matrix.with_square_off()
+
+    order = [matrix.column_of(stk) for stk in stocks]
+    return matrix.Stocks, order, prices
+
+
+def threshold_volumes(stocks: List[Stock], align: Alignment = Alignment.tick) -> numpy.ndarray:
+    """
+    Builds the volumes matching the price matrix of threshold_prices, for the execution model
+    Returns:
+        (ticks + 1 x columns) volumes, the last row holding the last known volumes. Ticks where a stock has no bar
+        have no volume
+    """
+    if align == Alignment.tick:
+        matrix = PriceMatrix(stocks, align, fields=(ValueKind.Volume,), length=len(stocks[0].array()) + 1)
+        return matrix.values(ValueKind.Volume)
+
+    # gaps of the union are not filled, nothing trades on a bar a stock doesn't have
+    matrix = PriceMatrix(stocks, align, fill=False, fields=(ValueKind.Volume,))
+    return numpy.nan_to_num(matrix.with_square_off(ValueKind.Volume), nan=0.0)
+
+
+def _execution(execution: ExecutionModel | None, volumes: numpy.ndarray | None,
+               shape: Tuple[int, int]) -> Tuple[ExecutionModel | None, List[List[float]]]:
+    """
+    Returns the execution model a state machine applies, None when it changes nothing, and the volumes as lists
+    """
+    if execution is None or execution.frictionless:
+        return None, []
+    if not execution.uses_volume:
+        return execution, [[numpy.nan] * shape[1]] * shape[0]
+    if volumes is None:
+        raise ValueError("the execution model needs the volumes of the bars")
+    return execution, volumes.tolist()
+
+
+def _square_off(trades: List[Trade], i: int, j: int, qty: int, cp: float, cash: float,
+                execution: ExecutionModel | None, vrows: List[List[float]]) -> float:
+    """
+    Sells a whole long position of a column on a tick, like Portfolio.square_off, and returns the cash after it
+    """
+    fp, fee = cp, 0.0
+    if execution is not None:
+        # the square off closes the whole position whatever the volume of the bar
+        qty, fp, fee = execution.fill(SELL, qty, cp, vrows[i][j], limit=False)
+    trades.append((i, j, TransactionType.SELL, qty, fp, fee))
+    cash += fp * qty
+    if fee:
+        cash -= fee
+    return cash
+
+
+def threshold_trades(prices: numpy.ndarray, order: List[int], cash: float, threshold: float,
+                     volatility: float, execution: ExecutionModel | None = None,
+                     volumes: numpy.ndarray | None = None,
+                     align: Alignment = Alignment.tick, allow_short: bool = True) -> Tuple[List[Trade], float]:
+    """
+    Runs the locked price state machine of Algorithms.Threshold over a price matrix
+    Args:
+        prices: (ticks + 1 x columns) close prices, the last row holds the prices the remaining positions are
+            squared off at. Stocks without a price yet are nan
+        order: the columns in the order they are evaluated on every tick
+        cash: initial cash
+        threshold: accepted relative change before trading
+        volatility: how much of the current price is blended into the locked price after a trade
+        execution: how orders are filled, at the close without costs by default. The locked price follows the close,
+            an order that fills nothing is not a trade
+        volumes: volumes matching prices, see threshold_volumes, needed when the execution model uses them
+        align: how prices were aligned, see threshold_prices. A stock the union has no price for yet starts trading
+            from its first price, while with Alignment.tick a stock whose first price is nan never trades, like in
+            Algorithms.Threshold
+        allow_short: whether sells may go beyond the position. When they may not, like on a portfolio that doesn't
+            allow shorting, a sell of more than the position squares it off instead and keeps the locked price
+
+    Returns:
+        the trades in the order they happened, including the final square off, and the remaining cash
+    """
+    total_timeline = prices.shape[0] - 1
+    execution, vrows = _execution(execution, volumes, prices.shape)
+    rows = prices.tolist()
+    last = rows.pop()
+    amt = cash * threshold
+
+    locked_price: List[float] = list(rows[0])
+    # positions keep the order in which columns were first traded, like the portfolio holdings do
+    positions: Dict[int, int] = {}
+    trades: List[Trade] = []
+
+    for i, row in enumerate(rows):
+        for j in order:
+            cp = row[j]
+            lp = locked_price[j]
+            if lp != lp:
+                if align != Alignment.tick:
+                    # no bar when the timeline started, the first price becomes the locked price
+                    locked_price[j] = cp
+                continue
+            diff = (lp - cp) / lp
+            if diff > threshold:
+                q = int(amt // cp)
+                fp, fee = cp, 0.0
+                if execution is not None and q != 0:
+                    q, fp, fee = execution.fill(BUY, q, cp, vrows[i][j])
+                amount = fp * q
+                if q != 0 and not cash < amount + fee:
+                    trades.append((i, j, TransactionType.BUY, q, fp, fee))
+                    cash -= amount
+                    if fee:
+                        cash -= fee
+                    positions[j] = positions.get(j, 0) + q
+                    locked_price[j] = (1 - volatility) * lp + volatility * cp
+
+            if (-diff) > threshold:
+                q = int(amt // cp)
+                held = positions.get(j, 0)
+                if not allow_short and q != 0:
+                    # the portfolio looks the position up before refusing the sell, which adds it to its holdings
+                    positions.setdefault(j, held)
+                if not allow_short and q > held:
+                    if held > 0:
+                        cash = _square_off(trades, i, j, held, cp, cash, execution, vrows)
+                        positions[j] = 0
+                else:
+                    fp, fee = cp, 0.0
+                    if execution is not None and q != 0:
+                        q, fp, fee = execution.fill(SELL, q, cp, vrows[i][j])
+                    if q != 0:
+                        trades.append((i, j, TransactionType.SELL, q, fp, fee))
+                        cash += fp * q
+                        if fee:
+                            cash -= fee
+                        positions[j] = held - q
+                        locked_price[j] = (1 - volatility) * lp + volatility * cp
+
+    for j, qty in positions.items():
+        cp, fee = last[j], 0.0
+        if qty > 0:
+            if execution is not None:
+                # the square off closes the whole position whatever the volume of the bar
+                qty, cp, fee = execution.fill(SELL, qty, cp, vrows[total_timeline][j], limit=False)
+            trades.append((total_timeline, j, TransactionType.SELL, qty, cp, fee))
+            cash += cp * qty
+            if fee:
+                cash -= fee
+        elif qty < 0:
+            if execution is not None:
+                qty, cp, fee = execution.fill(BUY, -qty, cp, vrows[total_timeline][j], limit=False)
+                qty = -qty
+            amount = cp * -qty
+            if cash < amount + fee:
+                raise Exception("Not enough money to buy")
+            trades.append((total_timeline, j, TransactionType.BUY, -qty, cp, fee))
+            cash -= amount
+            if fee:
+                cash -= fee
+
+    return trades, cash
+
+
+def next_trade(column: numpy.ndarray, values: List[float], start: int, lp: float, amt: float,
+               threshold: float) -> int:
+    """
+    Finds the first tick from start on where the price of a column has moved far enough from its locked price to
+    buy or sell a non zero quantity, with the same float operations as threshold_trades so both agree on every tick
+    Args:
+        column: close prices of the column, without the square off row
+        values: the same prices as a list
+        start: first tick looked at
+        lp: the locked price
+        amt: the amount traded
+        threshold: accepted relative change before trading
+
+    Returns:
+        the tick, len(column) if there is none
+    """
+    n = len(column)
+    for i in range(start, min(n, start + SCAN_SCALAR)):
+        cp = values[i]
+        diff = (lp - cp) / lp
+        if (diff > threshold or -diff > threshold) and int(amt // cp) != 0:
+            return i
+
+    start += SCAN_SCALAR
+    window = SCAN_WINDOW
+    while start < n:
+        cp = column[start:start + window]
+        # negation is exact, so this is diff > threshold or -diff > threshold
+        for hit in numpy.flatnonzero(numpy.abs((lp - cp) / lp) > threshold).tolist():
+            # prices above the amount traded give a zero quantity, rare enough to be checked one by one
+            if int(amt // values[start + hit]) != 0:
+                return start + hit
+        start += len(cp)
+        window *= 2
+
+    return n
+
+
+def threshold_events(prices: numpy.ndarray, order: List[int], cash: float, threshold: float,
+                     volatility: float, execution: ExecutionModel | None = None,
+                     volumes: numpy.ndarray | None = None,
+                     align: Alignment = Alignment.tick, allow_short: bool = True) -> Tuple[List[Trade], float]:
+    """
+    Event driven version of threshold_trades with the same arguments and the same result. Instead of evaluating
+    every column on every tick it keeps, for every entry of order, the next tick where its column can trade, found
+    by a vectorized search, and only runs the state machine on those ticks in (tick, entry) order. The python work
+    grows with the number of trades instead of ticks x columns.
+
+    A buy that fails for lack of cash, or an order that fills nothing, leaves the locked price alone, so the same
+    column is looked at again from the next tick on, with the cash of that time.
+    """
+    total_timeline = prices.shape[0] - 1
+    execution, vrows = _execution(execution, volumes, prices.shape)
+    last = prices[total_timeline].tolist()
+    columns = [numpy.ascontiguousarray(prices[:total_timeline, j]) for j in range(prices.shape[1])]
+    values = [c.tolist() for c in columns]
+    amt = cash * threshold
+
+    locked_price: List[float] = prices[0].tolist() if total_timeline else list(last)
+    starts: List[int] = [0] * prices.shape[1]
+    # columns whose first price arrived after the timeline started
+    late: List[bool] = [False] * prices.shape[1]
+    for j, lp in enumerate(locked_price):
+        if lp != lp and total_timeline:
+            # no bar when the timeline started, the first price becomes the locked price
+            present = numpy.flatnonzero(columns[j] == columns[j]) if align != Alignment.tick else []
+            if len(present):
+                starts[j] = int(present[0]) + 1
+                locked_price[j] = float(columns[j][present[0]])
+                late[j] = True
+            else:
+                starts[j] = total_timeline
+
+    entries: Dict[int, List[int]] = {}
+    for k, j in enumerate(order):
+        entries.setdefault(j, []).append(k)
+
+    # (tick, entry, version of the locked price the tick was found with)
+    versions: List[int] = [0] * prices.shape[1]
+    heap = []
+    for k, j in enumerate(order):
+        # when a column gets its first price, only its first entry skips that tick, the others already compare
+        # against it
+        start = starts[j] - 1 if late[j] and k != entries[j][0] else starts[j]
+        t = next_trade(columns[j], values[j], start, locked_price[j], amt, threshold)
+        if t < total_timeline:
+            heap.append((t, k, 0))
+    heapq.heapify(heap)
+
+    positions: Dict[int, int] = {}
+    trades: List[Trade] = []
+    while heap:
+        i, k, version = heapq.heappop(heap)
+        j = order[k]
+        if version != versions[j]:
+            continue
+
+        cp = values[j][i]
+        lp = locked_price[j]
+        diff = (lp - cp) / lp
+        moved = False
+        if diff > threshold:
+            q = int(amt // cp)
+            fp, fee = cp, 0.0
+            if execution is not None and q != 0:
+                q, fp, fee = execution.fill(BUY, q, cp, vrows[i][j])
+            amount = fp * q
+            if q != 0 and not cash < amount + fee:
+                trades.append((i, j, TransactionType.BUY, q, fp, fee))
+                cash -= amount
+                if fee:
+                    cash -= fee
+                positions[j] = positions.get(j, 0) + q
+                locked_price[j] = (1 - volatility) * lp + volatility * cp
+                moved = True
+
+        if (-diff) > threshold:
+            q = int(amt // cp)
+            held = positions.get(j, 0)
+            if not allow_short and q != 0:
+                # the portfolio looks the position up before refusing the sell, which adds it to its holdings
+                positions.setdefault(j, held)
+            if not allow_short and q > held:
+                if held > 0:
+                    cash = _square_off(trades, i, j, held, cp, cash, execution, vrows)
+                    positions[j] = 0
+            else:
+                fp, fee = cp, 0.0
+                if execution is not None and q != 0:
+                    q, fp, fee = execution.fill(SELL, q, cp, vrows[i][j])
+                if q != 0:
+                    trades.append((i, j, TransactionType.SELL, q, fp, fee))
+                    cash += fp * q
+                    if fee:
+                        cash -= fee
+                    positions[j] = held - q
+                    locked_price[j] = (1 - volatility) * lp + volatility * cp
+                    moved = True
+
+        if not moved:
+            t = next_trade(columns[j], values[j], i + 1, lp, amt, threshold)
+            if t < total_timeline:
+                heapq.heappush(heap, (t, k, version))
+            continue
+
+        # every entry of the column looks again with the new locked price, the ones after this entry still in
+        # this tick
+        versions[j] += 1
+        for other in entries[j]:
+            t = next_trade(columns[j], values[j], i if other > k else i + 1, locked_price[j], amt, threshold)
+            if t < total_timeline:
+                heapq.heappush(heap, (t, other, versions[j]))
+
+    for j, qty in positions.items():
+        cp, fee = last[j], 0.0
+        if qty > 0:
+            if execution is not None:
+                # the square off closes the whole position whatever the volume of the bar
+                qty, cp, fee = execution.fill(SELL, qty, cp, vrows[total_timeline][j], limit=False)
+            trades.append((total_timeline, j, TransactionType.SELL, qty, cp, fee))
+            cash += cp * qty
+            if fee:
+                cash -= fee
+        elif qty < 0:
+            if execution is not None:
+                qty, cp, fee = execution.fill(BUY, -qty, cp, vrows[total_timeline][j], limit=False)
+                qty = -qty
+            amount = cp * -qty
+            if cash < amount + fee:
+                raise Exception("Not enough money to buy")
+            trades.append((total_timeline, j, TransactionType.BUY, -qty, cp, fee))
+            cash -= amount
+            if fee:
+                cash -= fee
+
+    return trades, cash
+
+
+def simulate(mode: Simulation = Simulation.tick):
+    """
+    Returns the threshold state machine of a simulation mode, threshold_trades or threshold_events
+    """
+    return threshold_events if mode == Simulation.event else threshold_trades
+
+
+class Engine:
+    """
+    Engine runs the algorithms over numpy arrays built once per stock instead of reading every price through the
+    ticker, the resulting portfolios are identical to the ones produced by Algorithms
+    """
+
+    @staticmethod
+    def Threshold(cash: float, stocks: List[Stock], threshold: float, volatility: float,
+                  ctx: Context | None = None, align: Alignment = Alignment.tick,
+                  mode: Simulation = Simulation.tick) -> Portfolio:
+        if ctx is None:
+            ctx = Context(stocks, cash=cash, allow_short=True)
+        p = ctx.Portfolio
+
+        execution = None if p.Execution.frictionless else p.Execution
+        with instrumentation.timer("align"):
+            columns, order, prices = threshold_prices(stocks, align)
+            volumes = threshold_volumes(stocks, align) if execution is not None and execution.uses_volume else None
+        total_timeline = prices.shape[0] - 1
+        with instrumentation.timer("simulate"):
+            trades, _ = simulate(mode)(prices, order, cash, threshold, volatility, execution, volumes, align,
+                                       p.AllowShort)
+
+            # the trades are already filled, the portfolio records them as they are
+            for tick, j, kind, q, price, fee in trades:
+                if kind == TransactionType.BUY:
+                    p.buy_at(columns[j], q, price, tick, fee=fee)
+                else:
+                    p.sell_at(columns[j], q, price, tick, fee=fee)
+        instrumentation.count("trades", len(trades))
+
+        # leave the clock where the tick by tick run leaves it, holdings are valued at that tick
+        ctx.Ticker.set(total_timeline)
+        return p
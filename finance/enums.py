@@ -16,3 +16,47 @@ class TransactionType(str, Enum):
 class Algos(str, Enum):
     A = "A"
     percent = "percent"
+
+
+class HistoryFormat(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
+    binary = "binary"
+
+
+class Indicator(str, Enum):
+    sma = "sma"
+    ema = "ema"
+    std = "std"
+    vwap = "vwap"
+    returns = "returns"
+
+
+class Alignment(str, Enum):
+    # row i of every stock is its i-th bar, shorter stocks repeat their last bar
+    tick = "tick"
+    # every timestamp of any stock, gaps are forward filled
+    union = "union"
+    # only the timestamps every stock has
+    intersection = "intersection"
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class Simulation(str, Enum):
+    # every stock is evaluated on every tick
+    tick = "tick"
+    # the simulation jumps from one tick where a trade can happen to the next one, same trades as tick
+    event = "event"
+
+
+class ChartFormat(str, Enum):
+    svg = "svg"
+    html = "html"
+    png = "png"
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy
+
+
+@dataclass
+class ExecutionModel:
+    """
+    ExecutionModel turns an order at the close of a bar into the fill a market would give: the quantity is capped at
+    a share of the volume of the bar, the price is moved against the trade by half the spread and by a slippage
+    growing with the share of the volume taken, and a fee is charged on top. The default model fills everything at
+    the close for free.
+
+    fill works on a single order and fills on arrays of orders, both use the same float operations so the tick by
+    tick and the vectorized paths agree on every fill.
+    """
+    # fixed fee per trade
+    Fee: float = 0.0
+    # fee as a share of the traded amount
+    FeeRate: float = 0.0
+    # bid ask spread as a share of the price, half of it is paid on every trade
+    Spread: float = 0.0
+    # slippage as a share of the price per unit of the volume of the bar taken
+    Impact: float = 0.0
+    # largest share of the volume of the bar a single trade fills, no limit when None
+    Participation: float | None = None
+
+    @property
+    def frictionless(self) -> bool:
+        return self == FRICTIONLESS
+
+    @property
+    def uses_volume(self) -> bool:
+        return self.Impact != 0 or self.Participation is not None
+
+    def fill(self, side: int, quantity: int, price: float, volume: float,
+             limit: bool = True) -> Tuple[int, float, float]:
+        """
+        Fills a single order
+        Args:
+            side: 1 for a buy, -1 for a sell
+            quantity: number of stocks asked for
+            price: close of the bar
+            volume: volume of the bar, bars without a known volume fill nothing when the participation is capped and
+                don't slip
+            limit: whether the participation cap applies, the final square off fills whole
+
+        Returns:
+            the quantity filled, the price of a single stock and the fee
+        """
+        if limit and self.Participation is not None:
+            quantity = min(quantity, int(self.Participation * volume) if volume > 0 else 0)
+        ratio = quantity / volume if volume > 0 else 0.0
+        price = price * (1 + side * (self.Spread / 2 + self.Impact * ratio))
+        fee = self.Fee + self.FeeRate * price * quantity if quantity else 0.0
+        return quantity, price, fee
+
+    def fills(self, sides: numpy.ndarray, quantities: numpy.ndarray, prices: numpy.ndarray, volumes: numpy.ndarray,
+              limit: bool = True) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Fills many orders at once, see fill
+        Returns:
+            the int64 quantities filled, the prices of a single stock and the fees
+        """
+        quantities = numpy.asarray(quantities, dtype=numpy.int64)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            known = volumes > 0
+            if limit and self.Participation is not None:
+                cap = numpy.where(known, numpy.floor(self.Participation * volumes), 0).astype(numpy.int64)
+                quantities = numpy.minimum(quantities, cap)
+            ratio = numpy.where(known, quantities / volumes, 0.0)
+        prices = prices * (1 + sides * (self.Spread / 2 + self.Impact * ratio))
+        fees = numpy.where(quantities != 0, self.Fee + self.FeeRate * prices * quantities, 0.0)
+        return quantities, prices, fees
+
+
+FRICTIONLESS = ExecutionModel()
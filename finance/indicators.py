@@ -0,0 +1,203 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple, Callable
+
+import numpy
+import pandas
+
+from .enums import Indicator
+from .stock import Stock, ValueKind
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def sma(values: numpy.ndarray, window: int) -> numpy.ndarray:
+    """
+    Simple moving average from a running sum, the first window - 1 values are nan
+    """
+    res = numpy.full(len(values), numpy.nan)
+    if 0 < window <= len(values):
+        total = numpy.cumsum(numpy.concatenate(([0.0], values)))
+        res[window - 1:] = (total[window:] - total[:-window]) / window
+    return res
+
+
+def ema(values: numpy.ndarray, span: int) -> numpy.ndarray:
+    """
+    Exponential moving average with a smoothing factor of 2 / (span + 1), seeded with the first value
+    """
+    return pandas.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def rolling_std(values: numpy.ndarray, window: int) -> numpy.ndarray:
+    """
+    Sample standard deviation over a rolling window, the first window - 1 values are nan
+    """
+    return pandas.Series(values).rolling(window).std().to_numpy()
+
+
+def vwap(high: numpy.ndarray, low: numpy.ndarray, close: numpy.ndarray, volume: numpy.ndarray,
+         window: int | None = None) -> numpy.ndarray:
+    """
+    Volume weighted average of the typical price (high + low + close) / 3
+    Args:
+        high: high prices
+        low: low prices
+        close: close prices
+        volume: traded volumes
+        window: number of bars averaged over, all bars so far when None
+
+    Returns:
+        the average, nan while no volume was traded
+    """
+    typical = (high + low + close) / 3
+    weighted = numpy.cumsum(typical * volume)
+    volumes = numpy.cumsum(volume)
+    if window is not None:
+        weighted[window:] = weighted[window:] - weighted[:-window]
+        volumes[window:] = volumes[window:] - volumes[:-window]
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.where(volumes > 0, weighted / volumes, numpy.nan)
+
+
+def returns(values: numpy.ndarray, periods: int = 1, log: bool = False) -> numpy.ndarray:
+    """
+    Relative change over a number of bars, the first periods values are nan
+    """
+    res = numpy.full(len(values), numpy.nan)
+    if 0 < periods < len(values):
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            ratio = values[periods:] / values[:-periods]
+        res[periods:] = numpy.log(ratio) if log else ratio - 1
+    return res
+
+
+# indicator -> (function of the stock and the parameters, default parameters)
+KERNELS: Dict[Indicator, Tuple[Callable[..., numpy.ndarray], Dict]] = {
+    Indicator.sma: (lambda stk, kind, window: sma(stk.array(kind), window),
+                    {"kind": ValueKind.Close, "window": 20}),
+    Indicator.ema: (lambda stk, kind, span: ema(stk.array(kind), span),
+                    {"kind": ValueKind.Close, "span": 20}),
+    Indicator.std: (lambda stk, kind, window: rolling_std(stk.array(kind), window),
+                    {"kind": ValueKind.Close, "window": 20}),
+    Indicator.vwap: (lambda stk, window: vwap(stk.array(ValueKind.High), stk.array(ValueKind.Low),
+                                              stk.array(ValueKind.Close), stk.array(ValueKind.Volume), window),
+                     {"window": None}),
+    Indicator.returns: (lambda stk, kind, periods, log: returns(stk.array(kind), periods, log),
+                        {"kind": ValueKind.Close, "periods": 1, "log": False}),
+}
+
+
+def key(indicator: Indicator, params: Dict) -> str:
+    """
+    Returns a stable name for an indicator and its parameters, e.g. sma(kind=Close,window=20)
+    """
+    values = ",".join(f"{k}={v.value if isinstance(v, ValueKind) else v}" for k, v in sorted(params.items()))
+    return f"{indicator.value}({values})"
+
+
+class IndicatorCache:
+    """
+    IndicatorCache memoizes indicators per symbol, data version, indicator and parameters, so every strategy and
+    request working on the same bars shares one computation. The version is a digest of the bars, so entries of
+    replaced bars are never served and age out, least recently used first.
+
+    A store can keep the indicators next to the bars across processes, it needs
+    load_indicator(name, field) -> bytes | None and save_indicator(name, field, buf) methods.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, store=None):
+        self.MaxBytes: int = max_bytes
+        self.Store = store
+
+        self.__entries__: OrderedDict[Tuple[str, str, str], numpy.ndarray] = OrderedDict()
+        self.__lock__ = threading.Lock()
+        self.__bytes__ = 0
+
+    def get(self, stk: Stock, indicator: Indicator, **params) -> numpy.ndarray:
+        """
+        Returns an indicator of a stock, computing it only if no one did for the same bars before
+        Args:
+            stk: the stock
+            indicator: the indicator
+            **params: parameters of the indicator, see KERNELS for the defaults
+
+        Returns:
+            read only float64 array aligned with the bars of the stock
+        """
+        kernel, defaults = KERNELS[indicator]
+        unknown = set(params) - set(defaults)
+        if unknown:
+            raise ValueError(f"unknown parameters {sorted(unknown)} for {indicator.value}")
+        params = {**defaults, **params}
+
+        version = stk.version
+        field = f"{version}:{key(indicator, params)}"
+        entry = (stk.name, version, field)
+        with self.__lock__:
+            arr = self.__entries__.get(entry)
+            if arr is not None:
+                self.__entries__.move_to_end(entry)
+                return arr
+
+        arr = self.__load__(stk.name, field, len(stk.index))
+        if arr is None:
+            arr = numpy.ascontiguousarray(kernel(stk, **params), dtype=numpy.float64)
+            arr.flags.writeable = False
+            self.__save__(stk.name, field, arr)
+
+        self.__put__(entry, arr)
+        return arr
+
+    def invalidate(self, name: str):
+        """
+        Drops every indicator of a symbol
+        """
+        with self.__lock__:
+            for entry in [e for e in self.__entries__ if e[0] == name]:
+                self.__bytes__ -= self.__entries__.pop(entry).nbytes
+
+    def __put__(self, entry: Tuple[str, str, str], arr: numpy.ndarray):
+        with self.__lock__:
+            if entry in self.__entries__ or arr.nbytes > self.MaxBytes:
+                return
+            while self.__bytes__ + arr.nbytes > self.MaxBytes:
+                self.__bytes__ -= self.__entries__.popitem(last=False)[1].nbytes
+            self.__entries__[entry] = arr
+            self.__bytes__ += arr.nbytes
+
+    def __load__(self, name: str, field: str, rows: int) -> numpy.ndarray | None:
+        if self.Store is None:
+            return None
+        try:
+            buf = self.Store.load_indicator(name, field)
+        except Exception as e:
+            logging.warning("Loading indicator %s of %s failed: %s", field, name, e)
+            return None
+        if buf is None or len(buf) != rows * 8:
+            return None
+        return numpy.frombuffer(buf, dtype="<f8")
+
+    def __save__(self, name: str, field: str, arr: numpy.ndarray):
+        if self.Store is None:
+            return
+        try:
+            self.Store.save_indicator(name, field, arr.astype("<f8", copy=False).tobytes())
+        except Exception as e:
+            logging.warning("Saving indicator %s of %s failed: %s", field, name, e)
+
+
+IndicatorSingleton: IndicatorCache = IndicatorCache()
+
+
+def get_indicator_cache() -> IndicatorCache:
+    return IndicatorSingleton
+
+
+def indicator(stk: Stock, which: Indicator, **params) -> numpy.ndarray:
+    """
+    Returns an indicator of a stock through the shared cache, see IndicatorCache.get
+    """
+    return IndicatorSingleton.get(stk, which, **params)
@@ -0,0 +1,207 @@
+from typing import List, Tuple
+
+import numpy
+
+from .enums import TransactionType
+from .transaction import Transaction
+
+# side of a row, also the sign of its effect on the position
+BUY = 1
+SELL = -1
+
+DEFAULT_CAPACITY = 1024
+
+
+class Ledger:
+    """
+    Ledger records trades in growable typed arrays, one column per field, instead of one object per trade. Positions
+    and cash are kept up to date as trades come in, the rows of every symbol are found through an index sorted by
+    symbol that is built on the first query after a trade. Transaction objects are only built when asked for.
+    """
+
+    def __init__(self, initial_cash: float = 0.0, capacity: int = DEFAULT_CAPACITY):
+        self.InitialCash: float = initial_cash
+        self.Cash: float = initial_cash
+        self.__size__: int = 0
+        self.__tick__ = numpy.empty(capacity, dtype=numpy.int64)
+        self.__side__ = numpy.empty(capacity, dtype=numpy.int8)
+        self.__symbol__ = numpy.empty(capacity, dtype=numpy.int32)
+        self.__quantity__ = numpy.empty(capacity, dtype=numpy.int64)
+        self.__price__ = numpy.empty(capacity, dtype=numpy.float64)
+        self.__amount__ = numpy.empty(capacity, dtype=numpy.float64)
+        self.__fee__ = numpy.empty(capacity, dtype=numpy.float64)
+
+        self.__names__: List[str] = []
+        self.__positions__: List[int] = []
+        # rows ordered by symbol and the start of every symbol in it, None when trades were added since
+        self.__index__: Tuple[numpy.ndarray, numpy.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return self.__size__
+
+    def register(self, name: str) -> int:
+        """
+        Adds a symbol to the ledger
+        Args:
+            name: name of the symbol
+
+        Returns:
+            id of the symbol, ids are given out in registration order starting at 0
+        """
+        self.__names__.append(name)
+        self.__positions__.append(0)
+        self.__index__ = None
+        return len(self.__names__) - 1
+
+    def record(self, symbol: int, tick: int, side: int, quantity: int, price: float, amount: float,
+               fee: float = 0.0):
+        """
+        Appends a trade and updates the position and the cash
+        Args:
+            symbol: id of the symbol
+            tick: tick the trade happened at
+            side: BUY or SELL
+            quantity: number of stocks traded
+            price: price of a single stock
+            amount: cash exchanged for the stocks
+            fee: cash paid on top of the amount
+        """
+        if self.__size__ == len(self.__tick__):
+            self.__grow__()
+
+        i = self.__size__
+        self.__tick__[i] = tick
+        self.__side__[i] = side
+        self.__symbol__[i] = symbol
+        self.__quantity__[i] = quantity
+        self.__price__[i] = price
+        self.__amount__[i] = amount
+        self.__fee__[i] = fee
+        self.__size__ += 1
+        self.__index__ = None
+
+        if side == BUY:
+            self.__positions__[symbol] += quantity
+            self.Cash -= amount
+        else:
+            self.__positions__[symbol] -= quantity
+            self.Cash += amount
+        if fee:
+            self.Cash -= fee
+
+    def __grow__(self):
+        capacity = 2 * len(self.__tick__)
+        for attr in ("__tick__", "__side__", "__symbol__", "__quantity__", "__price__", "__amount__", "__fee__"):
+            old = getattr(self, attr)
+            new = numpy.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    @property
+    def ticks(self) -> numpy.ndarray:
+        return self.__tick__[:self.__size__]
+
+    @property
+    def sides(self) -> numpy.ndarray:
+        return self.__side__[:self.__size__]
+
+    @property
+    def symbols(self) -> numpy.ndarray:
+        return self.__symbol__[:self.__size__]
+
+    @property
+    def quantities(self) -> numpy.ndarray:
+        return self.__quantity__[:self.__size__]
+
+    @property
+    def prices(self) -> numpy.ndarray:
+        return self.__price__[:self.__size__]
+
+    @property
+    def amounts(self) -> numpy.ndarray:
+        return self.__amount__[:self.__size__]
+
+    @property
+    def fees(self) -> numpy.ndarray:
+        return self.__fee__[:self.__size__]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.__names__)
+
+    def name(self, symbol: int) -> str:
+        return self.__names__[symbol]
+
+    def position(self, symbol: int) -> int:
+        return self.__positions__[symbol]
+
+    def positions(self) -> numpy.ndarray:
+        """
+        Returns the current position of every symbol, indexed by symbol id
+        """
+        return numpy.array(self.__positions__, dtype=numpy.int64)
+
+    def rows(self, symbol: int) -> numpy.ndarray:
+        """
+        Returns the rows of the trades of a symbol, in the order they happened
+        """
+        if self.__index__ is None:
+            order = numpy.argsort(self.symbols, kind="stable")
+            starts = numpy.searchsorted(self.symbols[order], numpy.arange(len(self.__names__) + 1))
+            self.__index__ = (order, starts)
+
+        order, starts = self.__index__
+        return order[starts[symbol]:starts[symbol + 1]]
+
+    def cash_flows(self) -> numpy.ndarray:
+        """
+        Returns the cash every trade brought in, negative for buys, fees included
+        """
+        return self.amounts * -self.sides - self.fees
+
+    def net_cash(self) -> numpy.ndarray:
+        """
+        Returns the cash every symbol brought in over all its trades, indexed by symbol id
+        """
+        return numpy.bincount(self.symbols, weights=self.cash_flows(), minlength=len(self.__names__))
+
+    def exposure(self, prices: numpy.ndarray) -> numpy.ndarray:
+        """
+        Returns the market value of every position
+        Args:
+            prices: current price of every symbol, indexed by symbol id
+
+        Returns:
+            signed market value per symbol, negative for short positions
+        """
+        return self.positions() * prices
+
+    def pnl(self, prices: numpy.ndarray) -> numpy.ndarray:
+        """
+        Returns the profit of every symbol, open positions are marked to the given prices
+        Args:
+            prices: current price of every symbol, indexed by symbol id
+
+        Returns:
+            profit per symbol
+        """
+        return self.net_cash() + self.exposure(prices)
+
+    def transactions(self, rows: numpy.ndarray | None = None) -> List[Transaction]:
+        """
+        Builds transaction objects, meant for the edges of the application such as API responses
+        Args:
+            rows: rows to convert, all of them by default
+
+        Returns:
+            the transactions in the order of the rows
+        """
+        if rows is None:
+            rows = slice(0, self.__size__)
+
+        columns = zip(self.__tick__[rows].tolist(), self.__side__[rows].tolist(), self.__symbol__[rows].tolist(),
+                      self.__quantity__[rows].tolist(), self.__price__[rows].tolist(),
+                      self.__amount__[rows].tolist(), self.__fee__[rows].tolist())
+        return [Transaction(Tick=tick, Type=TransactionType.BUY if side == BUY else TransactionType.SELL,
+                            StockName=self.__names__[symbol], Quantity=quantity, Price=price, Amount=amount, Fee=fee)
+                for tick, side, symbol, quantity, price, amount, fee in columns]
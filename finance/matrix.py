@@ -0,0 +1,151 @@
+from typing import List, Dict, Iterable
+
+import numpy
+import pandas
+
+from .enums import Alignment
+from .stock import Stock, ValueKind
+
+
+def price_matrix(stocks: List[Stock], length: int, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+    """
+    Builds a (length x stocks) matrix of prices, the same way the ticker reads them: a stock shorter than the
+    timeline keeps repeating its last value
+    Args:
+        stocks: the stocks making up the columns
+        length: number of ticks in the timeline
+        kind: the kind of value to take from every stock
+
+    Returns:
+        contiguous float64 matrix with one row per tick
+    """
+    res = numpy.empty((length, len(stocks)), dtype=numpy.float64)
+    for j, stk in enumerate(stocks):
+        arr = stk.array(kind)
+        n = min(len(arr), length)
+        res[:n, j] = arr[:n]
+        res[n:, j] = arr[-1]
+
+    return res
+
+
+def _forward_fill(arr: numpy.ndarray) -> numpy.ndarray:
+    """
+    Fills the nan values of every column with the last value before them, leading nan values stay
+    """
+    valid = ~numpy.isnan(arr)
+    rows = numpy.where(valid, numpy.arange(len(arr))[:, None], 0)
+    numpy.maximum.accumulate(rows, axis=0, out=rows)
+    res = arr[rows, numpy.arange(arr.shape[1])]
+    res[~numpy.logical_or.accumulate(valid, axis=0)] = numpy.nan
+    return res
+
+
+class PriceMatrix:
+    """
+    PriceMatrix aligns several stocks on one timeline and keeps every field as a single (time x stock) float64 array,
+    so a strategy reads a whole tick as a row and a whole stock as a column.
+
+    With Alignment.tick the i-th row holds the i-th bar of every stock and stocks shorter than the timeline repeat
+    their last bar, which is how the ticker reads them. Union and intersection align the bars on their timestamps.
+    """
+
+    def __init__(self, stocks: List[Stock], align: Alignment = Alignment.union, fill: bool = True,
+                 fields: Iterable[ValueKind] = (ValueKind.Close,), length: int | None = None):
+        """
+        Args:
+            stocks: the stocks making up the columns, repeated stocks get a single column
+            align: how the bars of the stocks are matched
+            fill: whether gaps of the union are filled with the last value before them, they are nan otherwise.
+                Rows before the first bar of a stock are always nan
+            fields: the fields to build
+            length: number of rows with Alignment.tick, the length of the first stock by default
+        """
+        self.Stocks: List[Stock] = list(dict.fromkeys(stocks))
+        self.Align: Alignment = align
+        self.Index: pandas.DatetimeIndex | None = None
+        self.__columns__: Dict[Stock, int] = {stk: j for j, stk in enumerate(self.Stocks)}
+        self.__values__: Dict[ValueKind, numpy.ndarray] = {}
+
+        fields = list(fields)
+        if align == Alignment.tick:
+            if length is None:
+                length = len(stocks[0].array())
+            for kind in fields:
+                self.__values__[kind] = self.__tick__(kind, length)
+            return
+
+        indexes = []
+        for stk in self.Stocks:
+            if not isinstance(stk.index, pandas.DatetimeIndex):
+                raise ValueError(f"{stk.name} is not indexed by time, it can only be aligned by tick")
+            indexes.append(stk.index)
+
+        index = indexes[0]
+        for other in indexes[1:]:
+            index = index.union(other) if align == Alignment.union else index.intersection(other)
+        self.Index = index
+
+        # row of the timeline every bar of every stock lands on
+        rows = [index.get_indexer(other) for other in indexes]
+        for kind in fields:
+            arr = numpy.full((len(index), len(self.Stocks)), numpy.nan)
+            for j, (stk, at) in enumerate(zip(self.Stocks, rows)):
+                keep = at >= 0
+                arr[at[keep], j] = stk.array(kind)[keep]
+            if fill and align == Alignment.union:
+                arr = _forward_fill(arr)
+            arr.flags.writeable = False
+            self.__values__[kind] = arr
+
+    def __tick__(self, kind: ValueKind, length: int) -> numpy.ndarray:
+        arr = price_matrix(self.Stocks, length, kind)
+        arr.flags.writeable = False
+        return arr
+
+    def __len__(self) -> int:
+        return next(iter(self.__values__.values())).shape[0]
+
+    @property
+    def shape(self):
+        return next(iter(self.__values__.values())).shape
+
+    def column_of(self, stk: Stock) -> int:
+        """
+        Returns the column of a stock
+        """
+        return self.__columns__[stk]
+
+    def values(self, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+        """
+        Returns the read only (time x stock) array of a field
+        """
+        return self.__values__[kind]
+
+    def row(self, tick: int, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+        """
+        Returns the value of every stock at a tick
+        """
+        return self.__values__[kind][tick]
+
+    def column(self, stk: Stock, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+        """
+        Returns the values of a stock along the timeline
+        """
+        return self.__values__[kind][:, self.column_of(stk)]
+
+    def last(self, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+        """
+        Returns the last known value of every stock, nan for stocks without any value
+        """
+        arr = self.__values__[kind]
+        if self.Align == Alignment.union:
+            arr = _forward_fill(arr)
+        return arr[-1] if len(arr) else numpy.full(arr.shape[1], numpy.nan)
+
+    def with_square_off(self, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+        """
+        Returns the array of a field with one more row holding the last known values, the prices the engine squares
+        off the remaining positions at
+        """
+        return numpy.vstack([self.__values__[kind], self.last(kind)])
@@ -0,0 +1,192 @@
+import math
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy
+
+from .engine import Trade
+from .enums import TransactionType
+from .ledger import Ledger
+from .matrix import PriceMatrix, price_matrix
+from .portfolio import Portfolio
+
+
+@dataclass
+class Metrics:
+    Return: float
+    MaxDrawdown: float
+    Sharpe: float
+    Turnover: float
+    WinRate: float
+    Cycles: int
+
+
+def equity_curve(prices: numpy.ndarray, ticks: numpy.ndarray, columns: numpy.ndarray, quantities: numpy.ndarray,
+                 cash_flows: numpy.ndarray, initial_cash: float) -> numpy.ndarray:
+    """
+    Marks the portfolio to market on every tick
+    Args:
+        prices: (ticks x columns) prices the positions are valued at, nan where a column has no price yet
+        ticks: tick of every trade
+        columns: column of every trade
+        quantities: quantity of every trade, negative for sells
+        cash_flows: cash every trade brought in, negative for buys
+        initial_cash: cash before the first trade
+
+    Returns:
+        value of cash and positions after the trades of every tick
+    """
+    length, width = prices.shape
+    cash = initial_cash + numpy.cumsum(numpy.bincount(ticks, weights=cash_flows, minlength=length))
+    held = numpy.bincount(ticks * width + columns, weights=quantities, minlength=length * width)
+    held = numpy.cumsum(held.reshape(length, width), axis=0)
+    with numpy.errstate(invalid="ignore"):
+        # nothing can be held before the first price, so a missing price only ever meets an empty position
+        value = numpy.where(held != 0, held * prices, 0.0)
+    return cash + value.sum(axis=1)
+
+
+def win_rate(columns: numpy.ndarray, quantities: numpy.ndarray, cash_flows: numpy.ndarray) -> Tuple[float, int]:
+    """
+    Splits the trades of every column into cycles that start and end with no position and counts the profitable ones
+    Args:
+        columns: column of every trade
+        quantities: quantity of every trade, negative for sells
+        cash_flows: cash every trade brought in, negative for buys
+
+    Returns:
+        share of the closed cycles that made money, nan if none closed, and the number of closed cycles
+    """
+    if len(columns) == 0:
+        return math.nan, 0
+
+    order = numpy.argsort(columns, kind="stable")
+    cols, qty, flows = columns[order], quantities[order], cash_flows[order]
+
+    first = numpy.empty(len(cols), dtype=bool)
+    first[0] = True
+    first[1:] = cols[1:] != cols[:-1]
+    held = numpy.cumsum(qty)
+    # position within the column: subtract whatever the previous columns left in the running sum
+    starts = numpy.flatnonzero(first)
+    held -= numpy.repeat(held[starts] - qty[starts], numpy.diff(numpy.append(starts, len(cols))))
+
+    closes = held == 0
+    opens = first.copy()
+    opens[1:] |= closes[:-1]
+    cycle = numpy.cumsum(opens) - 1
+
+    pnl = numpy.bincount(cycle, weights=flows)
+    closed = numpy.bincount(cycle, weights=closes) > 0
+    n = int(closed.sum())
+    if n == 0:
+        return math.nan, 0
+    return float((pnl[closed] > 0).mean()), n
+
+
+def statistics(equity: numpy.ndarray, columns: numpy.ndarray, quantities: numpy.ndarray,
+               cash_flows: numpy.ndarray, initial_cash: float, periods: float = 1.0) -> Metrics:
+    """
+    Summarizes an equity curve and the trades behind it
+    Args:
+        equity: value of the portfolio on every tick
+        columns: column of every trade
+        quantities: quantity of every trade, negative for sells
+        cash_flows: cash every trade brought in, negative for buys
+        initial_cash: cash before the first trade
+        periods: number of ticks per year, the sharpe ratio is per tick with the default of 1
+
+    Returns:
+        the metrics
+    """
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        ret = equity[-1] / initial_cash - 1 if initial_cash else math.nan
+
+        peak = numpy.maximum.accumulate(equity)
+        drawdown = numpy.where(peak > 0, (peak - equity) / peak, 0.0)
+
+        returns = numpy.diff(equity) / equity[:-1]
+        returns = returns[numpy.isfinite(returns)]
+        std = returns.std() if len(returns) > 1 else 0.0
+        sharpe = returns.mean() / std * math.sqrt(periods) if std > 0 else math.nan
+
+        mean_equity = equity.mean()
+        turnover = numpy.abs(cash_flows).sum() / mean_equity if mean_equity > 0 else math.nan
+
+    rate, cycles = win_rate(columns, quantities, cash_flows)
+    return Metrics(Return=float(ret), MaxDrawdown=float(drawdown.max()), Sharpe=float(sharpe),
+                   Turnover=float(turnover), WinRate=rate, Cycles=cycles)
+
+
+def evaluate(prices: numpy.ndarray, ticks: numpy.ndarray, columns: numpy.ndarray, quantities: numpy.ndarray,
+             cash_flows: numpy.ndarray, initial_cash: float,
+             periods: float = 1.0) -> Tuple[numpy.ndarray, Metrics]:
+    """
+    Builds the equity curve and its metrics in one go, see equity_curve and statistics
+    """
+    equity = equity_curve(prices, ticks, columns, quantities, cash_flows, initial_cash)
+    return equity, statistics(equity, columns, quantities, cash_flows, initial_cash, periods)
+
+
+def evaluate_trades(prices: numpy.ndarray, trades: List[Trade], initial_cash: float,
+                    periods: float = 1.0) -> Tuple[numpy.ndarray, Metrics]:
+    """
+    Evaluates the trades produced by the engine against the price matrix they were produced from
+    Args:
+        prices: the price matrix the trades were produced from, including the square off row
+        trades: the trades
+        initial_cash: cash before the first trade
+        periods: number of ticks per year
+
+    Returns:
+        the equity curve and its metrics
+    """
+    ticks, columns, kinds, quantities, trade_prices, fees = zip(*trades) if trades else ((),) * 6
+    ticks = numpy.array(ticks, dtype=numpy.int64)
+    columns = numpy.array(columns, dtype=numpy.int64)
+    sign = numpy.fromiter((1 if k == TransactionType.BUY else -1 for k in kinds), dtype=numpy.int64, count=len(kinds))
+    quantities = numpy.array(quantities, dtype=numpy.float64) * sign
+    cash_flows = -quantities * numpy.array(trade_prices, dtype=numpy.float64) - numpy.array(fees, dtype=numpy.float64)
+    return evaluate(prices, ticks, columns, quantities, cash_flows, initial_cash, periods)
+
+
+def evaluate_ledger(ledger: Ledger, prices: numpy.ndarray, periods: float = 1.0) -> Tuple[numpy.ndarray, Metrics]:
+    """
+    Evaluates the trades of a ledger
+    Args:
+        ledger: the ledger
+        prices: (ticks x symbols) prices, columns indexed by the symbol ids of the ledger
+        periods: number of ticks per year
+
+    Returns:
+        the equity curve and its metrics
+    """
+    quantities = ledger.quantities * ledger.sides.astype(numpy.int64)
+    return evaluate(prices, ledger.ticks, ledger.symbols.astype(numpy.int64), quantities.astype(numpy.float64),
+                    ledger.cash_flows(), ledger.InitialCash, periods)
+
+
+def evaluate_portfolio(p: Portfolio, periods: float = 1.0,
+                       matrix: PriceMatrix | None = None) -> Tuple[numpy.ndarray, Metrics]:
+    """
+    Evaluates a portfolio over the close prices of the stocks it traded, up to the last tick it traded at
+    Args:
+        p: the portfolio
+        periods: number of ticks per year
+        matrix: the aligned prices the run traded on, needed when its ticks are not the bars of the stocks
+
+    Returns:
+        the equity curve and its metrics
+    """
+    stocks = p.stocks
+    last_tick = int(p.Ledger.ticks.max(initial=-1))
+    if matrix is None or not stocks:
+        length = max([len(stk.array()) for stk in stocks] + [last_tick + 1, 1])
+        return evaluate_ledger(p.Ledger, price_matrix(stocks, length), periods)
+
+    prices = matrix.values()[:, [matrix.column_of(stk) for stk in stocks]]
+    if last_tick >= len(prices):
+        # trades after the timeline, the square off, happen at the last known prices
+        last = matrix.last()[[matrix.column_of(stk) for stk in stocks]]
+        prices = numpy.vstack([prices] + [last] * (last_tick + 1 - len(prices)))
+    return evaluate_ledger(p.Ledger, prices, periods)
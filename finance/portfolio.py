@@ -2,14 +2,15 @@ import dataclasses
 import logging
 import uuid
 
+import numpy
+
 from .exceptions import AmountIsZeroException, NotEnoughStocksToSellException
-from .stock import Stock
-from .enums import TransactionType
+from .execution import ExecutionModel, FRICTIONLESS
+from .ledger import Ledger, BUY, SELL
+from .stock import Stock, ValueKind
 from .transaction import Transaction
-from typing import List, Dict
-from utils import get_ticker
-
-from collections import defaultdict
+from typing import List, Dict, Tuple
+from utils import get_ticker, Ticker
 
 
 @dataclasses.dataclass
@@ -21,72 +22,154 @@ class Holdings:
 
 class Portfolio:
 
-    def __init__(self, initial_cash=0.0, allow_short=False):
+    def __init__(self, initial_cash=0.0, allow_short=False, ticker: Ticker | None = None,
+                 execution: ExecutionModel | None = None):
         self.ID = uuid.uuid4()
-        self.Cash: float = initial_cash
         self.AllowShort: bool = allow_short
+        # the clock the prices are read at, portfolios without one share the global ticker
+        self.Ticker: Ticker = ticker if ticker is not None else get_ticker()
+        # how orders are filled, at the close without costs by default
+        self.Execution: ExecutionModel = execution if execution is not None and not execution.frictionless else \
+            FRICTIONLESS
+
+        self.Ledger: Ledger = Ledger(initial_cash)
+        # symbol ids of the ledger, in the order the stocks were first seen
+        self.__ids__: Dict[Stock, int] = {}
+        self.__stocks__: List[Stock] = []
+        self.__names__: Dict[str, List[int]] = {}
+
+    @property
+    def Cash(self) -> float:
+        return self.Ledger.Cash
+
+    @property
+    def stocks(self) -> List[Stock]:
+        """
+        The stocks traded so far, indexed by their ledger symbol id
+        """
+        return list(self.__stocks__)
 
-        self.__transactions__: List[Transaction] = []
-        self.__holdings__: Dict[Stock, int] = defaultdict(lambda: 0)
+    def __symbol__(self, stock: Stock) -> int:
+        """
+        Returns the ledger id of a stock, registering it the first time it is seen
+        """
+        i = self.__ids__.get(stock)
+        if i is None:
+            i = self.Ledger.register(stock.name)
+            self.__ids__[stock] = i
+            self.__stocks__.append(stock)
+            self.__names__.setdefault(stock.name, []).append(i)
+
+        return i
+
+    def __fill__(self, stock: Stock, side: int, quantity: int, price: float, tick: int,
+                 limit: bool = True) -> Tuple[int, float, float]:
+        # the volume is only read when the model needs it, from the cached array like the prices
+        volume = stock.value_at(tick, ValueKind.Volume) if self.Execution.uses_volume else float("nan")
+        return self.Execution.fill(side, quantity, price, volume, limit)
+
+    def buy(self, stock: Stock, quantity: int) -> int:
+        return self.buy_at(stock, quantity, stock.value_at(self.Ticker.value), self.Ticker.value)
+
+    def buy_at(self, stock: Stock, quantity: int, price: float, tick: int, fee: float | None = None,
+               limit: bool = True) -> int:
+        """
+        Buys the stock at an explicit price and tick instead of reading them through the ticker
+        Args:
+            stock: the stock to buy
+            quantity: number of stocks to buy
+            price: price of a single stock, the close the execution model fills the order from
+            tick: tick at which the transaction happens
+            fee: fee of an order already filled by the execution model, which then isn't applied again
+            limit: whether the participation cap of the execution model applies
 
-    def buy(self, stock: Stock, quantity: int):
+        Returns:
+            the quantity filled
+        """
         if quantity == 0:
             raise Exception("Stock buy can't be 0")
 
-        amount = stock.close * quantity
+        if fee is None:
+            if self.Execution is FRICTIONLESS:
+                fee = 0.0
+            else:
+                quantity, price, fee = self.__fill__(stock, BUY, quantity, price, tick, limit)
+                if quantity == 0:
+                    raise Exception("Stock buy can't be 0")
 
-        if self.Cash < amount:
-            raise Exception("Not enough money to buy")
+        amount = price * quantity
 
-        logging.debug(f"Buying {stock.name} q={quantity} p={stock.close} amount={amount}")
+        if self.Cash < amount + fee:
+            raise Exception("Not enough money to buy")
 
-        self.__transactions__.append(
-            Transaction(Tick=get_ticker().value, Type=TransactionType.BUY, StockName=stock.name,
-                        Quantity=quantity, Price=stock.close, Amount=amount))
-        self.Cash -= amount
+        logging.debug("Buying %s q=%s p=%s amount=%s", stock.name, quantity, price, amount)
 
-        self.__holdings__[stock] += quantity
+        self.Ledger.record(self.__symbol__(stock), tick, BUY, quantity, price, amount, fee)
+        return quantity
 
     def buy_amount(self, stock: Stock, amount: float) -> int:
-        q = int(amount // stock.close)
-        self.buy(stock, q)
+        q = int(amount // stock.value_at(self.Ticker.value))
+        return self.buy(stock, q)
+
+    def sell(self, stock: Stock, quantity: int) -> int:
+        return self.sell_at(stock, quantity, stock.value_at(self.Ticker.value), self.Ticker.value)
 
-        return q
+    def sell_at(self, stock: Stock, quantity: int, price: float, tick: int, fee: float | None = None,
+                limit: bool = True) -> int:
+        """
+        Sells the stock at an explicit price and tick instead of reading them through the ticker
+        Args:
+            stock: the stock to sell
+            quantity: number of stocks to sell
+            price: price of a single stock, the close the execution model fills the order from
+            tick: tick at which the transaction happens
+            fee: fee of an order already filled by the execution model, which then isn't applied again
+            limit: whether the participation cap of the execution model applies
 
-    def sell(self, stock: Stock, quantity: int):
+        Returns:
+            the quantity filled
+        """
         if quantity == 0:
             raise AmountIsZeroException("Stock sell can't be 0")
 
         if not self.AllowShort and quantity > self.get_holding(stock).quantity:
             raise NotEnoughStocksToSellException("Not enough stocks to sell")
 
-        amount = stock.close * quantity
+        if fee is None:
+            if self.Execution is FRICTIONLESS:
+                fee = 0.0
+            else:
+                quantity, price, fee = self.__fill__(stock, SELL, quantity, price, tick, limit)
+                if quantity == 0:
+                    raise AmountIsZeroException("Stock sell can't be 0")
 
-        logging.debug(f"Selling {stock.name} q={quantity} p={stock.close} amount={amount}")
+        amount = price * quantity
 
-        self.__transactions__.append(
-            Transaction(Tick=get_ticker().value, Type=TransactionType.SELL, StockName=stock.name,
-                        Quantity=quantity, Price=stock.close, Amount=amount))
+        logging.debug("Selling %s q=%s p=%s amount=%s", stock.name, quantity, price, amount)
 
-        self.Cash += amount
-        self.__holdings__[stock] -= quantity
+        self.Ledger.record(self.__symbol__(stock), tick, SELL, quantity, price, amount, fee)
+        return quantity
 
     def sell_amount(self, stock: Stock, amount: float) -> int:
-        q = int(amount // stock.close)
-        self.sell(stock, q)
-
-        return q
+        q = int(amount // stock.value_at(self.Ticker.value))
+        return self.sell(stock, q)
 
     def get_stock_transactions(self, stock: Stock) -> List[Transaction]:
-        return list(filter(lambda x: x.StockName == stock.name, self.__transactions__))
+        ids = self.__names__.get(stock.name, [])
+        if len(ids) == 1:
+            return self.Ledger.transactions(self.Ledger.rows(ids[0]))
+
+        # different stock objects can share a name, their rows are merged back in time order
+        rows = numpy.sort(numpy.concatenate([self.Ledger.rows(i) for i in ids] or [numpy.empty(0, numpy.int64)]))
+        return self.Ledger.transactions(rows)
 
     def get_all_transactions(self) -> List[Transaction]:
-        return list(self.__transactions__)
+        return self.Ledger.transactions()
 
     def get_holding(self, stock: Stock) -> Holdings:
-        q = self.__holdings__[stock]
+        q = self.Ledger.position(self.__symbol__(stock))
 
-        return Holdings(name=stock.name, quantity=q, valuation=q * stock.close)
+        return Holdings(name=stock.name, quantity=q, valuation=q * stock.value_at(self.Ticker.value))
 
     def square_off(self, stocks: List[Stock]):
         """
@@ -95,19 +178,24 @@ class Portfolio:
             stocks: the stocks who are to be squared off
         Returns:
         """
-        for holding, qty in self.__holdings__.items():
+        for i, holding in enumerate(self.__stocks__):
             if holding not in stocks:
                 continue
 
+            qty = self.Ledger.position(i)
+            price, tick = holding.value_at(self.Ticker.value), self.Ticker.value
+
+            # the square off closes the whole position whatever the volume of the bar
             if qty > 0:
-                self.sell(holding, qty)
+                self.sell_at(holding, qty, price, tick, limit=False)
             elif qty < 0:
-                self.buy(holding, -qty)
+                self.buy_at(holding, -qty, price, tick, limit=False)
 
     @property
     def holdings(self) -> List[Holdings]:
         res = []
-        for k, v in self.__holdings__.items():
-            res.append(Holdings(name=k.name, quantity=v, valuation=v * k.close))
+        for i, k in enumerate(self.__stocks__):
+            v = self.Ledger.position(i)
+            res.append(Holdings(name=k.name, quantity=v, valuation=v * k.value_at(self.Ticker.value)))
 
         return res
@@ -0,0 +1,148 @@
+import datetime
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Dict
+
+import numpy
+import pandas
+import yfinance as yf
+
+from utils import to_timedelta
+
+
+class DataProvider(ABC):
+    """
+    DataProvider is a source of market data, it returns the history of a symbol in the shape yfinance does
+    """
+
+    @abstractmethod
+    def history(self, symbol: str, period: str, interval: str,
+                start: datetime.datetime | None = None) -> pandas.DataFrame:
+        """
+        Fetches the history of a symbol
+        Args:
+            symbol: the symbol to fetch
+            period: time period of data
+            interval: interval between ticks
+            start: when given only bars from this time on are fetched and period is ignored
+
+        Returns:
+            dataframe of bars
+        """
+
+    def history_many(self, symbols: List[str], period: str, interval: str) -> Dict[str, pandas.DataFrame]:
+        """
+        Fetches the history of several symbols, providers that can batch requests override this
+        Args:
+            symbols: the symbols to fetch
+            period: time period of data
+            interval: interval between ticks
+
+        Returns:
+            history per symbol, symbols that could not be fetched are left out
+        """
+        res: Dict[str, pandas.DataFrame] = {}
+        for symbol in symbols:
+            df = self.history(symbol, period, interval)
+            if not df.empty:
+                res[symbol] = df
+
+        return res
+
+
+class YahooProvider(DataProvider):
+
+    def history(self, symbol: str, period: str, interval: str,
+                start: datetime.datetime | None = None) -> pandas.DataFrame:
+        ticker = yf.Ticker(symbol)
+        if start is not None:
+            return ticker.history(start=start, interval=interval)
+        return ticker.history(period=period, interval=interval)
+
+    def history_many(self, symbols: List[str], period: str, interval: str) -> Dict[str, pandas.DataFrame]:
+        # a single download call, yfinance spreads the symbols over its own threads. Timezones are kept for every
+        # interval, like history does, so bars fetched either way append to each other
+        data = yf.download(symbols, period=period, interval=interval, group_by="ticker", auto_adjust=True,
+                           actions=True, threads=True, progress=False, ignore_tz=False)
+
+        res: Dict[str, pandas.DataFrame] = {}
+        if data is None or data.empty:
+            return res
+
+        tickers = set(data.columns.get_level_values(0))
+        for symbol in symbols:
+            # yfinance reports the tickers upper cased
+            for key in (symbol, symbol.upper()):
+                if key in tickers:
+                    df = data[key].dropna(how="all")
+                    if not df.empty:
+                        res[symbol] = df
+                    break
+
+        return res
+
+
+def random_walk(length: int, seed: int = 0, start_price: float = 100.0, sigma: float = 0.002,
+                start: str | pandas.Timestamp = "2024-01-01 09:15", freq: str = "min",
+                tz: str = "Asia/Kolkata") -> pandas.DataFrame:
+    """
+    Generates a random walk of bars with the columns yfinance returns
+    Args:
+        length: number of bars
+        seed: seed of the random generator
+        start_price: price of the first bar
+        sigma: standard deviation of the per bar log return
+        start: time of the first bar, local to tz unless it has a timezone
+        freq: time between bars
+        tz: timezone of the index
+
+    Returns:
+        dataframe with Open, High, Low, Close, Volume, Dividends and Stock Splits columns
+    """
+    rng = numpy.random.default_rng(seed)
+    close = start_price * numpy.exp(numpy.cumsum(rng.normal(0, sigma, length)))
+    open_ = numpy.concatenate(([start_price], close[:-1]))
+    spread = numpy.abs(rng.normal(0, sigma, length)) * close
+    index = pandas.date_range(start, periods=length, freq=freq, name="Datetime")
+    index = index.tz_localize(tz) if index.tz is None else index.tz_convert(tz)
+
+    return pandas.DataFrame({
+        "Open": open_,
+        "High": numpy.maximum(open_, close) + spread,
+        "Low": numpy.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(1_000, 100_000, length),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=index)
+
+
+class SyntheticProvider(DataProvider):
+    """
+    SyntheticProvider generates random walks locally instead of downloading anything, a delay can be added to
+    simulate slow downloads. The same symbol always gives the same prices, the last bar is at the current time.
+    """
+
+    def __init__(self, delay: float = 0.0, max_bars: int = 100_000):
+        self.Delay: float = delay
+        self.MaxBars: int = max_bars
+        self.Calls: int = 0
+        self.__lock__ = threading.Lock()
+
+    def history(self, symbol: str, period: str, interval: str,
+                start: datetime.datetime | None = None) -> pandas.DataFrame:
+        with self.__lock__:
+            self.Calls += 1
+
+        if self.Delay > 0:
+            time.sleep(self.Delay)
+
+        step = to_timedelta(interval)
+        length = min(self.MaxBars, max(1, to_timedelta(period) // step))
+        end = pandas.Timestamp.now(tz="UTC").floor(step)
+        seed = sum(symbol.encode())
+        df = random_walk(length, seed=seed, start_price=10.0 + seed % 500, start=end - (length - 1) * step, freq=step)
+        if start is not None:
+            df = df[df.index >= start]
+        return df
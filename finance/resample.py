@@ -0,0 +1,122 @@
+import datetime
+from typing import Dict
+
+import numpy
+import pandas
+
+from utils import to_timedelta
+
+# how the bars falling into one coarser bar are reduced
+FIRST = "first"
+LAST = "last"
+MAX = "max"
+MIN = "min"
+SUM = "sum"
+
+DAY = datetime.timedelta(days=1)
+DAY_NS = 24 * 3600 * 10 ** 9
+
+
+def check(base: str | None, interval: str):
+    """
+    Checks that bars of an interval can be built from bars of the base interval
+    Args:
+        base: interval of the stored bars, None if it is not known
+        interval: the interval asked for
+
+    Raises:
+        ValueError: if the interval is finer than the base or, within a day, not a multiple of it
+    """
+    target = to_timedelta(interval)
+    if base is None:
+        return
+    step = to_timedelta(base)
+    if target < step:
+        raise ValueError(f"bars of {interval} can't be built from bars of {base}")
+    if target < DAY and target % step:
+        raise ValueError(f"{interval} is not a multiple of {base}")
+
+
+def buckets(index: pandas.DatetimeIndex, interval: str) -> numpy.ndarray:
+    """
+    Returns the start of the coarser bar every bar falls into, as wall clock nanoseconds of the index's timezone.
+    Bars within a day are counted from the first bar of the day, so 5m bars of a market opening at 9:15 start at
+    9:15, 9:20... like the ones a provider returns. Days, weeks, months and years start at midnight.
+    Args:
+        index: sorted datetime index of the bars
+        interval: the coarser interval
+
+    Returns:
+        int64 array as long as the index
+    """
+    local = (index.tz_localize(None) if index.tz is not None else index).as_unit("ns").asi8
+    step = to_timedelta(interval)
+    unit = interval.lstrip("0123456789")
+    n = int(interval[:len(interval) - len(unit)])
+
+    if step < DAY:
+        step_ns = step // datetime.timedelta(microseconds=1) * 1000
+        day = local // DAY_NS
+        starts = numpy.concatenate(([0], numpy.flatnonzero(day[1:] != day[:-1]) + 1))
+        opening = numpy.repeat(local[starts], numpy.diff(numpy.append(starts, len(local))))
+        return opening + (local - opening) // step_ns * step_ns
+
+    days = local // DAY_NS
+    match unit:
+        case "d":
+            return days // n * n * DAY_NS
+        case "wk":
+            # the epoch is a thursday, weeks start on monday
+            monday = days - (days + 3) % 7
+            return ((monday + 3) // (7 * n) * (7 * n) - 3) * DAY_NS
+        case "mo" | "y":
+            period = local.astype("datetime64[ns]").astype("datetime64[M]" if unit == "mo" else "datetime64[Y]")
+            start = period.astype(numpy.int64) // n * n
+            return start.astype(period.dtype).astype("datetime64[ns]").astype(numpy.int64)
+
+    raise ValueError(f"can't resample to {interval}")
+
+
+def aggregate(df: pandas.DataFrame, interval: str, how: Dict[str, str]) -> pandas.DataFrame:
+    """
+    Builds coarser bars with one reduction per column over contiguous runs of bars, no grouping by key is needed
+    since the bars are sorted
+    Args:
+        df: bars with a sorted datetime index
+        interval: the coarser interval
+        how: reduction of every column, columns that are not listed are summed
+
+    Returns:
+        one bar per interval that has bars, indexed by the start of the interval
+    """
+    if not isinstance(df.index, pandas.DatetimeIndex):
+        raise ValueError("only bars indexed by time can be resampled")
+    if df.empty:
+        return df.copy()
+
+    bucket = buckets(df.index, interval)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(bucket[1:] != bucket[:-1]) + 1))
+    ends = numpy.append(starts[1:], len(df)) - 1
+
+    data = {}
+    for name in df.columns:
+        values = df[name].to_numpy()
+        match how.get(name, SUM):
+            case "first":
+                data[name] = values[starts]
+            case "last":
+                data[name] = values[ends]
+            case "max":
+                data[name] = numpy.maximum.reduceat(values, starts)
+            case "min":
+                data[name] = numpy.minimum.reduceat(values, starts)
+            case _:
+                data[name] = numpy.add.reduceat(values, starts)
+
+    # labels are moved back from the first bar of every interval by its wall clock distance to the start, so they
+    # keep the utc offset of that bar
+    first = df.index[starts]
+    local = (first.tz_localize(None) if first.tz is not None else first).as_unit("ns").asi8
+    index = first - pandas.to_timedelta(local - bucket[starts], unit="ns")
+    index.name = df.index.name
+    return pandas.DataFrame(data, index=index, columns=df.columns)
@@ -0,0 +1,164 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple, Set
+
+import numpy
+
+from .context import Context
+from .enums import Alignment
+from .execution import ExecutionModel
+from .ledger import BUY, SELL
+from .matrix import PriceMatrix
+from .portfolio import Portfolio
+from .stock import Stock, ValueKind
+
+
+@dataclass
+class Schedule:
+    """
+    Schedule is a fixed list of buys and sells, each at a fraction of the timeline of the stock it runs on. Every buy
+    spends an equal split of the initial cash and every sell sells the quantity of the last buy.
+    """
+    Buys: List[float] = field(default_factory=lambda: [0.05, 0.35, 0.65, 0.75, 0.95])
+    Sells: List[float] = field(default_factory=lambda: [0.25, 0.41, 0.70, 0.90, 0.99])
+    # number of equal parts the cash is split in, one per buy by default
+    Splits: int | None = None
+
+    def __post_init__(self):
+        if not self.Buys and self.Splits is None:
+            raise ValueError("a schedule without buys needs the number of splits")
+
+    def amount(self, cash: float) -> float:
+        return cash / (self.Splits if self.Splits is not None else len(self.Buys))
+
+    def ticks(self, total: int) -> Tuple[Set[int], Set[int]]:
+        """
+        Returns the ticks of the buys and of the sells on a timeline of total ticks
+        """
+        return {int(x * total) for x in self.Buys}, {int(x * total) for x in self.Sells}
+
+
+@dataclass
+class ScheduleResult:
+    Stock: Stock
+    Portfolio: Portfolio
+    # the trade the schedule stopped at, the portfolio holds the trades before it
+    Error: str | None = None
+
+
+def schedule_batch(cash: float, stocks: List[Stock], schedule: Schedule | None = None,
+                   execution: ExecutionModel | None = None) -> List[ScheduleResult]:
+    """
+    Runs a schedule on every stock at once, each with its own portfolio and cash, as Algorithms.A runs it on a
+    single stock. The ticks of every stock are computed once, the prices at those ticks are gathered from the price
+    matrix, and the buys and sells are evaluated for all stocks together, one scheduled event at a time.
+    Args:
+        cash: initial cash of every portfolio
+        stocks: the stocks, each on its own timeline
+        schedule: the schedule, the one of Algorithms.A by default
+        execution: how orders are filled, applied to all stocks of an event at once. The same model on the portfolio
+            of Algorithms.A gives the same fills
+
+    Returns:
+        one result per stock in the same order. A stock whose trade would fail, e.g. for lack of cash, stops trading
+        there with the error Algorithms.A would raise
+    """
+    schedule = schedule if schedule is not None else Schedule()
+    if not stocks:
+        return []
+
+    totals = numpy.array([len(stk.array()) for stk in stocks])
+    fractions = list(schedule.Buys) + list(schedule.Sells)
+    is_sell = numpy.array([False] * len(schedule.Buys) + [True] * len(schedule.Sells))
+
+    # (event x stock) ticks, ordered per stock by tick with a buy before a sell of the same tick
+    ticks = numpy.array([[int(x * total) for total in totals.tolist()] for x in fractions],
+                        dtype=numpy.int64).reshape(len(fractions), len(stocks))
+    keys = ticks * 2 + is_sell[:, None]
+    order = numpy.argsort(keys, axis=0, kind="stable")
+    keys = numpy.take_along_axis(keys, order, axis=0)
+    ticks = numpy.take_along_axis(ticks, order, axis=0)
+    sells = is_sell[order]
+
+    if execution is not None and execution.frictionless:
+        execution = None
+    fields = (ValueKind.Close, ValueKind.Volume) if execution is not None and execution.uses_volume else \
+        (ValueKind.Close,)
+    matrix = PriceMatrix(stocks, Alignment.tick, length=int(totals.max()), fields=fields)
+    columns = numpy.array([matrix.column_of(stk) for stk in stocks])
+    close = matrix.values()
+    # ticks past the end of a stock never come up, the fraction of the timeline is below 1 or the event is dropped
+    inside = ticks < totals
+    at = numpy.minimum(ticks, close.shape[0] - 1)
+    prices = close[at, columns]
+    volumes = matrix.values(ValueKind.Volume)[at, columns] if len(fields) > 1 else numpy.full(prices.shape, numpy.nan)
+
+    amt = schedule.amount(cash)
+    balance = numpy.full(len(stocks), float(cash))
+    held = numpy.zeros(len(stocks), dtype=numpy.int64)
+    last_q = numpy.zeros(len(stocks), dtype=numpy.int64)
+    errors: List[str | None] = [None] * len(stocks)
+    alive = numpy.ones(len(stocks), dtype=bool)
+    trades: List[List[Tuple[int, bool, int, float, float]]] = [[] for _ in stocks]
+    no_fee = numpy.zeros(len(stocks))
+
+    for e in range(len(fractions)):
+        # the same tick scheduled twice trades once
+        repeated = keys[e] == keys[e - 1] if e else numpy.zeros(len(stocks), dtype=bool)
+        active = alive & inside[e] & ~repeated
+        price = prices[e]
+
+        buy = active & ~sells[e]
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            q = numpy.floor_divide(amt, price)
+        q = numpy.where(buy, q, 0).astype(numpy.int64)
+        buy_price, buy_fee = price, no_fee
+        if execution is not None:
+            q, buy_price, buy_fee = execution.fills(BUY, q, price, volumes[e])
+        amount = buy_price * q
+        # a quantity of 0, asked for or filled, fails like in Portfolio.buy_at
+        zero = buy & (q == 0)
+        poor = buy & ~zero & (balance < amount + buy_fee)
+        bought = buy & ~zero & ~poor
+        balance = numpy.where(bought, balance - amount, balance)
+        balance = numpy.where(bought & (buy_fee != 0), balance - buy_fee, balance)
+        held = held + numpy.where(bought, q, 0)
+        last_q = numpy.where(bought, q, last_q)
+
+        sell = active & sells[e]
+        nothing = sell & (last_q == 0)
+        short = sell & ~nothing & (last_q > held)
+        sold_q, sell_price, sell_fee = numpy.where(sell, last_q, 0), price, no_fee
+        if execution is not None:
+            sold_q, sell_price, sell_fee = execution.fills(SELL, sold_q, price, volumes[e])
+            nothing |= sell & ~short & (sold_q == 0)
+        sold = sell & ~nothing & ~short
+        balance = numpy.where(sold, balance + sell_price * sold_q, balance)
+        balance = numpy.where(sold & (sell_fee != 0), balance - sell_fee, balance)
+        held = held - numpy.where(sold, sold_q, 0)
+
+        for s in numpy.flatnonzero(bought | sold).tolist():
+            if bought[s]:
+                trades[s].append((int(ticks[e, s]), False, int(q[s]), float(buy_price[s]), float(buy_fee[s])))
+            else:
+                trades[s].append((int(ticks[e, s]), True, int(sold_q[s]), float(sell_price[s]), float(sell_fee[s])))
+        for mask, error in ((zero, "Stock buy can't be 0"), (poor, "Not enough money to buy"),
+                            (nothing, "Stock sell can't be 0"), (short, "Not enough stocks to sell")):
+            for s in numpy.flatnonzero(mask).tolist():
+                errors[s] = error
+        alive &= ~(zero | poor | nothing | short)
+
+    res = []
+    for s, stk in enumerate(stocks):
+        ctx = Context([stk], cash=cash, execution=execution)
+        p = ctx.Portfolio
+        # the trades are already filled, the portfolio records them as they are
+        for tick, is_sold, quantity, price, fee in trades[s]:
+            if is_sold:
+                p.sell_at(stk, quantity, price, tick, fee=fee)
+            else:
+                p.buy_at(stk, quantity, price, tick, fee=fee)
+        # the clock ends where the tick by tick run leaves it
+        ctx.Ticker.set(int(totals[s]))
+        res.append(ScheduleResult(Stock=stk, Portfolio=p, Error=errors[s]))
+
+    return res
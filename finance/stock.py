@@ -1,11 +1,16 @@
+import datetime
+import hashlib
+import io
 import json
 from enum import Enum
 from typing import List, Dict
 
+import numpy
 import pandas
-import yfinance as yf
 
 from utils import get_ticker
+from . import codec, resample
+from .providers import DataProvider, YahooProvider
 
 DATETIME_COLNAME = "Date"
 OPEN_COLNAME = "Open"
@@ -16,6 +21,16 @@ VOLUME_COLNAME = "Volume"
 
 NAME_KEY = "Name"
 DATAFRAME_KEY = "df"
+INTERVAL_KEY = "Interval"
+
+# reduction of every column when bars are resampled to a coarser interval, other columns are summed
+AGGREGATIONS = {
+    OPEN_COLNAME: resample.FIRST,
+    HIGH_COLNAME: resample.MAX,
+    LOW_COLNAME: resample.MIN,
+    CLOSE_COLNAME: resample.LAST,
+    VOLUME_COLNAME: resample.SUM,
+}
 
 
 class ValueKind(Enum):
@@ -26,6 +41,7 @@ class ValueKind(Enum):
     Close = CLOSE_COLNAME
     High = HIGH_COLNAME
     Low = LOW_COLNAME
+    Volume = VOLUME_COLNAME
 
     @staticmethod
     def to_colname(kind) -> str:
@@ -45,25 +61,183 @@ class ValueKind(Enum):
                 return HIGH_COLNAME
             case ValueKind.Low:
                 return LOW_COLNAME
+            case ValueKind.Volume:
+                return VOLUME_COLNAME
 
         return CLOSE_COLNAME
 
 
+def index_time(t: datetime.datetime, index: pandas.DatetimeIndex) -> pandas.Timestamp:
+    """
+    Converts a time so it compares with the times of an index: naive times are taken in the timezone of the index,
+    aware times against a naive index, like the one of a migrated json dump, are taken in UTC
+    """
+    t = pandas.Timestamp(t)
+    if index.tz is not None:
+        return t.tz_localize(index.tz) if t.tz is None else t.tz_convert(index.tz)
+    return t.tz_convert(None) if t.tz is not None else t
+
+
+def localize(df: pandas.DataFrame, tz: datetime.tzinfo | str | None) -> pandas.DataFrame:
+    """
+    Moves bars to the timezone of stored ones so their times compare: naive bars are taken in that timezone, aware
+    bars keep their wall clock when the stored ones are naive, like the daily bars of a bulk download
+    """
+    if tz is not None:
+        return df.tz_localize(tz) if df.index.tz is None else df.tz_convert(tz)
+    return df.tz_localize(None) if df.index.tz is not None else df
+
+
+def _memory(arrays: List[numpy.ndarray]) -> int:
+    """
+    Bytes held by arrays, memory shared by several of them counts once. Arrays wrapping encoded chunks hold none of
+    their own, the chunks are counted by their source
+    """
+    owners = {}
+    for arr in arrays:
+        while isinstance(arr.base, numpy.ndarray):
+            arr = arr.base
+        if not isinstance(arr.base, bytes):
+            owners[id(arr)] = arr.nbytes
+    return sum(owners.values())
+
+
 class Stock:
-    def __init__(self, name: str, skip_loading=False, period="7d", interval="1m"):
+    def __init__(self, name: str, skip_loading=False, period="7d", interval="1m", provider: DataProvider | None = None):
         self.name = name
-        self.df: pandas.DataFrame = pandas.DataFrame()
+        self.period = period
+        self.interval = interval
+        self.__df__: pandas.DataFrame | None = pandas.DataFrame()
+        self.__arrays__: Dict[ValueKind, numpy.ndarray] = {}
+        self.__version__: str | None = None
+        # set by fromArrays: the columns and the index the stock wraps, the dataframe is only built when asked for
+        self.__columns__: Dict[str, numpy.ndarray] = {}
+        self.__index__: pandas.Index | None = None
+        # set by fromChunks and project: where the index and the columns are decoded from on first access, decoded
+        # columns are kept in __columns__
+        self.__source__: codec.Chunks | Projection | None = None
 
         if not skip_loading:
-            self.df = self.load_from_yahoo(period, interval)
+            self.df = self.load(provider if provider is not None else YahooProvider(), period, interval)
+
+    @property
+    def df(self) -> pandas.DataFrame:
+        if self.__df__ is None:
+            columns = {name: self.__column__(name) for name in self.__names__()}
+            self.__df__ = pandas.DataFrame(columns, index=self.index, columns=list(columns), copy=False)
+        return self.__df__
+
+    @df.setter
+    def df(self, df: pandas.DataFrame):
+        self.__df__ = df
+        # arrays are derived from the dataframe, so they have to be rebuilt
+        self.__arrays__ = {}
+        self.__version__ = None
+        self.__columns__ = {}
+        self.__index__ = None
+        self.__source__ = None
+
+    @property
+    def index(self) -> pandas.Index:
+        """
+        Index of the bars, doesn't build the dataframe of a stock made by fromArrays, fromChunks or project
+        """
+        if self.__index__ is None and self.__source__ is not None:
+            self.__index__ = self.__source__.index()
+        return self.__index__ if self.__index__ is not None else self.df.index
+
+    def __names__(self) -> List[str]:
+        """
+        Returns the names of the columns, without decoding any of them
+        """
+        if self.__source__ is not None:
+            return list(self.__source__.Names)
+        return list(self.__columns__) if self.__df__ is None else list(self.df.columns)
+
+    def __column__(self, name: str, rows: slice | None = None) -> numpy.ndarray:
+        """
+        Returns the values of a column. A column of a lazy stock is decoded on first access and kept, unless only some
+        rows are asked for, then only those are decoded and nothing is kept
+        Raises:
+            KeyError: if the stock has no such column
+        """
+        if self.__df__ is not None:
+            col = self.__df__[name].to_numpy()
+            return col if rows is None else col[rows]
+
+        col = self.__columns__.get(name)
+        if col is None and self.__source__ is not None:
+            if rows is not None:
+                return self.__source__.column(name, rows)
+            col = self.__columns__[name] = self.__source__.column(name)
+        if col is None:
+            raise KeyError(name)
+        return col if rows is None else col[rows]
+
+    @property
+    def version(self) -> str:
+        """
+        Digest of the index and the columns, two stocks with the same bars have the same version
+        """
+        if self.__version__ is None:
+            digest = hashlib.blake2b(digest_size=16)
+            index = self.index
+            digest.update(index.as_unit("ns").asi8.tobytes() if isinstance(index, pandas.DatetimeIndex)
+                          else numpy.asarray(index).tobytes())
+            for name in self.__names__():
+                values = self.__column__(name)
+                digest.update(str(name).encode())
+                digest.update(numpy.ascontiguousarray(values).tobytes())
+            self.__version__ = digest.hexdigest()
+
+        return self.__version__
 
     def load_from_yahoo(self, period, interval) -> pandas.DataFrame:
-        ticker = yf.Ticker(self.name)
-        return ticker.history(period=period, interval=interval)
+        return self.load(YahooProvider(), period, interval)
+
+    def load(self, provider: DataProvider, period, interval) -> pandas.DataFrame:
+        return provider.history(self.name, period=period, interval=interval)
 
     def get_history(self) -> pandas.DataFrame:
         return self.df
 
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the stock: the dataframe and the arrays cached from it. The columns of a stock
+        made by fromArrays count in full even when they are mapped from disk, a stock made by fromChunks counts its
+        encoded chunks and the columns decoded so far.
+        """
+        source = self.__source__.nbytes if self.__source__ is not None else 0
+        if self.__df__ is None:
+            index = self.__index__.nbytes if self.__index__ is not None else 0
+            return index + _memory(list(self.__columns__.values()) + list(self.__arrays__.values())) + source
+        arrays = sum(a.nbytes for a in self.__arrays__.values())
+        return int(self.df.memory_usage(index=True, deep=True).sum()) + arrays + source
+
+    @classmethod
+    def fromArrays(cls, name: str, index: pandas.Index, columns: Dict[str, numpy.ndarray], interval: str | None = None):
+        """
+        Returns a stock object wrapping arrays without copying them, e.g. columns memory mapped from disk
+        Args:
+            name: name of the stock
+            index: index of the bars
+            columns: values keyed by column name, as long as the index
+            interval: interval between the bars
+
+        Returns:
+            an object of type stock
+        """
+        for col, values in columns.items():
+            if len(values) != len(index):
+                raise ValueError(f"column {col} has {len(values)} values for {len(index)} bars")
+
+        s = Stock(name, skip_loading=True, interval=interval)
+        s.__df__ = None
+        s.__index__ = index
+        s.__columns__ = columns
+        return s
+
     @classmethod
     def fromJSON(cls, json_str: str):
         """
@@ -77,7 +251,7 @@ class Stock:
         json_dict: Dict = json.loads(json_str)
 
         s = Stock(json_dict[NAME_KEY], skip_loading=True)
-        s.df = pandas.read_json(json_dict[DATAFRAME_KEY])
+        s.df = pandas.read_json(io.StringIO(json_dict[DATAFRAME_KEY]))
         return s
 
     def toJSON(self) -> str:
@@ -88,6 +262,117 @@ class Stock:
 
         return json.dumps(d, sort_keys=True, indent=4)
 
+    @classmethod
+    def fromBytes(cls, buf: bytes):
+        """
+        Returns a stock object reading from the binary encoding
+        Args:
+            buf: bytes produced by toBytes
+
+        Returns:
+            an object of type stock
+        """
+        df, meta = codec.decode(buf)
+
+        s = Stock(meta[NAME_KEY], skip_loading=True, interval=meta.get(INTERVAL_KEY))
+        s.df = df
+        return s
+
+    def toBytes(self) -> bytes:
+        """
+        Encodes the stock as packed columns, see codec for the layout
+        Returns:
+            the encoded bytes
+        """
+        return codec.encode(self.df, {NAME_KEY: self.name, INTERVAL_KEY: self.interval})
+
+    @classmethod
+    def fromChunks(cls, name: str, chunks: List[bytes]):
+        """
+        Returns a stock object joining the chunks produced by toChunks. Only the headers are read, the index and every
+        column are decoded on first access
+        Args:
+            name: name of the stock
+            chunks: encoded chunks in time order
+
+        Returns:
+            an object of type stock
+        """
+        source = codec.Chunks(chunks)
+        return Stock.fromSource(name, source, source.Meta.get(INTERVAL_KEY))
+
+    @classmethod
+    def fromSource(cls, name: str, source, interval: str | None = None):
+        """
+        Returns a stock object decoding its index and its columns from a source on first access
+        Args:
+            name: name of the stock
+            source: has Names, the names of the columns, index(rows) and column(name, rows) returning the index and
+                a column, of some rows or all of them, and nbytes, the memory it holds. See codec.Chunks
+            interval: interval between the bars
+
+        Returns:
+            an object of type stock
+        """
+        s = Stock(name, skip_loading=True, interval=interval)
+        s.__df__ = None
+        s.__source__ = source
+        return s
+
+    def toChunks(self) -> Dict[str, bytes]:
+        """
+        Encodes the stock as one chunk per day, so later bars can be added without rewriting earlier days
+        Returns:
+            encoded chunks keyed by day
+        """
+        meta = {NAME_KEY: self.name, INTERVAL_KEY: self.interval}
+        return {day: codec.encode(df, meta) for day, df in codec.split_days(self.df).items()}
+
+    def resample(self, interval: str):
+        """
+        Returns a stock of coarser bars built from the bars of this one
+        Args:
+            interval: interval of the new bars, e.g. 5m, 1h or 1d, a multiple of the interval of this stock
+
+        Returns:
+            an object of type stock, this stock when the interval is its own
+        """
+        if interval == self.interval:
+            return self
+        resample.check(self.interval, interval)
+
+        s = Stock(self.name, skip_loading=True, period=self.period, interval=interval)
+        s.df = resample.aggregate(self.df, interval, AGGREGATIONS)
+        return s
+
+    def project(self, columns: List[ValueKind] | None = None, start: datetime.datetime | None = None,
+                end: datetime.datetime | None = None, name: str | None = None):
+        """
+        Returns a stock of some of the columns and the bars of this one. Its columns are sliced from the ones this
+        stock has decoded, the others are decoded for its bars only on first access
+        Args:
+            columns: the columns to keep, all of them by default. Columns the stock doesn't have are left out
+            start: first time included, see window
+            end: last time included
+            name: name of the new stock, the name of this one by default. Shared stocks are renamed this way
+
+        Returns:
+            an object of type stock, this stock when nothing is left out or renamed
+        """
+        if columns is None and start is None and end is None and (name is None or name == self.name):
+            return self
+
+        names = self.__names__()
+        if columns is not None:
+            kept = {ValueKind.to_colname(kind) for kind in columns}
+            names = [name for name in names if name in kept]
+
+        s = Stock(name if name is not None else self.name, skip_loading=True, period=self.period,
+                  interval=self.interval)
+        s.__df__ = None
+        s.__source__ = Projection(self, names, self.window(start, end))
+        return s
+
     def values(self, kind: ValueKind = ValueKind.Close) -> List[float]:
         """
         Returns the list of values
@@ -99,17 +384,75 @@ class Stock:
         """
         return list(self.df[ValueKind.to_colname(kind)])
 
+    def array(self, kind: ValueKind = ValueKind.Close) -> numpy.ndarray:
+        """
+        Returns the values as a contiguous float64 numpy array, the array is built once and cached on the stock
+        Args:
+            kind: the kind of values you want
+
+        Returns:
+            read only numpy array of the values
+        """
+        arr = self.__arrays__.get(kind)
+        if arr is None:
+            name = ValueKind.to_colname(kind)
+            if self.__df__ is not None:
+                arr = numpy.ascontiguousarray(self.df[name].to_numpy(dtype=numpy.float64))
+            else:
+                col = self.__column__(name)
+                if col.dtype == numpy.float64 and col.flags.c_contiguous:
+                    # wrapped as is, a mapped or decoded column stays on disk or in its chunk
+                    arr = col.view(numpy.ndarray)
+                else:
+                    arr = numpy.ascontiguousarray(col, dtype=numpy.float64)
+            arr.flags.writeable = False
+            self.__arrays__[kind] = arr
+
+        return arr
+
+    def window(self, start: datetime.datetime | None = None, end: datetime.datetime | None = None) -> slice:
+        """
+        Returns the rows between two times, found by binary search on the index
+        Args:
+            start: first time included, naive times are taken in the timezone of the index
+            end: last time included, see index_time
+
+        Returns:
+            slice of rows
+        """
+        index = self.index
+        bounds = []
+        for t, side in ((start, "left"), (end, "right")):
+            if t is None or not isinstance(index, pandas.DatetimeIndex):
+                bounds.append(None)
+                continue
+            bounds.append(int(index.searchsorted(index_time(t, index), side=side)))
+
+        return slice(*bounds)
+
+    def value_at(self, tick: int, kind: ValueKind = ValueKind.Close) -> float:
+        """
+        Returns the value of the stock at the given tick, ticks past the end return the last value
+        Args:
+            tick: the tick of the clock driving the simulation
+            kind: Kind of value to be returned
+
+        Returns:
+            float value to be returned
+        """
+        column = self.array(kind)
+        return column[min(len(column) - 1, tick)]
+
     def __get_value__(self, kind: ValueKind):
         """
-        Returns the value of the stock at current time
+        Returns the value of the stock at current time of the global ticker
         Args:
             kind: Kind of value to be returned
 
         Returns:
             float value to be returned
         """
-        column = self.df[ValueKind.to_colname(kind)]
-        return column.iloc[min(len(column) - 1, get_ticker().value)]
+        return self.value_at(get_ticker().value, kind)
 
     @property
     def close(self) -> float:
@@ -126,3 +469,40 @@ class Stock:
     @property
     def high(self) -> float:
         return self.__get_value__(kind=ValueKind.High)
+
+
+class Projection:
+    """
+    Projection is the source of a stock made by project: some of the columns of another stock, for a range of its bars
+    """
+
+    def __init__(self, parent: Stock, names: List[str], rows: slice):
+        self.Parent = parent
+        self.Names = names
+        self.Rows = rows
+
+    @property
+    def nbytes(self) -> int:
+        # the chunks and the decoded columns are held by the parent
+        return 0
+
+    def __rows__(self, rows: slice | None) -> slice:
+        """
+        Returns the rows of the parent holding the given rows of the projection
+        """
+        r = range(len(self.Parent.index))[self.Rows]
+        if rows is not None:
+            r = r[rows]
+        return slice(r.start, r.stop, r.step)
+
+    def index(self) -> pandas.Index:
+        return self.Parent.index[self.Rows]
+
+    def column(self, name: str, rows: slice | None = None) -> numpy.ndarray:
+        if name not in self.Names:
+            raise KeyError(name)
+        rows = self.__rows__(rows)
+        if rows == slice(0, len(self.Parent.index), 1):
+            # all the bars, decoded once and kept by the parent
+            return self.Parent.__column__(name)
+        return self.Parent.__column__(name, rows)
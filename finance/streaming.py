@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Dict, Callable
+
+import pandas
+
+from utils import Ticker
+from .exceptions import AmountIsZeroException, NotEnoughStocksToSellException
+from .portfolio import Portfolio
+from .stock import Stock, ValueKind
+
+
+@dataclass
+class Bar:
+    Tick: int
+    Time: pandas.Timestamp | None
+    Open: float
+    High: float
+    Low: float
+    Close: float
+    Volume: float
+
+
+class LiveStock(Stock):
+    """
+    LiveStock only remembers the last bar it has seen, so portfolios can value live positions without any history
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name, skip_loading=True)
+        self.Last: Bar | None = None
+
+    def value_at(self, tick: int, kind: ValueKind = ValueKind.Close) -> float:
+        return getattr(self.Last, kind.value)
+
+
+class StreamingStrategy(ABC):
+    """
+    StreamingStrategy receives bars one at a time and keeps constant state per symbol, so a new bar costs the same
+    no matter how much history came before it
+    """
+
+    def __init__(self, portfolio: Portfolio):
+        self.Portfolio: Portfolio = portfolio
+        self.__stocks__: Dict[str, LiveStock] = {}
+        self.__last_tick__: int = -1
+
+    def stock(self, symbol: str) -> LiveStock:
+        stk = self.__stocks__.get(symbol)
+        if stk is None:
+            stk = self.__stocks__[symbol] = LiveStock(symbol)
+        return stk
+
+    def push(self, symbol: str, bar: Bar):
+        """
+        Records the bar as the latest price of the symbol and hands it to the strategy
+        """
+        self.stock(symbol).Last = bar
+        self.__last_tick__ = max(self.__last_tick__, bar.Tick)
+        self.on_bar(symbol, bar)
+
+    @abstractmethod
+    def on_bar(self, symbol: str, bar: Bar):
+        """
+        Reacts to a new bar of a symbol, its stock already holds the bar
+        """
+
+    def close(self) -> Portfolio:
+        """
+        Squares off every position at the last price seen, one tick after the last bar
+        Returns:
+            the portfolio of the strategy
+        """
+        self.Portfolio.Ticker.set(self.__last_tick__ + 1)
+        logging.info("Trying to square off remaining stocks")
+        self.Portfolio.square_off(stocks=list(self.__stocks__.values()))
+        return self.Portfolio
+
+
+class ThresholdStrategy(StreamingStrategy):
+    """
+    ThresholdStrategy is Algorithms.Threshold driven by bars: buy when the price drops threshold below the locked
+    price, sell when it rises threshold above it, and blend the traded price into the locked price by volatility
+    """
+
+    def __init__(self, cash: float, threshold: float, volatility: float):
+        super().__init__(Portfolio(initial_cash=cash, allow_short=True, ticker=Ticker()))
+        self.Threshold: float = threshold
+        self.Volatility: float = volatility
+        self.__amount__: float = cash * threshold
+        self.__locked_price__: Dict[str, float] = {}
+
+    def on_bar(self, symbol: str, bar: Bar):
+        stk = self.stock(symbol)
+        cp = bar.Close
+        # the first price seen is the initial locked price
+        lp = self.__locked_price__.setdefault(symbol, cp)
+        diff = (lp - cp) / lp
+
+        if diff > self.Threshold:
+            try:
+                self.Portfolio.buy_at(stk, int(self.__amount__ // cp), cp, bar.Tick)
+                self.__locked_price__[symbol] = (1 - self.Volatility) * lp + self.Volatility * cp
+            except Exception:
+                # if cannot buy just pass
+                pass
+
+        if (-diff) > self.Threshold:
+            try:
+                self.Portfolio.sell_at(stk, int(self.__amount__ // cp), cp, bar.Tick)
+                self.__locked_price__[symbol] = (1 - self.Volatility) * lp + self.Volatility * cp
+            except NotEnoughStocksToSellException:
+                self.Portfolio.square_off([stk])
+            except AmountIsZeroException:
+                pass
+
+
+def bars(stk: Stock, start: int = 0) -> List[Bar]:
+    """
+    Returns the bars of a stock from the given row on, built from its cached arrays
+    """
+    times = stk.index[start:] if isinstance(stk.index, pandas.DatetimeIndex) else [None] * (len(stk.index) - start)
+    columns = [stk.array(kind)[start:].tolist() for kind in
+               (ValueKind.Open, ValueKind.High, ValueKind.Low, ValueKind.Close, ValueKind.Volume)]
+    return [Bar(start + i, t, *values) for i, (t, *values) in enumerate(zip(times, *columns))]
+
+
+async def replay(stocks: List[Stock], queue: asyncio.Queue, delay: float = 0.0):
+    """
+    Pushes the history of stocks into a queue tick by tick, symbols of the same tick in the order of the list, and
+    ends the stream with None
+    Args:
+        stocks: the stocks to replay
+        queue: queue of (symbol, bar) tuples
+        delay: seconds to wait between ticks
+    """
+    series = [(stk.name, bars(stk)) for stk in stocks]
+    for tick in range(max((len(b) for _, b in series), default=0)):
+        for name, b in series:
+            if tick < len(b):
+                await queue.put((name, b[tick]))
+        if delay > 0:
+            await asyncio.sleep(delay)
+    await queue.put(None)
+
+
+async def follow(load: Callable[[List[str]], List[Stock | None]], names: List[str], queue: asyncio.Queue,
+                 every: float = 60.0, stop: asyncio.Event | None = None):
+    """
+    Polls stored stocks and pushes the bars that appeared since the last poll, the first poll only remembers where
+    the history ends. The stream is ended with None once stop is set.
+    Args:
+        load: loads stocks by name, e.g. StockData.get_many
+        names: the symbols to follow
+        queue: queue of (symbol, bar) tuples
+        every: seconds between polls
+        stop: event ending the stream
+    """
+    last: Dict[str, pandas.Timestamp] = {}
+    ticks: Dict[str, int] = {name: 0 for name in names}
+    stop = stop if stop is not None else asyncio.Event()
+    while not stop.is_set():
+        for name, stk in zip(names, await asyncio.to_thread(load, names)):
+            if stk is None or stk.index.empty:
+                continue
+
+            index = stk.index
+            if name in last:
+                for bar in bars(stk, start=index.searchsorted(last[name], side="right")):
+                    bar.Tick = ticks[name]
+                    ticks[name] += 1
+                    await queue.put((name, bar))
+            last[name] = index[-1]
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=every)
+        except asyncio.TimeoutError:
+            pass
+
+    await queue.put(None)
+
+
+async def run(strategy: StreamingStrategy, queue: asyncio.Queue) -> Portfolio:
+    """
+    Feeds the strategy from a queue until the stream ends
+    Args:
+        strategy: the strategy to drive
+        queue: queue of (symbol, bar) tuples ended by None
+
+    Returns:
+        the portfolio of the strategy after squaring off
+    """
+    while True:
+        item = await queue.get()
+        if item is None:
+            return strategy.close()
+        strategy.push(*item)
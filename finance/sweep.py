@@ -0,0 +1,126 @@
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import List, Iterator, Tuple
+
+import numpy
+
+from .engine import threshold_prices, simulate
+from .enums import Alignment, Simulation
+from . import metrics
+from .metrics import evaluate_trades
+from .stock import Stock
+from utils import instrumentation
+
+
+@dataclass
+class SweepResult:
+    Threshold: float
+    Volatility: float
+    Cash: float
+    Value: float
+    Transactions: int
+    Error: str | None = None
+    Metrics: metrics.Metrics | None = None
+
+
+# price matrix shared by every grid point evaluated in this process, set once per worker
+_prices: numpy.ndarray | None = None
+_order: List[int] = []
+_metrics: bool = False
+_mode: Simulation = Simulation.tick
+_align: Alignment = Alignment.tick
+
+
+def _init_worker(prices: numpy.ndarray, order: List[int], metrics: bool, mode: Simulation, align: Alignment):
+    global _prices, _order, _metrics, _mode, _align
+    _prices = prices
+    _order = order
+    _metrics = metrics
+    _mode = mode
+    _align = align
+
+
+def _run_points(points: List[Tuple[float, float, float]], prices: numpy.ndarray, order: List[int],
+                metrics: bool, mode: Simulation, align: Alignment) -> List[SweepResult]:
+    res: List[SweepResult] = []
+    run = simulate(mode)
+    for threshold, volatility, cash in points:
+        try:
+            trades, value = run(prices, order, cash, threshold, volatility, align=align)
+            res.append(SweepResult(Threshold=threshold, Volatility=volatility, Cash=cash, Value=value,
+                                   Transactions=len(trades),
+                                   Metrics=evaluate_trades(prices, trades, cash)[1] if metrics else None))
+        except Exception as e:
+            res.append(SweepResult(Threshold=threshold, Volatility=volatility, Cash=cash, Value=math.nan,
+                                   Transactions=0, Error=str(e)))
+
+    return res
+
+
+def _run_chunk(points: List[Tuple[float, float, float]]) -> List[SweepResult]:
+    return _run_points(points, _prices, _order, _metrics, _mode, _align)
+
+
+def sweep(stocks: List[Stock], thresholds: List[float], volatilities: List[float], cashes: List[float],
+          workers: int | None = None, chunk_size: int | None = None, metrics: bool = False,
+          align: Alignment = Alignment.tick, mode: Simulation = Simulation.tick) -> Iterator[SweepResult]:
+    """
+    Runs the threshold algorithm over every combination of threshold, volatility and cash. The price matrix is built
+    once and handed to a pool of worker processes, the grid is spread across them in chunks.
+    Args:
+        stocks: the stocks to run the algorithm on
+        thresholds: thresholds to try
+        volatilities: volatilities to try
+        cashes: initial cash amounts to try
+        workers: number of worker processes, defaults to the number of cores. 1 runs the grid in this process
+        chunk_size: number of grid points handed to a worker at once
+        metrics: whether to evaluate the equity curve of every grid point, see metrics.statistics
+        align: how the bars of the stocks are matched, see PriceMatrix
+        mode: how every grid point is simulated, event pays off for grid points that trade rarely
+
+    Returns:
+        iterator over the results in the order they finish
+    """
+    with instrumentation.timer("align"):
+        _, order, prices = threshold_prices(stocks, align)
+
+    grid = [(t, v, c) for c, t, v in itertools.product(cashes, thresholds, volatilities)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        # a few chunks per worker keeps the pool busy while still streaming results early
+        chunk_size = max(1, min(256, len(grid) // (workers * 4)))
+    chunks = [grid[i:i + chunk_size] for i in range(0, len(grid), chunk_size)]
+
+    if workers == 1:
+        for chunk in chunks:
+            with instrumentation.timer("simulate"):
+                res = _run_points(chunk, prices, order, metrics, mode, align)
+            yield from res
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(prices, order, metrics, mode, align)) as pool:
+        futures = [pool.submit(_run_chunk, chunk) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            # the consumer may stop early, in which case pending chunks are dropped
+            for future in futures:
+                future.cancel()
+
+
+def rank(results: List[SweepResult]) -> List[SweepResult]:
+    """
+    Ranks sweep results by final value, ties go to the one with fewer transactions. Failed points come last.
+    Args:
+        results: the results to rank
+
+    Returns:
+        sorted list of results
+    """
+    return sorted(results, key=lambda r: (r.Error is not None, -r.Value if r.Error is None else 0, r.Transactions))
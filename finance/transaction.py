@@ -11,3 +11,5 @@ class Transaction:
     Quantity: int
     Price: float
     Amount: float
+    # charged on top of the amount, see ExecutionModel
+    Fee: float = 0.0
@@ -0,0 +1,194 @@
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy
+
+from .engine import threshold_prices, simulate, Trade
+from .enums import Alignment, Simulation, TransactionType
+from . import metrics
+from .metrics import evaluate_trades
+from .stock import Stock
+from .sweep import _run_points, rank
+from utils import instrumentation
+
+
+@dataclass
+class WalkForwardWindow:
+    # ticks of the timeline, the train window is [TrainStart, TrainEnd) and the test window [TrainEnd, TestEnd)
+    TrainStart: int
+    TrainEnd: int
+    TestEnd: int
+    # parameters picked on the train window
+    Threshold: float = math.nan
+    Volatility: float = math.nan
+    TrainValue: float = math.nan
+    # out of sample run of those parameters on the test window
+    Value: float = math.nan
+    Transactions: int = 0
+    Error: str | None = None
+    Metrics: metrics.Metrics | None = None
+
+
+@dataclass
+class WalkForwardResult:
+    Windows: List[WalkForwardWindow]
+    # test windows chained one after the other, each reinvesting what the ones before it ended with
+    Value: float
+    Metrics: metrics.Metrics | None = None
+
+
+def windows(total: int, train: int, test: int, step: int | None = None,
+            anchored: bool = False) -> List[Tuple[int, int, int]]:
+    """
+    Splits a timeline into train and test windows, each test window directly follows its train window
+    Args:
+        total: ticks in the timeline
+        train: ticks of every train window, of the first one when anchored. At least 2, the last tick of a train
+            window only squares off
+        test: ticks of every test window, the last one is cut at the end of the timeline
+        step: ticks between the starts of two consecutive windows, test by default so test windows don't overlap
+        anchored: whether every train window starts at the first tick and grows, instead of rolling forward
+
+    Returns:
+        (train start, train end, test end) of every window
+    """
+    if train < 2:
+        raise ValueError("train windows need at least two ticks")
+    if test < 1:
+        raise ValueError("test windows need at least one tick")
+    step = test if step is None else step
+    if step < 1:
+        raise ValueError("step needs at least one tick")
+
+    res = []
+    for end in range(train, total, step):
+        res.append((0 if anchored else end - train, end, min(end + test, total)))
+    return res
+
+
+# price matrix shared by every window evaluated in this process, set once per worker
+_prices: numpy.ndarray | None = None
+_order: List[int] = []
+_mode: Simulation = Simulation.tick
+_align: Alignment = Alignment.tick
+
+
+def _init_worker(prices: numpy.ndarray, order: List[int], mode: Simulation, align: Alignment):
+    global _prices, _order, _mode, _align
+    _prices = prices
+    _order = order
+    _mode = mode
+    _align = align
+
+
+def _run_window(bounds: Tuple[int, int, int], grid: List[Tuple[float, float, float]], cash: float,
+                prices: numpy.ndarray, order: List[int], mode: Simulation, align: Alignment,
+                periods: float) -> Tuple[WalkForwardWindow, numpy.ndarray | None, List[Trade]]:
+    start, end, stop = bounds
+    window = WalkForwardWindow(TrainStart=start, TrainEnd=end, TestEnd=stop)
+
+    # views of the matrix: the last row of the train window is its square off row, so training never sees a test
+    # price, while the test window squares off on the first tick after it, the real square off row for the last one
+    best = rank(_run_points(grid, prices[start:end], order, False, mode, align))[0]
+    if best.Error is not None:
+        window.Error = f"train: {best.Error}"
+        return window, None, []
+    window.Threshold, window.Volatility, window.TrainValue = best.Threshold, best.Volatility, best.Value
+
+    test = prices[end:stop + 1]
+    try:
+        trades, window.Value = simulate(mode)(test, order, cash, best.Threshold, best.Volatility, align=align)
+    except Exception as e:
+        window.Error = f"test: {e}"
+        return window, None, []
+    window.Transactions = len(trades)
+    equity, window.Metrics = evaluate_trades(test, trades, cash, periods)
+    return window, equity, trades
+
+
+def _run_window_shared(bounds: Tuple[int, int, int], grid: List[Tuple[float, float, float]], cash: float,
+                       periods: float) -> Tuple[WalkForwardWindow, numpy.ndarray | None, List[Trade]]:
+    return _run_window(bounds, grid, cash, _prices, _order, _mode, _align, periods)
+
+
+def _chain(cash: float, runs: List[Tuple[WalkForwardWindow, numpy.ndarray | None, List[Trade]]],
+           periods: float) -> Tuple[float, metrics.Metrics | None]:
+    """
+    Chains the test windows into a single out of sample run, every window scaled by what the ones before it returned
+    """
+    curves, columns, quantities, cash_flows = [], [], [], []
+    scale = 1.0
+    for _, equity, trades in runs:
+        if equity is None:
+            continue
+        curves.append(equity * scale)
+        for _, j, kind, q, price, fee in trades:
+            sign = 1 if kind == TransactionType.BUY else -1
+            columns.append(j)
+            quantities.append(sign * q * scale)
+            cash_flows.append((-sign * q * price - fee) * scale)
+        scale *= equity[-1] / cash
+
+    if not curves:
+        return math.nan, None
+    stats = metrics.statistics(numpy.concatenate(curves), numpy.array(columns, dtype=numpy.int64),
+                               numpy.array(quantities, dtype=numpy.float64),
+                               numpy.array(cash_flows, dtype=numpy.float64), cash, periods)
+    return cash * scale, stats
+
+
+def walk_forward(stocks: List[Stock], thresholds: List[float], volatilities: List[float], cash: float, train: int,
+                 test: int, step: int | None = None, anchored: bool = False, workers: int | None = None,
+                 align: Alignment = Alignment.tick, mode: Simulation = Simulation.tick,
+                 periods: float = 1.0) -> WalkForwardResult:
+    """
+    Validates the threshold algorithm out of sample. The timeline is split into train and test windows, see windows.
+    On every train window the thresholds and volatilities are swept and the best final value wins, the winner then
+    runs on the test window that follows. Windows are row views of a single price matrix and are independent of each
+    other, they run on a pool of worker processes.
+    Args:
+        stocks: the stocks to run the algorithm on
+        thresholds: thresholds to try
+        volatilities: volatilities to try
+        cash: initial cash of every run
+        train: ticks of every train window
+        test: ticks of every test window
+        step: ticks between two consecutive windows, test by default
+        anchored: whether train windows all start at the first tick
+        workers: number of worker processes, defaults to the number of cores. 1 runs the windows in this process
+        align: how the bars of the stocks are matched, see PriceMatrix
+        mode: how every run is simulated
+        periods: number of ticks per year, see metrics.statistics
+
+    Returns:
+        the result of every window in timeline order, and the value and metrics of the test windows chained together
+
+    Raises:
+        ValueError: if there are no parameters to try or the windows are too short, see windows
+    """
+    with instrumentation.timer("align"):
+        _, order, prices = threshold_prices(stocks, align)
+
+    bounds = windows(prices.shape[0] - 1, train, test, step, anchored)
+    grid = [(t, v, cash) for t, v in itertools.product(thresholds, volatilities)]
+    if not grid:
+        raise ValueError("no thresholds or no volatilities to try")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(bounds)) or 1
+
+    with instrumentation.timer("simulate"):
+        if workers == 1:
+            runs = [_run_window(b, grid, cash, prices, order, mode, align, periods) for b in bounds]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(prices, order, mode, align)) as pool:
+                runs = list(pool.map(_run_window_shared, bounds, itertools.repeat(grid), itertools.repeat(cash),
+                                     itertools.repeat(periods)))
+
+    value, stats = _chain(cash, runs, periods)
+    return WalkForwardResult(Windows=[w for w, _, _ in runs], Value=value, Metrics=stats)
@@ -2,12 +2,8 @@ from typing import List, Dict
 
 import pandas as pd
 import numpy as py
-# from lightweight_charts import Chart
-import plotly.graph_objects as go
 import time
 
-from lightweight_charts import Chart
-
 import database
 import finance
 
@@ -33,6 +29,9 @@ import finance
 
 
 def plot(s: finance.Stock, transactions: List[finance.Transaction] = None):
+    # imported here so the headless render works without a display or the charting libraries
+    from lightweight_charts import Chart
+
     if transactions is None:
         transactions = []
     # https://github.com/louisnw01/lightweight-charts-python
@@ -72,13 +71,15 @@ def plot_plotly(s: finance.Stock):
     Args:
         s: finance stock
     """
+    import plotly.graph_objects as go
+
     # https://plotly.com/python/candlestick-charts/#simple-example-with-datetime-objects
     fig = go.Figure(
-        data=[go.Candlestick(x=s.df.index,
-                             open=s.df[finance.OPEN_COLNAME],
-                             close=s.values(kind=finance.ValueKind.Close),
-                             low=s.values(kind=finance.ValueKind.Low),
-                             high=s.values(kind=finance.ValueKind.High))]
+        data=[go.Candlestick(x=s.index,
+                             open=s.array(finance.ValueKind.Open),
+                             close=s.array(finance.ValueKind.Close),
+                             low=s.array(finance.ValueKind.Low),
+                             high=s.array(finance.ValueKind.High))]
     )
 
     fig.show()
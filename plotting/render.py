@@ -0,0 +1,222 @@
+import html
+import struct
+import zlib
+from typing import Tuple
+
+import numpy
+
+import finance
+
+DEFAULT_WIDTH = 800
+DEFAULT_HEIGHT = 400
+MAX_WIDTH = 4000
+MAX_HEIGHT = 2000
+
+# colors of the live chart in plot
+BACKGROUND = "#131722"
+UP = "#26a69a"
+DOWN = "#ef5350"
+BUY = "#00c853"
+SELL = "#ff1744"
+TEXT = "#d1d4dc"
+MARKER_SIZE = 5
+
+
+def decimate(o: numpy.ndarray, h: numpy.ndarray, low: numpy.ndarray, c: numpy.ndarray,
+             buckets: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Downsamples bars to at most buckets bars of consecutive rows, keeping the first open, the highest high, the
+    lowest low and the last close of every bucket, so no extreme of the series disappears from the chart
+    Args:
+        o: opens
+        h: highs
+        low: lows
+        c: closes
+        buckets: number of bars wanted, usually the width of the chart in pixels
+
+    Returns:
+        the first row of every bucket and its open, high, low and close
+    """
+    n = len(c)
+    if n <= buckets:
+        return numpy.arange(n), o, h, low, c
+
+    starts = numpy.arange(buckets) * n // buckets
+    ends = numpy.append(starts[1:], n) - 1
+    # fmax and fmin skip the gaps of a forward filled series
+    return starts, o[starts], numpy.fmax.reduceat(h, starts), numpy.fmin.reduceat(low, starts), c[ends]
+
+
+def bucket_of(starts: numpy.ndarray, rows: numpy.ndarray) -> numpy.ndarray:
+    """
+    Returns the bucket of decimate holding every row, rows past the end land in the last bucket
+    """
+    return numpy.clip(numpy.searchsorted(starts, rows, side="right") - 1, 0, max(len(starts) - 1, 0))
+
+
+class Layout:
+    """
+    Layout maps bucket numbers and prices to pixels of a chart
+    """
+
+    def __init__(self, width: int, height: int, buckets: int, lo: float, hi: float):
+        self.Width = width
+        self.Height = height
+        # room for the price labels on the right
+        self.Plot = max(1, width - 60)
+        self.Step = self.Plot / max(buckets, 1)
+        self.Body = max(1.0, self.Step * 0.7)
+        pad = (hi - lo) * 0.05 or 1.0
+        self.Lo = lo - pad
+        self.Hi = hi + pad
+
+    def x(self, bucket: numpy.ndarray) -> numpy.ndarray:
+        return (bucket + 0.5) * self.Step
+
+    def y(self, price: numpy.ndarray) -> numpy.ndarray:
+        return (self.Hi - price) / (self.Hi - self.Lo) * (self.Height - 1)
+
+
+def _svg(layout: Layout, o, h, low, c, markers, title: str) -> str:
+    x = layout.x(numpy.arange(len(c)))
+    top, bottom = layout.y(h), layout.y(low)
+    body_top, body_bottom = layout.y(numpy.fmax(o, c)), layout.y(numpy.fmin(o, c))
+    rising = c >= o
+    valid = ~(numpy.isnan(top) | numpy.isnan(bottom) | numpy.isnan(body_top) | numpy.isnan(body_bottom))
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{layout.Width}" height="{layout.Height}" '
+             f'viewBox="0 0 {layout.Width} {layout.Height}">',
+             f'<rect width="100%" height="100%" fill="{BACKGROUND}"/>']
+    for mask, color in ((rising, UP), (~rising, DOWN)):
+        mask = mask & valid
+        wicks = "".join(f"M{a:.1f} {b:.1f}V{d:.1f}" for a, b, d in zip(x[mask], top[mask], bottom[mask]))
+        w = layout.Body
+        bodies = "".join(f"M{a - w / 2:.1f} {b:.1f}h{w:.1f}V{max(d, b + 1):.1f}h{-w:.1f}z"
+                         for a, b, d in zip(x[mask], body_top[mask], body_bottom[mask]))
+        parts.append(f'<path d="{wicks}" stroke="{color}" stroke-width="1" fill="none"/>')
+        parts.append(f'<path d="{bodies}" fill="{color}"/>')
+
+    if markers is not None:
+        buckets, buys = markers
+        s = MARKER_SIZE
+        for mask, color, side in ((buys, BUY, 1), (~buys, SELL, -1)):
+            b = numpy.unique(buckets[mask])
+            # buys below the low pointing up, sells above the high pointing down
+            ys = numpy.where(side > 0, bottom[b] + s + 2, top[b] - s - 2)
+            d = "".join(f"M{a:.1f} {yy - side * s:.1f}l{s:.1f} {side * 2 * s:.1f}h{-2 * s:.1f}z"
+                        for a, yy in zip(layout.x(b), ys) if yy == yy)
+            parts.append(f'<path d="{d}" fill="{color}"/>')
+
+    for price in (layout.Hi, (layout.Hi + layout.Lo) / 2, layout.Lo):
+        parts.append(f'<text x="{layout.Plot + 4}" y="{float(layout.y(price)) + 4:.1f}" fill="{TEXT}" '
+                     f'font-family="Trebuchet MS" font-size="11">{price:.2f}</text>')
+    if title:
+        parts.append(f'<text x="8" y="16" fill="{TEXT}" font-family="Trebuchet MS" font-size="13">'
+                     f'{html.escape(title)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _hex(color: str) -> numpy.ndarray:
+    return numpy.array([int(color[i:i + 2], 16) for i in (1, 3, 5)], dtype=numpy.uint8)
+
+
+def _raster(layout: Layout, o, h, low, c, markers) -> numpy.ndarray:
+    pixels = numpy.empty((layout.Height, layout.Width, 3), dtype=numpy.uint8)
+    pixels[:] = _hex(BACKGROUND)
+    if not len(c):
+        return pixels
+
+    rows = numpy.arange(layout.Height)[:, None]
+    cols = numpy.arange(layout.Width)[None, :]
+    # bucket under every pixel column, -1 right of the plot
+    bucket = (cols / layout.Step).astype(numpy.int64)
+    bucket = numpy.where(bucket < len(c), bucket, -1)
+    center = layout.x(bucket)
+
+    with numpy.errstate(invalid="ignore"):
+        top, bottom = numpy.round(layout.y(h)), numpy.round(layout.y(low))
+        body_top, body_bottom = numpy.round(layout.y(numpy.fmax(o, c))), numpy.round(layout.y(numpy.fmin(o, c)))
+        inside = bucket >= 0
+        b = numpy.where(inside, bucket, 0)
+        wick = inside & (numpy.abs(cols + 0.5 - center) <= 0.5) & (rows >= top[b]) & (rows <= bottom[b])
+        body = inside & (numpy.abs(cols + 0.5 - center) <= layout.Body / 2) & (rows >= body_top[b]) & \
+            (rows <= numpy.maximum(body_bottom[b], body_top[b]))
+    rising = (c >= o)[b]
+    candle = wick | body
+    pixels[candle & rising] = _hex(UP)
+    pixels[candle & ~rising] = _hex(DOWN)
+
+    if markers is not None:
+        buckets, buys = markers
+        s = MARKER_SIZE
+        for mask, color, side in ((buys, BUY, 1), (~buys, SELL, -1)):
+            for k in numpy.unique(buckets[mask]).tolist():
+                edge = bottom[k] + 2 if side > 0 else top[k] - 2 * s - 2
+                if edge != edge:
+                    continue
+                x0 = int(layout.x(k)) - s
+                y0 = int(edge)
+                pixels[max(y0, 0):max(y0 + 2 * s, 0), max(x0, 0):max(x0 + 2 * s, 0)] = _hex(color)
+
+    return pixels
+
+
+def _png(pixels: numpy.ndarray) -> bytes:
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    height, width, _ = pixels.shape
+    # every scanline starts with filter type 0
+    raw = numpy.hstack([numpy.zeros((height, 1), dtype=numpy.uint8), pixels.reshape(height, width * 3)])
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+def render(stk: finance.Stock, rows: slice = slice(None), trades: Tuple[numpy.ndarray, numpy.ndarray] | None = None,
+           width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+           fmt: finance.ChartFormat = finance.ChartFormat.svg, title: str | None = None) -> bytes:
+    """
+    Renders a candlestick chart without a display. The bars are decimated to the width of the chart first, so the
+    work grows with the number of bars only through a few vectorized passes.
+    Args:
+        stk: the stock
+        rows: the bars to draw
+        trades: bar of every transaction, counted from the first drawn bar, and whether it is a buy. Bars outside
+            the drawn ones are left out
+        width: width in pixels
+        height: height in pixels
+        fmt: svg, html embedding the svg, or png
+        title: drawn in the top left corner
+
+    Returns:
+        the encoded chart
+    """
+    width = max(1, min(MAX_WIDTH, width))
+    height = max(1, min(MAX_HEIGHT, height))
+    o, h, low, c = (stk.array(kind)[rows] for kind in (finance.ValueKind.Open, finance.ValueKind.High,
+                                                         finance.ValueKind.Low, finance.ValueKind.Close))
+    layout = Layout(width, height, 1, 0.0, 1.0)
+    n = len(c)
+    starts, o, h, low, c = decimate(o, h, low, c, max(1, layout.Plot))
+
+    present = h[~numpy.isnan(h)]
+    lows = low[~numpy.isnan(low)]
+    lo = float(lows.min()) if len(lows) else 0.0
+    hi = float(present.max()) if len(present) else 1.0
+    layout = Layout(width, height, len(c), lo, hi)
+
+    markers = None
+    if trades is not None and len(c):
+        bars, buys = trades
+        keep = (bars >= 0) & (bars < n)
+        markers = (bucket_of(starts, bars[keep]), numpy.asarray(buys, dtype=bool)[keep])
+
+    if fmt == finance.ChartFormat.png:
+        return _png(_raster(layout, o, h, low, c, markers))
+
+    svg = _svg(layout, o, h, low, c, markers, title or stk.name)
+    if fmt == finance.ChartFormat.html:
+        return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title or stk.name)}</title>'
+                f'</head><body style="margin:0;background:{BACKGROUND}">{svg}</body></html>').encode()
+    return svg.encode()
@@ -0,0 +1,24 @@
+import os
+
+import pandas
+
+import database
+import finance
+from benchmarks.synthetic import random_walk
+
+
+def test_append_aware_bars_to_naive_ones(tmp_path):
+    bars = database.BarStore(os.path.join(tmp_path, "bars"))
+    data = database.StockData(os.path.join(tmp_path, "t.db"), bars=bars)
+    aware = random_walk("msft", 600, seed=1).df
+
+    # daily bars of a bulk download are stored without a timezone, the incremental fetch returns them with one
+    stored = finance.Stock("msft", skip_loading=True)
+    stored.df = aware.iloc[:400].tz_localize(None)
+    data.insert(stored)
+
+    assert data.append("msft", aware.iloc[390:]) == 200
+    stk = data.get_by_name("msft")
+    assert stk.index.tz is None
+    pandas.testing.assert_frame_equal(stk.df, aware.tz_localize(None), check_freq=False)
+    assert bars.read("msft").index.equals(stk.index)
@@ -1 +1,2 @@
 from .ticker import *
+from .duration import *
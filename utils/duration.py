@@ -0,0 +1,47 @@
+import datetime
+import re
+
+# units used by yfinance periods and intervals, months and years are approximated
+UNITS = {
+    "m": datetime.timedelta(minutes=1),
+    "h": datetime.timedelta(hours=1),
+    "d": datetime.timedelta(days=1),
+    "wk": datetime.timedelta(weeks=1),
+    "mo": datetime.timedelta(days=30),
+    "y": datetime.timedelta(days=365),
+}
+
+PATTERN = re.compile(r"^(\d+)(m|h|d|wk|mo|y)$")
+# yfinance periods that don't span a fixed duration
+OPEN_PERIODS = ("ytd", "max")
+
+
+def to_timedelta(value: str) -> datetime.timedelta:
+    """
+    Converts a yfinance period or interval such as 7d, 1m or 1wk into a timedelta
+    Args:
+        value: the period or interval
+
+    Returns:
+        the corresponding duration
+    """
+    match = PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"can't parse duration {value}")
+
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+
+def period_duration(period: str) -> datetime.timedelta | None:
+    """
+    Converts a yfinance period such as 7d, ytd or max into a timedelta
+    Args:
+        period: the period
+
+    Returns:
+        the corresponding duration, None for the periods that don't span a fixed one
+    """
+    if period in OPEN_PERIODS:
+        return None
+
+    return to_timedelta(period)
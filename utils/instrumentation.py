@@ -0,0 +1,162 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# set to 1 to collect timers and counters from the start, see enable
+ENV_ENABLED = "TRADING_INSTRUMENTATION"
+
+STAGES = ("fetch", "read", "decode", "resample", "align", "simulate", "metrics", "serialize")
+
+_NULL = contextlib.nullcontext()
+
+
+class _Stat:
+    __slots__ = ("Calls", "Seconds", "Max")
+
+    def __init__(self):
+        self.Calls = 0
+        self.Seconds = 0.0
+        self.Max = 0.0
+
+
+class _Timer:
+    __slots__ = ("__owner__", "__stage__", "__start__")
+
+    def __init__(self, owner, stage: str):
+        self.__owner__ = owner
+        self.__stage__ = stage
+        self.__start__ = 0.0
+
+    def __enter__(self):
+        self.__start__ = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.__owner__.observe(self.__stage__, time.perf_counter() - self.__start__)
+        return False
+
+
+class Instrumentation:
+    """
+    Instrumentation keeps timers per stage and plain counters for the whole process. While it is disabled timer
+    hands out a shared no-op context manager and count returns right away, so the calls can stay in the code.
+
+    Timings also go to the collector of the current request, if any, see collect.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.Enabled: bool = enabled
+        self.__lock__ = threading.Lock()
+        self.__stats__: Dict[str, _Stat] = defaultdict(_Stat)
+        self.__counters__: Dict[str, int] = defaultdict(lambda: 0)
+        self.__request__: contextvars.ContextVar[List[Tuple[str, float]] | None] = contextvars.ContextVar(
+            "instrumentation_request", default=None)
+
+    def timer(self, stage: str):
+        """
+        Returns a context manager timing the code in it under a stage
+        Args:
+            stage: name of the stage, one of STAGES for the stages of a backtest
+        """
+        if not self.Enabled:
+            return _NULL
+        return _Timer(self, stage)
+
+    def count(self, name: str, n: int = 1):
+        """
+        Adds to a counter
+        """
+        if not self.Enabled:
+            return
+        with self.__lock__:
+            self.__counters__[name] += n
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Records a duration measured elsewhere
+        """
+        with self.__lock__:
+            stat = self.__stats__[stage]
+            stat.Calls += 1
+            stat.Seconds += seconds
+            stat.Max = max(stat.Max, seconds)
+
+        timings = self.__request__.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    @contextlib.contextmanager
+    def collect(self):
+        """
+        Collects the timings of the code in it, including code it runs in the thread pool through
+        run_in_threadpool, which copies the context
+        Returns:
+            list of (stage, seconds) filled in as the stages finish
+        """
+        timings: List[Tuple[str, float]] = []
+        token = self.__request__.set(timings)
+        try:
+            yield timings
+        finally:
+            self.__request__.reset(token)
+
+    def reset(self):
+        with self.__lock__:
+            self.__stats__.clear()
+            self.__counters__.clear()
+
+    def prometheus(self) -> str:
+        """
+        Renders the timers and counters in the prometheus text format
+        """
+        with self.__lock__:
+            stats = {stage: (s.Calls, s.Seconds, s.Max) for stage, s in self.__stats__.items()}
+            counters = dict(self.__counters__)
+
+        lines = ["# HELP trading_stage_seconds time spent per stage",
+                 "# TYPE trading_stage_seconds summary"]
+        for stage, (calls, seconds, _) in sorted(stats.items()):
+            lines.append(f'trading_stage_seconds_count{{stage="{stage}"}} {calls}')
+            lines.append(f'trading_stage_seconds_sum{{stage="{stage}"}} {seconds:.9f}')
+        lines += ["# HELP trading_stage_seconds_max longest single run per stage",
+                  "# TYPE trading_stage_seconds_max gauge"]
+        for stage, (_, _, longest) in sorted(stats.items()):
+            lines.append(f'trading_stage_seconds_max{{stage="{stage}"}} {longest:.9f}')
+        for name, value in sorted(counters.items()):
+            lines += [f"# TYPE trading_{name}_total counter", f"trading_{name}_total {value}"]
+        lines += ["# TYPE trading_instrumentation_enabled gauge",
+                  f"trading_instrumentation_enabled {int(self.Enabled)}"]
+
+        return "\n".join(lines) + "\n"
+
+
+Registry: Instrumentation = Instrumentation(enabled=os.environ.get(ENV_ENABLED, "") not in ("", "0"))
+
+
+def get_instrumentation() -> Instrumentation:
+    return Registry
+
+
+def timer(stage: str):
+    """
+    Times the code in it under a stage of the shared registry, a no-op while instrumentation is disabled
+    """
+    if not Registry.Enabled:
+        return _NULL
+    return _Timer(Registry, stage)
+
+
+def count(name: str, n: int = 1):
+    """
+    Adds to a counter of the shared registry, a no-op while instrumentation is disabled
+    """
+    if Registry.Enabled:
+        Registry.count(name, n)
+
+
+def enable(enabled: bool = True):
+    Registry.Enabled = enabled
@@ -13,6 +13,9 @@ class Ticker:
     def reset(self):
         self.__tick__ = 0
 
+    def set(self, value: int):
+        self.__tick__ = value
+
 
 t: Ticker = Ticker()
 